@@ -0,0 +1,253 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+import FPLcache
+
+API_URL = os.environ.get('FPL_API_URL', 'https://fantasy.premierleague.com/api/')
+MAX_IN_FLIGHT = int(os.environ.get('FPL_MAX_IN_FLIGHT', 16))
+RETRIES = 4
+BACKOFF = 0.5
+TIMEOUT = 30
+RUN_TTL = float(os.environ['FPL_API_TTL']) if os.environ.get('FPL_API_TTL') else None
+CACHE_DIR = os.environ.get('FPL_CACHE_DIR', '../Data/http_cache')
+CACHE_TTL = float(os.environ['FPL_CACHE_TTL']) if os.environ.get('FPL_CACHE_TTL') else None
+CACHE_MAX_BYTES = int(float(os.environ.get('FPL_CACHE_MAX_MB', 500)) * 2**20)
+OFFLINE = os.environ.get('FPL_OFFLINE', '') not in ('', '0')
+
+_session = None
+_pool_size = 0
+_memo = {}
+_frames = {}
+_memo_lock = threading.Lock()
+_cache_lock = threading.Lock()
+_cache_bytes = None
+
+def get_session(pool_size=MAX_IN_FLIGHT):
+    '''
+    Returns the keep-alive session shared by every request in the run.
+    The connection pool is grown if more requests are to be in flight than it holds,
+    otherwise urllib3 would throw away the extra connections after each use.
+
+    Args: pool_size, number of connections that may be open at once
+    Returns: requests.Session
+    '''
+    global _session, _pool_size
+    if _session is None or pool_size > _pool_size:
+        _session = _session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+        _pool_size = pool_size
+    return(_session)
+
+def cache_path(url):
+    '''
+    Returns: file the response for url is cached in
+    '''
+    return(os.path.join(CACHE_DIR, hashlib.sha1(url.encode()).hexdigest() + '.json'))
+
+def read_cache(url):
+    '''
+    Reads a cached response. Each cache file is a line of metadata
+    (url, etag, last_modified, fetched) followed by the raw response body.
+    Reading touches the file so eviction is least recently used first.
+
+    Returns: (metadata dict, body bytes) or None if url isn't cached
+    '''
+    path = cache_path(url)
+    try:
+        with open(path, 'rb') as f:
+            meta, body = f.read().split(b'\n', 1)
+        os.utime(path)
+    except (OSError, ValueError):
+        return(None)
+    return(json.loads(meta), body)
+
+def write_cache(url, body, etag=None, last_modified=None):
+    '''
+    Writes a response to the cache atomically and evicts old entries if the
+    cache has grown past CACHE_MAX_BYTES.
+    '''
+    global _cache_bytes
+    path = cache_path(url)
+    meta = {'url': url, 'etag': etag, 'last_modified': last_modified, 'fetched': time.time()}
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = path + '.' + str(threading.get_ident()) + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(json.dumps(meta).encode() + b'\n' + body)
+    with _cache_lock:
+        if _cache_bytes is None:
+            _cache_bytes = FPLcache.cache_size(CACHE_DIR, '.json')
+        if os.path.exists(path):
+            _cache_bytes -= os.path.getsize(path)
+        os.replace(tmp, path)
+        _cache_bytes += os.path.getsize(path)
+        if _cache_bytes > CACHE_MAX_BYTES:
+            _cache_bytes = FPLcache.evict_cache(int(CACHE_MAX_BYTES * 0.9), CACHE_DIR, '.json')
+
+def get_json(endpoint):
+    '''
+    Gets a single FPL API endpoint through the on-disk cache.
+    Cached responses younger than CACHE_TTL are served without asking the server, older ones
+    are revalidated with If-None-Match/If-Modified-Since and served from disk on a 304.
+    In OFFLINE mode only the cache is used.
+
+    Connection errors, timeouts, 429s and 5xxs are retried with exponential backoff.
+    Any other bad status is raised straight away.
+
+    Args: endpoint, path relative to API_URL e.g. 'bootstrap-static/'
+    Returns: decoded json
+    '''
+    url = API_URL + endpoint
+    cached = read_cache(url)
+    if cached is not None:
+        meta, body = cached
+        if OFFLINE or (CACHE_TTL is not None and time.time() - meta['fetched'] < CACHE_TTL):
+            return(json.loads(body))
+    elif OFFLINE:
+        raise FileNotFoundError('offline and ' + url + ' has not been cached')
+
+    headers = {}
+    if cached is not None and meta['etag']:
+        headers['If-None-Match'] = meta['etag']
+    if cached is not None and meta['last_modified']:
+        headers['If-Modified-Since'] = meta['last_modified']
+
+    for attempt in range(RETRIES + 1):
+        try:
+            r = get_session().get(url, headers=headers, timeout=TIMEOUT)
+            if r.status_code == 429 or r.status_code >= 500:
+                raise requests.HTTPError(str(r.status_code) + ' for ' + url, response=r)
+            r.raise_for_status()
+            break
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+            retryable = e.response is None or e.response.status_code == 429 or e.response.status_code >= 500
+            if not retryable or attempt == RETRIES:
+                raise
+            time.sleep(BACKOFF * 2 ** attempt)
+
+    if r.status_code == 304 and cached is not None:
+        write_cache(url, body, meta['etag'], meta['last_modified'])
+        return(json.loads(body))
+    write_cache(url, r.content, r.headers.get('ETag'), r.headers.get('Last-Modified'))
+    return(r.json())
+
+def fetch(endpoint, ttl=None):
+    '''
+    Memoised get_json. Responses are kept for the rest of the run (see new_run)
+    or for ttl seconds if given, falling back to RUN_TTL.
+
+    Args: endpoint, path relative to API_URL
+          ttl, seconds a response stays fresh
+    Returns: decoded json, shared between callers so treat it as read only
+    '''
+    ttl = RUN_TTL if ttl is None else ttl
+    with _memo_lock:
+        hit = _memo.get(endpoint)
+    if hit is not None and (ttl is None or time.monotonic() - hit[0] < ttl):
+        return(hit[1])
+    data = get_json(endpoint)
+    with _memo_lock:
+        _memo[endpoint] = (time.monotonic(), data)
+        if endpoint == 'bootstrap-static/':
+            _frames.clear()
+    return(data)
+
+def new_run():
+    '''
+    Forgets every memoised response so the next run sees fresh data.
+    '''
+    with _memo_lock:
+        _memo.clear()
+        _frames.clear()
+
+def bootstrap():
+    '''
+    Returns: bootstrap-static json, downloaded at most once per run
+    '''
+    return(fetch('bootstrap-static/'))
+
+def bootstrap_frame(key):
+    '''
+    Parses one list from bootstrap-static in to a dataframe, once per download.
+    A shallow copy is handed out so callers can add or drop columns freely.
+
+    Args: key, 'elements', 'events', or 'teams'
+    Returns: Dataframe
+    '''
+    data = bootstrap()
+    with _memo_lock:
+        frame = _frames.get(key)
+        if frame is None:
+            frame = _frames[key] = pd.DataFrame(data[key])
+    return(frame.copy(deep=False))
+
+def elements():
+    '''
+    Returns: Dataframe of every player in bootstrap-static
+    '''
+    return(bootstrap_frame('elements'))
+
+def events():
+    '''
+    Returns: Dataframe of every gameweek in bootstrap-static
+    '''
+    return(bootstrap_frame('events'))
+
+def teams():
+    '''
+    Returns: Dataframe of every club in bootstrap-static
+    '''
+    return(bootstrap_frame('teams'))
+
+def get_many_json(endpoints, max_in_flight=MAX_IN_FLIGHT):
+    '''
+    Fetches many endpoints concurrently over the shared session with at most
+    max_in_flight requests outstanding at once. Memoised like fetch.
+
+    Args: endpoints, iterable of paths relative to API_URL
+          max_in_flight, maximum number of concurrent requests
+    Returns: list of decoded json in the same order as endpoints
+    '''
+    endpoints = list(endpoints)
+    if max_in_flight <= 1:
+        return([fetch(e) for e in endpoints])
+    get_session(max_in_flight)
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        return(list(pool.map(fetch, endpoints)))
+
+def element_summaries(element_ids, max_in_flight=MAX_IN_FLIGHT):
+    '''
+    Returns: list of element-summary json for each element id given
+    '''
+    return(get_many_json(["element-summary/" + str(i) + "/" for i in element_ids], max_in_flight))
+
+def league_standings(league_id):
+    '''
+    Reads every page of a classic leagues standings, following has_next.
+
+    Returns: Dataframe of every entry in the league [Entry, Player Name, Entry Name, Rank, Total, ...]
+    '''
+    results, page, has_next = [], 1, True
+    while has_next:
+        standings = fetch("leagues-classic/" + str(league_id) + "/standings/?page_standings=" + str(page))['standings']
+        results += standings['results']
+        has_next = standings['has_next']
+        page += 1
+    if not results:
+        return(pd.DataFrame(columns=['entry', 'player_name', 'entry_name', 'rank', 'total']))
+    return(pd.DataFrame(results))
+
+def entry_histories(entry_ids, max_in_flight=MAX_IN_FLIGHT):
+    '''
+    Returns: list of entry history json for each entry id given
+    '''
+    return(get_many_json(["entry/" + str(i) + "/history/" for i in entry_ids], max_in_flight))
@@ -0,0 +1,141 @@
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+import FPLapi
+import FPLgorithm
+import FPLhistory
+import FPLratings
+import FPLsolver
+import FPLtimiser
+
+REPORT_PATH = '../Output/backtest.csv'
+
+_history = None
+
+def init_worker(history, offline):
+    '''
+    Gives each worker process the recorded season once rather than with every gameweek.
+    '''
+    global _history
+    _history = history
+    FPLapi.OFFLINE = offline
+
+def recorded_inputs(history, gameweek, gameweeks, horizon):
+    '''
+    Rebuilds what the pipeline would have seen just after gameweek finished using recorded history only.
+    Future fixtures are the recorded rows of the following rounds, prices are each players value at
+    gameweek, and as there's no record of past injury statuses everyone is available.
+
+    Args: history, see FPLhistory.read_history
+          gameweek, the last finished gameweek at the time
+          gameweeks, the number of past gameweeks that are taken in to consideration
+          horizon, the number of future gameweeks to project
+    Returns: player_data, fixtures: see FPLgorithm.get_player_data
+             elements_df: see FPLgorithm.shape_for_optimiser
+    '''
+    window = history.loc[(history['round'] > gameweek - gameweeks) & (history['round'] <= gameweek)]
+    player_data = FPLratings.remove_flagged_players(FPLratings.add_player_details(window))
+
+    details = FPLapi.elements()[['id', 'first_name', 'second_name', 'web_name', 'element_type', 'team']]
+    future = history.loc[(history['round'] > gameweek) & (history['round'] <= gameweek + horizon)]
+    fixtures = future[['element', 'round', 'opponent_team', 'was_home']].rename(columns={'round': 'event', 'was_home': 'is_home'})
+    fixtures = pd.merge(fixtures, details, left_on='element', right_on='id').drop(columns=['id'])
+
+    price = history.loc[history['round'] <= gameweek].drop_duplicates('element', keep='last')[['element', 'value']]
+    elements_df = pd.merge(details[['id', 'team']], price, left_on='id', right_on='element').drop(columns=['element'])
+    elements_df = elements_df.rename(columns={'value': 'now_cost'})
+    elements_df['status'] = 'a'
+    return(player_data, fixtures, elements_df)
+
+def evaluate_gameweek(gameweek, gameweeks, horizon, solver):
+    '''
+    Picks a wildcard squad with the data available after gameweek and scores its first week
+    against what actually happened in gameweek + 1.
+    Each gameweek starts from an empty squad with 100m so gameweeks can be evaluated independently.
+    If no one has a fixture in gameweek + 1 in the history store (a blank gameweek, or the season
+    has ended) there's nothing to score, so nothing is solved and the gameweek is recorded as Skipped.
+
+    Returns: dict of results for the gameweek
+    '''
+    start = time.perf_counter()
+    history = _history
+    player_data, fixtures, elements_df = recorded_inputs(history, gameweek, gameweeks, horizon)
+    projection = FPLratings.calculate_projected_scores(player_data, fixtures)
+    no_team = pd.DataFrame({'element': np.zeros(0, dtype=np.int64), 'in_team': np.zeros(0)})
+    data = FPLgorithm.shape_for_optimiser(projection, elements_df, no_team)
+    week = 'w' + str(gameweek + 1)
+    if week not in data.columns:
+        print('No fixtures in gameweek ' + str(gameweek + 1) + ', skipping it')
+        return({'gameweek': gameweek + 1, 'status': 'Skipped', 'seconds': time.perf_counter() - start})
+
+    squad_df, start_df, strong_bench_df, cap_df, solve_report, plan_df = FPLtimiser.optimise(data, 15, 1000, solver)
+
+    actual = history.loc[history['round'] == gameweek + 1].groupby('element')['total_points'].sum()
+    projected = data.set_index('element')[week]
+    xi = start_df.loc[start_df['start_' + week] == 1, 'element']
+    captain = cap_df.loc[cap_df['cap_' + week] == 1, 'element']
+    picked = pd.concat([xi, captain])
+
+    compared = pd.concat([projected, actual], axis=1, keys=['projected', 'actual']).dropna()
+    return({'gameweek': gameweek + 1,
+            'projected_points': projected.reindex(picked).fillna(0).sum(),
+            'actual_points': actual.reindex(picked).fillna(0).sum(),
+            'best_player_points': actual.max(),
+            'projection_mae': (compared['projected'] - compared['actual']).abs().mean(),
+            'projection_corr': compared['projected'].corr(compared['actual']),
+            'status': solve_report['status'],
+            'gap': solve_report['gap'],
+            'solve_seconds': solve_report['seconds'],
+            'seconds': time.perf_counter() - start})
+
+def backtest(first, last, gameweeks, horizon, workers, solver):
+    '''
+    Replays the recorded season from the history store, evaluating every gameweek from first to last
+    in a pool of worker processes. Runs entirely from the history store and cached API responses.
+
+    Args: first, last: the first and last gameweeks whose data is used to pick a team
+          gameweeks: the number of past gameweeks that are taken in to consideration
+          horizon: the number of weeks the optimiser plans ahead
+          workers: number of worker processes
+          solver: see FPLsolver.solver_settings
+    Returns: Dataframe of results per gameweek, also written to REPORT_PATH, skipped gameweeks (see
+             evaluate_gameweek) have only their status and time
+    '''
+    history = FPLhistory.read_history()
+    last = min(last, history['round'].max() - 1)
+    evaluate = partial(evaluate_gameweek, gameweeks=gameweeks, horizon=horizon, solver=solver)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(history, FPLapi.OFFLINE)) as pool:
+        report = pd.DataFrame(pool.map(evaluate, range(first, last + 1)))
+
+    report.to_csv(REPORT_PATH, index=False)
+    print(report.to_string(index=False))
+    print('Total actual points: ' + str(report['actual_points'].sum()) +
+          ', per gameweek: ' + str(round(report['actual_points'].mean(), 2)) +
+          ', projected per gameweek: ' + str(round(report['projected_points'].mean(), 2)) +
+          ', projection MAE: ' + str(round(report['projection_mae'].mean(), 3)) +
+          ', correlation: ' + str(round(report['projection_corr'].mean(), 3)) +
+          ', not optimal: ' + str((~report['status'].isin(['Optimal', 'Skipped'])).sum()) +
+          ', skipped: ' + str((report['status'] == 'Skipped').sum()))
+    return(report)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backtests the algorithm on the recorded season')
+    parser.add_argument('--first', type=int, default=8, help='first gameweek to pick a team after')
+    parser.add_argument('--last', type=int, default=37, help='last gameweek to pick a team after')
+    parser.add_argument('--gameweeks', type=int, default=8)
+    parser.add_argument('--horizon', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--solver', default=FPLsolver.SOLVER)
+    parser.add_argument('--threads', type=int, default=1, help='per worker process')
+    parser.add_argument('--gap', type=float, default=None)
+    parser.add_argument('--time-limit', type=int, default=300)
+    parser.add_argument('--node-limit', type=int, default=None)
+    args = parser.parse_args()
+    FPLapi.OFFLINE = True
+    solver = FPLsolver.solver_settings(args.solver, args.threads, args.gap, args.time_limit, args.node_limit)
+    backtest(args.first, args.last, args.gameweeks, args.horizon, args.workers, solver)
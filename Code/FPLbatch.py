@@ -0,0 +1,127 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+import FPLapi
+import FPLgorithm
+import FPLhistory
+import FPLratings
+import FPLrolling
+import FPLsolver
+import FPLtimiser
+
+OUTPUT_DIR = '../Output/batch'
+SUMMARY_PATH = os.path.join(OUTPUT_DIR, 'summary.csv')
+
+_shared = {}
+
+def init_worker(data, unavailable, offline):
+    '''
+    Gives each worker process the projections once rather than with every team.
+    '''
+    _shared['data'] = data
+    _shared['unavailable'] = unavailable
+    FPLapi.OFFLINE = offline
+
+def get_current_teams(team_ids, max_in_flight=FPLapi.MAX_IN_FLIGHT):
+    '''
+    Downloads the picks of every team concurrently, see FPLgorithm.get_current_team.
+
+    Returns: list of (team id, current team, money in the bank or None if the API doesn't say)
+    '''
+    events_df = FPLapi.events()
+    next_gw = events_df.loc[events_df['is_next'] == True]['id'].iloc[0]
+    picks = FPLapi.get_many_json(["entry/" + str(team_id) + "/event/" + str(next_gw - 1) + "/picks/" for team_id in team_ids],
+                                 max_in_flight)
+    teams = []
+    for team_id, json in zip(team_ids, picks):
+        current_team = pd.DataFrame(json['picks'])[['element']]
+        current_team['in_team'] = 1
+        teams.append((team_id, current_team, json.get('entry_history', {}).get('bank')))
+    return(teams)
+
+def optimise_team(team, transfers, in_bank, solver, sinks=('excel',)):
+    '''
+    Optimises one team from the shared projections and writes its plan to OUTPUT_DIR.
+
+    Args: team, see get_current_teams
+          transfers, in_bank: see FPLgorithm.fpl_algorithm, in_bank only if the API didn't give the teams bank
+          solver, see FPLsolver.solver_settings
+          sinks, what to write the plan as, see FPLtimiser.write_plan
+    Returns: dict summary of the teams plan
+    '''
+    team_id, current_team, bank = team
+    data = _shared['data'].copy()
+    data['in_team'] = data['element'].isin(current_team['element']).astype(float)
+    bank = in_bank if bank is None else bank
+    frames = FPLtimiser.optimise(data, transfers, bank, solver, unavailable=_shared['unavailable'])
+    squad_df, start_df, strong_bench_df, cap_df, report, plan_df = frames
+    FPLtimiser.write_plan(os.path.join(OUTPUT_DIR, 'optimal_teams_' + str(team_id)), plan_df, frames[:4], sinks)
+
+    week = squad_df.columns[4]
+    picked = squad_df.loc[squad_df[week] > 0.5]
+    captain = cap_df.loc[cap_df['cap_' + week[len('squad_'):]] > 0.5, 'name']
+    return({'team_id': team_id, 'status': report['status'], 'objective': report['objective'], 'gap': report['gap'],
+            'transfers_in': ', '.join(picked.loc[picked['in_team'] == 0, 'name']),
+            'transfers_out': ', '.join(data.loc[(data['in_team'] == 1) & ~data['element'].isin(picked['element']), 'name']),
+            'captain': captain.iloc[0] if len(captain) else '',
+            'seconds': report['seconds']})
+
+def fpl_batch(team_ids, gameweeks, transfers, in_bank, workers=None, solver=None, sinks=('excel',)):
+    '''
+    Runs the algorithm for many teams, e.g. every team in a mini-league. The data is downloaded and
+    projected once, every teams picks are downloaded concurrently and the teams are optimised in a
+    pool of worker processes, each writing its own plan to OUTPUT_DIR.
+
+    Args: team_ids, list of FPL IDs
+          gameweeks, transfers, in_bank: see FPLgorithm.fpl_algorithm
+          workers, number of worker processes
+          solver, see FPLsolver.solver_settings
+          sinks, what to write each plan as, see FPLtimiser.write_plan, csv or parquet are much quicker than excel
+    Returns: Dataframe summary of each teams plan, also written to SUMMARY_PATH
+    '''
+    start = time.perf_counter()
+    FPLapi.new_run()
+    FPLhistory.sync()
+    fixtures = FPLgorithm.get_fixtures()
+    normalised, ppg = FPLrolling.update(gameweeks)
+    projected_scores = FPLratings.project_fixtures(fixtures, normalised, ppg)
+    no_team = pd.DataFrame({'element': np.zeros(0, dtype=np.int64), 'in_team': np.zeros(0)})
+    data = FPLgorithm.shape_for_optimiser(projected_scores, FPLapi.elements(), no_team)
+    teams = get_current_teams(team_ids)
+    print('Projections Ready! ' + str(len(teams)) + ' teams in ' + str(round(time.perf_counter() - start, 2)) + 's')
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    optimise = partial(optimise_team, transfers=transfers, in_bank=in_bank, solver=solver, sinks=sinks)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(data, FPLgorithm.get_unavailable(), FPLapi.OFFLINE)) as pool:
+        summary = pd.DataFrame(pool.map(optimise, teams))
+
+    summary.to_csv(SUMMARY_PATH, index=False)
+    print(summary.to_string(index=False))
+    print(str(len(teams)) + ' teams in ' + str(round(time.perf_counter() - start, 2)) + 's')
+    return(summary)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Produces an optimal FPL team for each of many teams')
+    parser.add_argument('team_ids', type=int, nargs='+')
+    parser.add_argument('--gameweeks', type=int, default=FPLgorithm.gameweeks)
+    parser.add_argument('--transfers', type=int, default=FPLgorithm.transfers, help='free transfers of every team')
+    parser.add_argument('--in-bank', type=float, default=FPLgorithm.in_bank, help='for teams whose bank the API does not give')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--offline', action='store_true')
+    parser.add_argument('--solver', default=FPLsolver.SOLVER)
+    parser.add_argument('--threads', type=int, default=1, help='per worker process')
+    parser.add_argument('--gap', type=float, default=None)
+    parser.add_argument('--time-limit', type=int, default=FPLsolver.TIME_LIMIT)
+    parser.add_argument('--output', type=FPLgorithm.output_sinks, default=['excel'],
+                        help='what to write each plan as, comma separated from ' + ', '.join(FPLtimiser.SINKS))
+    args = parser.parse_args()
+    FPLapi.OFFLINE = FPLapi.OFFLINE or args.offline
+    solver = FPLsolver.solver_settings(args.solver, args.threads, args.gap, args.time_limit)
+    fpl_batch(args.team_ids, args.gameweeks, args.transfers, args.in_bank, args.workers, solver, args.output)
@@ -0,0 +1,414 @@
+import argparse
+import itertools
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pulp
+
+import FPLapi
+import FPLgorithm
+import FPLhistory
+import FPLsolver
+import FPLstandin
+import FPLtimiser
+
+def start_standin(port=8765, latency=0.02, **season):
+    '''
+    Starts the stand-in FPL API in a background thread and points FPLapi at it.
+    '''
+    server = FPLstandin.serve(port, latency, **season)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    FPLapi.API_URL = 'http://127.0.0.1:' + str(port) + '/api/'
+    return(server)
+
+def bench_fetch(max_in_flight, latency):
+    '''
+    Times downloading every element-summary serially and with max_in_flight concurrent requests.
+    '''
+    server = start_standin(latency=latency)
+    FPLapi.CACHE_DIR = tempfile.mkdtemp()
+    elements = range(1, len(FPLapi.get_json('bootstrap-static/')['elements']) + 1)
+    for n in [1, max_in_flight]:
+        FPLapi.new_run()
+        start = time.perf_counter()
+        FPLapi.element_summaries(elements, n)
+        print('max_in_flight=' + str(n) + ': ' + str(round(time.perf_counter() - start, 2)) + 's')
+        shutil.rmtree(FPLapi.CACHE_DIR)
+    server.shutdown()
+
+def bench_cache(max_in_flight, latency):
+    '''
+    Times downloading every element-summary with a cold disk cache, revalidating
+    against the server, within the cache TTL, and offline.
+    '''
+    server = start_standin(latency=latency)
+    FPLapi.CACHE_DIR = tempfile.mkdtemp()
+    elements = range(1, len(FPLapi.get_json('bootstrap-static/')['elements']) + 1)
+    for label, ttl, offline in [('cold', None, False), ('revalidate', None, False),
+                                ('ttl', 3600, False), ('offline', None, True)]:
+        FPLapi.new_run()
+        FPLapi.CACHE_TTL, FPLapi.OFFLINE = ttl, offline
+        start = time.perf_counter()
+        FPLapi.element_summaries(elements, max_in_flight)
+        print(label + ': ' + str(round(time.perf_counter() - start, 2)) + 's')
+    FPLapi.CACHE_TTL, FPLapi.OFFLINE = None, False
+    shutil.rmtree(FPLapi.CACHE_DIR)
+    server.shutdown()
+
+def bench_ingest(repeat):
+    '''
+    Measures CPU time and peak python memory of get_player_data building the history store
+    from scratch. Responses are cached first so only parsing is timed.
+    '''
+    server = start_standin(latency=0)
+    FPLapi.CACHE_DIR = tempfile.mkdtemp()
+    FPLapi.CACHE_TTL = 3600
+    FPLapi.element_summaries(range(1, len(FPLapi.get_json('bootstrap-static/')['elements']) + 1))
+    for _ in range(repeat):
+        FPLhistory.STORE_DIR = tempfile.mkdtemp()
+        tracemalloc.start()
+        start = time.process_time()
+        FPLgorithm.get_player_data(8)
+        cpu = time.process_time() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        shutil.rmtree(FPLhistory.STORE_DIR)
+        print('cpu ' + str(round(cpu, 3)) + 's, peak ' + str(round(peak / 2**20, 1)) + 'MB')
+    FPLapi.CACHE_TTL = None
+    shutil.rmtree(FPLapi.CACHE_DIR)
+    server.shutdown()
+
+def synthetic_projections(players=600, weeks=8, seed=0):
+    '''
+    Makes random projected scores in the layout of FPLgorithm.prepare_for_optimiser.
+    '''
+    rng = np.random.RandomState(seed)
+    data = pd.DataFrame({'element': np.arange(1, players + 1),
+                         'name': ['Player' + str(i) for i in range(1, players + 1)],
+                         'element_type': rng.choice([1, 2, 3, 4], players, p=[0.1, 0.33, 0.4, 0.17]),
+                         'now_cost': rng.randint(40, 130, players),
+                         'team': rng.randint(1, 21, players)})
+    for w in range(1, weeks + 1):
+        data['w' + str(w)] = rng.gamma(2, 1.5, players)
+    data['in_team'] = 0.0
+    for i in range(1, 21):
+        data['team' + str(i)] = np.where(data['team'] == i, 1, 0)
+    for position, element_type in [('GK', 1), ('Def', 2), ('Mid', 3), ('Att', 4)]:
+        data[position] = (data['element_type'] == element_type).astype(float)
+    return(data)
+
+def lpsum_problem(model):
+    '''
+    Creates the same problem as FPLtimiser.to_problem one pulp.lpSum per constraint, the way
+    the optimiser used to build it, to compare against.
+    '''
+    variables = [pulp.LpVariable(name, low, up, category) for name, low, up, category in
+                 zip(model['names'], model['low'], model['up'], model['category'])]
+    prob = pulp.LpProblem("Optimiser", pulp.LpMaximize)
+    prob += pulp.lpSum([c * variables[j] for j, c in enumerate(model['objective']) if c != 0])
+    order = np.argsort(model['row'], kind='stable')
+    bounds = np.searchsorted(model['row'][order], np.arange(len(model['sense']) + 1))
+    col, value = model['col'][order], model['value'][order]
+    for r, (sense, rhs) in enumerate(zip(model['sense'], model['rhs'])):
+        terms = pulp.lpSum([v * variables[j] for j, v in zip(col[bounds[r]:bounds[r + 1]], value[bounds[r]:bounds[r + 1]])])
+        if sense == -1:
+            prob += terms <= rhs
+        elif sense == 1:
+            prob += terms >= rhs
+        else:
+            prob += terms == rhs
+    return(prob)
+
+def bench_build(players, horizons):
+    '''
+    Times building the optimisers model for each horizon: the sparse arrays, the pulp problem made from
+    them, the pulp problem made one lpSum at a time, and writing it as MPS in bulk and through pulp.
+    '''
+    data = synthetic_projections(players, max(horizons))
+    directory = tempfile.mkdtemp()
+    print('weeks  rows   nonzeros  arrays  to_problem  lpSum  speedup  write_mps  pulp writeLP')
+    for weeks in horizons:
+        horizon = data.drop(columns=['w' + str(w) for w in range(weeks + 1, max(horizons) + 1)])
+        times = []
+        for step in range(5):
+            start = time.perf_counter()
+            if step == 0:
+                model = FPLtimiser.build_model(horizon, 15, 1000)
+            elif step == 1:
+                prob, variables = FPLtimiser.to_problem(model)
+            elif step == 2:
+                lpsum_problem(model)
+            elif step == 3:
+                FPLsolver.write_mps(model, directory + '/model.mps')
+            else:
+                prob.writeLP(directory + '/model.lp')
+            times.append(time.perf_counter() - start)
+        print(str(weeks).rjust(5) + str(len(model['sense'])).rjust(7) + str(len(model['value'])).rjust(11) +
+              ''.join([str(round(t, 3)).rjust(w) for t, w in zip(times[:3], [8, 12, 7])]) +
+              (str(round(times[2] / (times[0] + times[1]), 1)) + 'x').rjust(9) +
+              ''.join([str(round(t, 3)).rjust(w) for t, w in zip(times[3:], [11, 14])]))
+    shutil.rmtree(directory)
+
+def synthetic_team(players, weeks):
+    '''
+    Makes synthetic projections with a current team, the best wildcard team for the first week.
+    
+    Returns: the projections, see synthetic_projections, and the money left in the bank
+    '''
+    data = synthetic_projections(players, weeks)
+    wildcard = FPLtimiser.optimise(data.drop(columns=['w' + str(w) for w in range(2, weeks + 1)]), 15, 1000,
+                                   FPLsolver.solver_settings('PULP_CBC_CMD'))[0]
+    data['in_team'] = data['element'].isin(wildcard['element']).astype(float)
+    return(data, 1000 - data['in_team'] @ data['now_cost'])
+
+def bench_warm(players, weeks, solvers, time_limits):
+    '''
+    Times to a good solution of a weeks long plan with one free transfer: solving cold, starting from the
+    current team, and starting from the plan of a run on slightly different projections (the last run),
+    compared by the objective each reaches within each time limit.
+    '''
+    data, bank = synthetic_team(players, weeks)
+    columns = ['w' + str(w) for w in range(1, weeks + 1)]
+    last_run = data.copy()
+    last_run[columns] *= np.random.RandomState(1).uniform(0.9, 1.1, (players, weeks))
+    directory = tempfile.mkdtemp()
+    plan = FPLtimiser.optimise(last_run, 1, bank, FPLsolver.solver_settings('PULP_CBC_CMD', gap=0.01))[0]
+    FPLtimiser.save_previous(plan, directory + '/previous.csv')
+    previous = FPLtimiser.read_previous(directory + '/previous.csv')
+    shutil.rmtree(directory)
+    
+    rows = []
+    for name in solvers:
+        for time_limit in time_limits:
+            for start_from in ['cold', 'current team', 'last run']:
+                report = FPLtimiser.optimise(data, 1, bank, FPLsolver.solver_settings(name, time_limit=time_limit),
+                                             previous=previous if start_from == 'last run' else None,
+                                             warm_start=start_from != 'cold')[4]
+                rows.append({'solver': name, 'time_limit': time_limit, 'start_from': start_from, 'start': report['start'],
+                             'status': report['status'], 'objective': report['objective'], 'bound': report['bound'],
+                             'seconds': round(report['seconds'], 2)})
+    print(pd.DataFrame(rows).to_string(index=False))
+
+def bench_resolve(players, weeks, runs, solver):
+    '''
+    Times back to back what-if runs, each with the projections moved by up to 10% and three players
+    made unavailable, building the model every time against reusing it. Setup is everything but the solve.
+    '''
+    data, bank = synthetic_team(players, weeks)
+    columns = ['w' + str(w) for w in range(1, weeks + 1)]
+    rng = np.random.RandomState(1)
+    directory = tempfile.mkdtemp()
+    FPLtimiser.MODEL_PATH = directory + '/model.npz'
+    rows = []
+    for run in range(runs):
+        what_if = data.copy()
+        what_if[columns] *= rng.uniform(0.9, 1.1, (players, weeks))
+        unavailable = what_if['element'].sample(3, random_state=run)
+        for reuse in [False, True]:
+            start = time.perf_counter()
+            report = FPLtimiser.optimise(what_if, 1, bank, FPLsolver.solver_settings(solver), reuse=reuse, unavailable=unavailable)[4]
+            seconds = time.perf_counter() - start
+            rows.append({'run': run + 1, 'reuse': reuse, 'objective': report['objective'], 'setup': round(seconds - report['seconds'], 3),
+                         'solve': round(report['seconds'], 2), 'total': round(seconds, 2)})
+    shutil.rmtree(directory)
+    print(pd.DataFrame(rows).to_string(index=False))
+
+def bench_rolling(players, weeks, windows, coarse, solver, gap, time_limit):
+    '''
+    Compares planning weeks weeks with one free transfer in one model against the rolling horizon
+    for each window, by objective and time. The monolithic models best bound shows how far from
+    optimal each plan could be, and each rolling plan is checked against the constraints of the whole horizon.
+    '''
+    data, bank = synthetic_team(players, weeks)
+    model = FPLtimiser.build_model(data, 1, bank)
+    rows = []
+    for window in [None] + windows:
+        settings = FPLsolver.solver_settings(solver, gap=gap, time_limit=time_limit)
+        if window is None:
+            squad_df, start_df, strong_bench_df, cap_df, report, plan_df = FPLtimiser.optimise(data, 1, bank, settings)
+        else:
+            squad_df, start_df, strong_bench_df, cap_df, report, plan_df = FPLtimiser.rolling_horizon(data, 1, bank, window, coarse, settings)
+        squads = FPLtimiser.squads_frame(squad_df).set_index('element').reindex(data['element']).fillna(0)
+        valid = FPLtimiser.feasible(model, FPLtimiser.assignment(data, model, 1, squads.to_numpy().T))
+        rows.append({'window': 'all' if window is None else window, 'status': report['status'], 'objective': report['objective'],
+                     'bound': report.get('bound'), 'valid': valid, 'seconds': round(report['seconds'], 1)})
+    print(pd.DataFrame(rows).to_string(index=False))
+
+def bench_chips(players, weeks, chips, solver, gap, time_limit):
+    '''
+    Compares choosing the chip weeks in one solve against re-running the optimiser for every way of
+    playing the chips in different weeks (or not at all), by objective and total time.
+    '''
+    data, bank = synthetic_team(players, weeks)
+    columns = list(data.columns[5:-25])
+    settings = FPLsolver.solver_settings(solver, gap=gap, time_limit=time_limit)
+    squad_df, start_df, strong_bench_df, cap_df, report, plan_df = FPLtimiser.optimise(data, 1, bank, settings, chips={chip: None for chip in chips})
+    rows = [{'approach': 'one model', 'solves': 1, 'status': report['status'], 'objective': report['objective'],
+             'chips': report['chips'], 'seconds': round(report['seconds'], 1)}]
+    
+    best, seconds, statuses = None, 0, []
+    for played in itertools.product([None] + columns, repeat=len(chips)):
+        weeks_played = [week for week in played if week is not None]
+        if len(set(weeks_played)) < len(weeks_played):
+            continue
+        forced = {chip: week for chip, week in zip(chips, played) if week is not None}
+        squad_df, start_df, strong_bench_df, cap_df, report, plan_df = FPLtimiser.optimise(data, 1, bank, settings, chips=forced)
+        seconds += report['seconds']
+        statuses.append(report['status'])
+        if best is None or report['objective'] > best['objective']:
+            best = {'objective': report['objective'], 'chips': {chip: forced.get(chip) for chip in chips}}
+    rows.append({'approach': 'rerun per chip week', 'solves': len(statuses),
+                 'status': 'Optimal' if set(statuses) == {'Optimal'} else 'Feasible', 'objective': best['objective'],
+                 'chips': best['chips'], 'seconds': round(seconds, 1)})
+    print(pd.DataFrame(rows).to_string(index=False))
+
+def bench_heuristic(players, horizons, solver, time_limit, short_limit):
+    '''
+    Compares the heuristic against solving the model for each horizon with one free transfer: its time,
+    how far its objective is below the solvers and below the solvers best bound (its optimality gap),
+    and whether its plan meets every constraint. Also compares the solver stopped at short_limit
+    seconds starting from the current team against starting from the heuristics plan.
+    '''
+    rows = []
+    for weeks in horizons:
+        data, bank = synthetic_team(players, weeks)
+        squad_df, start_df, strong_bench_df, cap_df, report, plan_df = FPLtimiser.heuristic(data, 1, bank)
+        model = FPLtimiser.build_model(data, 1, bank)
+        squads = FPLtimiser.squads_frame(squad_df).set_index('element').reindex(data['element']).fillna(0)
+        valid = FPLtimiser.feasible(model, FPLtimiser.assignment(data, model, 1, squads.to_numpy().T))
+        milp = FPLtimiser.optimise(data, 1, bank, FPLsolver.solver_settings(solver, time_limit=time_limit))[4]
+        short = FPLsolver.solver_settings(solver, time_limit=short_limit)
+        rows.append({'weeks': weeks, 'heuristic': report['objective'], 'heuristic_seconds': round(report['seconds'], 3),
+                     'valid': valid, 'milp': milp['objective'], 'bound': milp['bound'], 'milp_seconds': round(milp['seconds'], 1),
+                     'gap_to_milp': (milp['objective'] - report['objective']) / milp['objective'],
+                     'gap_to_bound': (milp['bound'] - report['objective']) / milp['bound'],
+                     'short_from_team': FPLtimiser.optimise(data, 1, bank, short)[4]['objective'],
+                     'short_from_heuristic': FPLtimiser.optimise(data, 1, bank, short, heuristic_start=True)[4]['objective']})
+    print(pd.DataFrame(rows).to_string(index=False))
+
+def bench_league(league_size, latency, max_in_flight):
+    '''
+    Times getting the rank history of every entry in a league: one history at a time, then through the
+    league store (see FPLhistory.sync_league) empty, and again once it's up to date.
+    '''
+    server = start_standin(latency=latency, league_size=league_size)
+    FPLapi.CACHE_DIR = tempfile.mkdtemp()
+    FPLhistory.STORE_DIR = tempfile.mkdtemp()
+    entries = FPLapi.league_standings(1)['entry']
+    FPLapi.new_run()
+    start = time.perf_counter()
+    FPLapi.entry_histories(entries, 1)
+    print('serial: ' + str(round(time.perf_counter() - start, 2)) + 's')
+    shutil.rmtree(FPLapi.CACHE_DIR)
+    for label in ['store empty', 'store up to date']:
+        FPLapi.new_run()
+        start = time.perf_counter()
+        FPLhistory.sync_league(1, max_in_flight)
+        print(label + ': ' + str(round(time.perf_counter() - start, 2)) + 's')
+    shutil.rmtree(FPLapi.CACHE_DIR, ignore_errors=True)
+    shutil.rmtree(FPLhistory.STORE_DIR)
+    server.shutdown()
+
+def bench_coldstart(repeat, modules):
+    '''
+    Times a fresh interpreter starting and importing each of modules, the cold start of a run before any
+    work is done, and reports whether the plotting stack was imported along with it.
+    '''
+    check = ('import sys, time; start = time.perf_counter(); import {0}; '
+             'print(time.perf_counter() - start, \'matplotlib\' in sys.modules)')
+    rows = []
+    for module in modules:
+        imports, totals = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, '-c', check.format(module)], capture_output=True, text=True, check=True).stdout
+            totals.append(time.perf_counter() - start)
+            seconds, plotting = output.split()
+            imports.append(float(seconds))
+        rows.append({'module': module, 'import_seconds': round(np.median(imports), 3),
+                     'process_seconds': round(np.median(totals), 3), 'matplotlib': plotting == 'True'})
+    print(pd.DataFrame(rows).to_string(index=False))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks against the local stand-in FPL API')
+    sub = parser.add_subparsers(dest='bench', required=True)
+    fetch = sub.add_parser('fetch', help='element-summary download, serial vs concurrent')
+    fetch.add_argument('--max-in-flight', type=int, default=FPLapi.MAX_IN_FLIGHT)
+    fetch.add_argument('--latency', type=float, default=0.02)
+    cache = sub.add_parser('cache', help='element-summary download through the on-disk cache')
+    cache.add_argument('--max-in-flight', type=int, default=FPLapi.MAX_IN_FLIGHT)
+    cache.add_argument('--latency', type=float, default=0.02)
+    ingest = sub.add_parser('ingest', help='cpu and memory of get_player_data from cached responses')
+    ingest.add_argument('--repeat', type=int, default=3)
+    build = sub.add_parser('build', help='optimiser model construction time per horizon')
+    build.add_argument('--players', type=int, default=600)
+    build.add_argument('--horizons', type=lambda text: [int(h) for h in text.split(',')], default=[1, 2, 4, 8])
+    warm = sub.add_parser('warm', help='objective reached within time limits, cold vs warm started')
+    warm.add_argument('--players', type=int, default=600)
+    warm.add_argument('--weeks', type=int, default=8)
+    warm.add_argument('--solvers', type=lambda text: text.split(','), default=['PULP_CBC_CMD'])
+    warm.add_argument('--time-limits', type=lambda text: [int(t) for t in text.split(',')], default=[2, 5, 15])
+    resolve = sub.add_parser('resolve', help='what-if re-runs, building the model each time vs reusing it')
+    resolve.add_argument('--players', type=int, default=600)
+    resolve.add_argument('--weeks', type=int, default=4)
+    resolve.add_argument('--runs', type=int, default=4)
+    resolve.add_argument('--solver', default='HiGHS')
+    rolling = sub.add_parser('rolling', help='monolithic model vs rolling horizon, objective and time')
+    rolling.add_argument('--players', type=int, default=400)
+    rolling.add_argument('--weeks', type=int, default=12)
+    rolling.add_argument('--windows', type=lambda text: [int(w) for w in text.split(',')], default=[1, 2, 3])
+    rolling.add_argument('--coarse', type=int, default=4)
+    rolling.add_argument('--solver', default='HiGHS')
+    rolling.add_argument('--gap', type=float, default=0.005)
+    rolling.add_argument('--time-limit', type=int, default=300)
+    chips = sub.add_parser('chips', help='chip weeks chosen in one model vs a re-run for every choice of weeks')
+    chips.add_argument('--players', type=int, default=300)
+    chips.add_argument('--weeks', type=int, default=3)
+    chips.add_argument('--chips', type=lambda text: text.split(','), default=['wildcard', 'bench_boost'])
+    chips.add_argument('--solver', default='HiGHS')
+    chips.add_argument('--gap', type=float, default=None)
+    chips.add_argument('--time-limit', type=int, default=300)
+    heuristic = sub.add_parser('heuristic', help='heuristic vs solver, time and optimality gap')
+    heuristic.add_argument('--players', type=int, default=600)
+    heuristic.add_argument('--horizons', type=lambda text: [int(h) for h in text.split(',')], default=[1, 2, 4])
+    heuristic.add_argument('--solver', default='HiGHS')
+    heuristic.add_argument('--time-limit', type=int, default=300)
+    heuristic.add_argument('--short-limit', type=int, default=5)
+    league = sub.add_parser('league', help='rank history of every entry in a league, serial vs the league store')
+    league.add_argument('--league-size', type=int, default=2000)
+    league.add_argument('--latency', type=float, default=0.02)
+    league.add_argument('--max-in-flight', type=int, default=FPLapi.MAX_IN_FLIGHT)
+    coldstart = sub.add_parser('coldstart', help='time to start python and import the modules of a run')
+    coldstart.add_argument('--repeat', type=int, default=5)
+    coldstart.add_argument('--modules', type=lambda text: text.split(','), default=['FPLgorithm', 'FPLtimiser', 'FPLgraph'])
+    args = parser.parse_args()
+
+    if args.bench == 'fetch':
+        bench_fetch(args.max_in_flight, args.latency)
+    elif args.bench == 'cache':
+        bench_cache(args.max_in_flight, args.latency)
+    elif args.bench == 'ingest':
+        bench_ingest(args.repeat)
+    elif args.bench == 'build':
+        bench_build(args.players, args.horizons)
+    elif args.bench == 'warm':
+        bench_warm(args.players, args.weeks, args.solvers, args.time_limits)
+    elif args.bench == 'resolve':
+        bench_resolve(args.players, args.weeks, args.runs, args.solver)
+    elif args.bench == 'rolling':
+        bench_rolling(args.players, args.weeks, args.windows, args.coarse, args.solver, args.gap, args.time_limit)
+    elif args.bench == 'chips':
+        bench_chips(args.players, args.weeks, args.chips, args.solver, args.gap, args.time_limit)
+    elif args.bench == 'heuristic':
+        bench_heuristic(args.players, args.horizons, args.solver, args.time_limit, args.short_limit)
+    elif args.bench == 'league':
+        bench_league(args.league_size, args.latency, args.max_in_flight)
+    elif args.bench == 'coldstart':
+        bench_coldstart(args.repeat, args.modules)
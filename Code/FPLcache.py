@@ -0,0 +1,153 @@
+import hashlib
+import os
+import pickle
+import threading
+
+import numpy as np
+import pandas as pd
+
+import FPLreport
+
+CACHE_DIR = os.environ.get('FPL_STAGE_CACHE_DIR', '../Data/stage_cache')
+CACHE_MAX_BYTES = int(float(os.environ.get('FPL_STAGE_CACHE_MB', 200)) * 2**20)
+ENABLED = os.environ.get('FPL_STAGE_CACHE', '') != '0'
+# the stages outputs also depend on the code that made them
+CODE_FILES = ['FPLgorithm.py', 'FPLratings.py', 'FPLhistory.py', 'FPLrolling.py', 'FPLsimulate.py', 'FPLcache.py']
+
+_code = []
+_cache_lock = threading.Lock()
+_cache_bytes = None
+
+def key(stage, *inputs):
+    '''
+    Content addressed key of a stage: a hash of its name, everything it's computed from and the code
+    that computes it, so a changed input or version is a new key rather than a stale entry.
+
+    Args: stage, name of the stage
+          inputs, dataframes, arrays, file digests (see file_digest), keys of earlier stages or parameters
+    Returns: hex digest
+    '''
+    if not _code:
+        here = os.path.dirname(os.path.abspath(__file__))
+        _code.append(file_digest(*[os.path.join(here, name) for name in CODE_FILES]))
+    h = hashlib.sha1(stage.encode())
+    update_hash(h, [_code[0]] + list(inputs))
+    return(h.hexdigest())
+
+def update_hash(h, value):
+    '''
+    Adds value to the hash h: dataframes and series by their columns, dtypes and hashed rows,
+    arrays by their bytes, and lists, tuples and dicts item by item.
+    '''
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        h.update(repr((type(value).__name__, list(value.columns) if isinstance(value, pd.DataFrame) else value.name,
+                       value.dtypes.astype(str).tolist() if isinstance(value, pd.DataFrame) else str(value.dtype))).encode())
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray) and value.dtype != object:
+        h.update(repr((value.dtype.str, value.shape)).encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        h.update(repr((type(value).__name__, len(value))).encode())
+        for item in value:
+            update_hash(h, item)
+    elif isinstance(value, dict):
+        h.update(repr(('dict', len(value))).encode())
+        for name in sorted(value, key=repr):
+            update_hash(h, name)
+            update_hash(h, value[name])
+    else:
+        h.update(repr(value).encode())
+
+def file_digest(*paths):
+    '''
+    Returns: hex digest of the contents of the files, a missing file counting as empty
+    '''
+    h = hashlib.sha1()
+    for path in paths:
+        h.update(path.encode())
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                h.update(f.read())
+    return(h.hexdigest())
+
+def cache_path(stage, stage_key):
+    '''
+    Returns: file the output of stage with stage_key is cached in
+    '''
+    return(os.path.join(CACHE_DIR, stage + '-' + stage_key + '.pkl'))
+
+def cached(stage, stage_key, compute, *args):
+    '''
+    Returns compute(*args), read from the cache if a run has already computed it for stage_key, see key,
+    otherwise computed and written to the cache. Reading touches the file so eviction is least recently
+    used first. Whether it was cached is added to the run report, see FPLreport.
+
+    Args: stage, name of the stage
+          stage_key, see key
+          compute, function giving the stages output, anything pickle can write
+    Returns: the output of compute
+    '''
+    path = cache_path(stage, stage_key)
+    if ENABLED:
+        try:
+            with open(path, 'rb') as f:
+                output = pickle.load(f)
+            os.utime(path)
+            FPLreport.add('cache', {'stage': stage, 'key': stage_key, 'hit': True})
+            print(stage + ' read from the stage cache')
+            return(output)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+    output = compute(*args)
+    FPLreport.add('cache', {'stage': stage, 'key': stage_key, 'hit': False})
+    if ENABLED:
+        write_cache(path, output)
+    return(output)
+
+def write_cache(path, output):
+    '''
+    Writes a stages output to the cache atomically and evicts the least recently used entries if the
+    cache has grown past CACHE_MAX_BYTES. The cache's size is only scanned for on the first write of
+    the run and kept up to date from then on.
+    '''
+    global _cache_bytes
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = path + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(output, f, protocol=pickle.HIGHEST_PROTOCOL)
+    with _cache_lock:
+        if _cache_bytes is None:
+            _cache_bytes = cache_size(CACHE_DIR, '.pkl')
+        if os.path.exists(path):
+            _cache_bytes -= os.path.getsize(path)
+        os.replace(tmp, path)
+        _cache_bytes += os.path.getsize(path)
+        if _cache_bytes > CACHE_MAX_BYTES:
+            _cache_bytes = evict_cache(int(CACHE_MAX_BYTES * 0.9), CACHE_DIR, '.pkl')
+
+def cache_size(directory, suffix):
+    '''
+    Returns: total bytes of the files ending in suffix in directory, the entries of an on-disk cache
+             (this stage cache or FPLapi's response cache)
+    '''
+    if not os.path.isdir(directory):
+        return(0)
+    return(sum(e.stat().st_size for e in os.scandir(directory) if e.name.endswith(suffix)))
+
+def evict_cache(max_bytes, directory, suffix):
+    '''
+    Deletes least recently used cache files until the cache holds at most max_bytes, see cache_size.
+
+    Returns: bytes left in the cache
+    '''
+    files = sorted((e.stat().st_mtime, e.stat().st_size, e.path) for e in os.scandir(directory) if e.name.endswith(suffix))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in files:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return(total)
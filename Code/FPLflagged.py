@@ -1,6 +1,8 @@
-import requests
 import pandas as pd
 
+import FPLapi
+import FPLhistory
+
 FLAGGEDLIST = '/home/McSpoish/flagged_players.csv'
 
 def fpl_flagged():
@@ -34,10 +36,7 @@ def get_current_player_status():
     Returns:
         Dataframe: element, status
     '''
-    url = "https://fantasy.premierleague.com/api/bootstrap-static/"
-    r = requests.get(url)
-    json = r.json()
-    elements_df = pd.DataFrame(json['elements'])
+    elements_df = FPLapi.elements()
     status = elements_df[['id', 'status']]
 
     return(status)
@@ -48,18 +47,9 @@ def get_current_gw_player_info():
     Returns:
         Dataframe: element, event, minutes
     '''
-    no_of_players = get_no_of_players()
-    player_data = []
-
-    for i in range(1, 570 + 1):
-        p_url = "https://fantasy.premierleague.com/api/element-summary/"+str(i)+"/"
-        rp = requests.get(p_url)
-        jsonp = rp.json()
-        data = pd.DataFrame(jsonp['history'])
-        data = data[['element', 'round', 'minutes']]
-        player_data.append(data)
-
-    player_data=pd.concat(player_data)
+    FPLhistory.sync()
+    player_data = FPLhistory.read_history(1)
+    player_data = player_data[['element', 'round', 'minutes']]
 
     gw = get_current_gw()
     players = player_data.loc[player_data['round'] == gw]
@@ -70,10 +60,7 @@ def get_current_gw():
     '''
     Returns: Current gameweek/event
     '''
-    url = "https://fantasy.premierleague.com/api/bootstrap-static/"
-    r = requests.get(url)
-    json = r.json()
-    events_df = pd.DataFrame(json['events'])
+    events_df = FPLapi.events()
     current_gw = events_df.loc[events_df['is_current'] == True]['id'].iloc[0]
 
     return(current_gw)
@@ -82,11 +69,7 @@ def get_no_of_players():
     '''
     Returns the number of football players with data for this season.
     '''
-    url = "https://fantasy.premierleague.com/api/bootstrap-static/"
-    r = requests.get(url)
-    json = r.json()
-    elements = pd.DataFrame(json['elements'])
-    return(len(elements))
+    return(len(FPLapi.elements()))
 
 if __name__ == '__main__':
     fpl_flagged()
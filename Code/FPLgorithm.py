@@ -1,9 +1,18 @@
-import requests
+import argparse
+import os
+
 import pandas as pd
 import numpy as np
 
-from FPLtimiser import fpl_optimiser
-import FPLgraph
+import FPLapi
+import FPLcache
+import FPLhistory
+import FPLratings
+import FPLreport
+import FPLrolling
+import FPLsimulate
+import FPLsolver
+from FPLtimiser import fpl_optimiser, CHIPS, SINKS
 
 algo = 3683471
 
@@ -12,8 +21,16 @@ gameweeks = 8
 transfers = 1
 in_bank = 2
 
+DOUBTFUL = 0.5
+LAST_EVENT = 27
+GRAPH_MODES = ['interactive', 'files', 'worker', 'none']
+# the player details the stages use, the rest (form, transfers, selected by, ...) change every few minutes
+ELEMENT_COLUMNS = ['id', 'element_type', 'team', 'team_code', 'first_name', 'second_name', 'web_name', 'now_cost', 'status']
+GRAPHS = os.environ.get('FPL_GRAPHS', 'interactive')
+
 
-def fpl_algorithm(team_id, gameweeks, transfers, in_bank):
+def fpl_algorithm(team_id, gameweeks, transfers, in_bank, simulate=None, scenarios=None, solver=None, window=None, coarse=4,
+                  plans=1, distinct=1, chips=None, engine='milp', sinks=('excel',), graphs=GRAPHS):
     '''
     The aim of this project was to see how well an algorithm could do purely using fpl points.
     
@@ -32,21 +49,82 @@ def fpl_algorithm(team_id, gameweeks, transfers, in_bank):
     These scores are then fed in to an optimiser that satisfies FPL logic such as position or
     team limits on players. This produces an excel workbook of squad, starting team, and captain
     for each week. Additionally visualisations are produced for fun.
-
-    '''
-    player_data, fixtures = get_player_data(gameweeks)
-    player_data = remove_flagged_players(player_data)
     
-    projected_scores = calculate_projected_scores(player_data, fixtures)
-    projected_scores_for_optimiser = prepare_for_optimiser(projected_scores, team_id)
+    If simulate is one of FPLsimulate.STATISTICS the projected scores are instead that statistic of
+    a Monte Carlo simulation of scenarios scenarios (FPLsimulate.SCENARIOS if None), see FPLsimulate.simulate.
+    The optimiser is solved with solver, see FPLsolver.solver_settings. Gameweeks up to LAST_EVENT are
+    planned, a week at a time if window is set, see FPLtimiser.rolling_horizon. If plans is more than 1 the
+    next best plans are also written, see FPLtimiser.top_plans. The optimiser picks the weeks to play
+    chips in, see FPLtimiser.build_model. With engine heuristic a good plan is found in well under a
+    second instead of solving the model, see FPLtimiser.heuristic. The plan is written to each of sinks,
+    see FPLtimiser.write_plan.
+    
+    The graphs (see FPLgraph, only imported if there are graphs) are shown if graphs is interactive,
+    saved to FPLgraph.FIGURE_DIR if files, saved by a worker process while the optimiser runs if worker,
+    or not drawn if none. Files and worker need no display.
     
-    fpl_optimiser(projected_scores_for_optimiser, transfers, in_bank)
-    FPLgraph.fpl_graphs(projected_scores_for_optimiser, player_data)
+    The time and peak memory of each stage, the size of the optimisers model and how each solve went
+    are written to FPLreport.REPORT_PATH as json, see FPLreport.
+    
+    The output of each stage up to the optimiser is cached on disk under a hash of what it's computed
+    from, see FPLcache, so a re-run with only the transfers or bank changed goes straight to the optimiser.
+
+    '''
+    FPLreport.new_run(team_id=team_id, gameweeks=gameweeks, transfers=transfers, in_bank=in_bank, simulate=simulate,
+                      scenarios=scenarios, solver=solver, window=window, coarse=coarse, plans=plans, distinct=distinct,
+                      chips=chips, engine=engine, sinks=sinks, graphs=graphs, last_event=LAST_EVENT)
+    FPLapi.new_run()
+    try:
+        with FPLreport.stage('fetch'):
+            FPLhistory.sync()
+            fetch_key = FPLcache.key('fetch', FPLcache.file_digest(FPLhistory.store_path('history'), FPLhistory.store_path('fixtures')),
+                                     FPLapi.elements()[ELEMENT_COLUMNS], gameweeks, LAST_EVENT)
+            player_data, fixtures = FPLcache.cached('fetch', fetch_key, read_player_data, gameweeks)
+        # the rows of flagged rounds are only needed to simulate and for the graphs
+        flag_key = None
+        if simulate is not None or graphs != 'none':
+            with FPLreport.stage('flag_removal'):
+                flag_key = FPLcache.key('flag_removal', fetch_key, FPLcache.file_digest(FPLratings.FLAGGED_PATH))
+                player_data = FPLcache.cached('flag_removal', flag_key, FPLratings.remove_flagged_players, player_data)
+        
+        with FPLreport.stage('projection'):
+            # never cached, as it brings Data/rolling_state.npz up to date
+            normalised, ppg = FPLrolling.update(gameweeks)
+            projection_key = FPLcache.key('projection', fetch_key, normalised, ppg, simulate, scenarios, FPLratings.HOME, FPLratings.AWAY,
+                                          flag_key if simulate is not None else None)
+            projected_scores = FPLcache.cached('projection', projection_key, project, player_data, fixtures, normalised, ppg,
+                                               simulate, scenarios)
+        with FPLreport.stage('prep'):
+            prep_key = FPLcache.key('prep', projection_key, get_current_team(team_id), DOUBTFUL)
+            projected_scores_for_optimiser = FPLcache.cached('prep', prep_key, prepare_for_optimiser, projected_scores, team_id)
+        
+        rendering = None
+        if graphs == 'worker':
+            with FPLreport.stage('graphs'):
+                import FPLgraph
+                rendering = FPLgraph.render_in_worker(FPLgraph.figure_data(projected_scores_for_optimiser,
+                                                                           FPLratings.attack_defense_ratings(player_data)))
+        
+        with FPLreport.stage('optimise'):
+            fpl_optimiser(projected_scores_for_optimiser, transfers, in_bank, solver, window, coarse, get_unavailable(), plans, distinct,
+                          chips, engine, sinks)
+        if graphs in ['interactive', 'files']:
+            with FPLreport.stage('graphs'):
+                import FPLgraph
+                FPLgraph.fpl_graphs(projected_scores_for_optimiser, FPLratings.attack_defense_ratings(player_data),
+                                    FPLgraph.FIGURE_DIR if graphs == 'files' else None)
+        elif rendering is not None:
+            with FPLreport.stage('graphs_wait'):
+                print('Figures saved: ' + ', '.join(rendering.result()))
+    finally:
+        # written for runs that fail too, to show how far they got
+        FPLreport.write_report()
     print("Complete!")
 
 def get_player_data(gameweeks):
     '''
     Connects to the FPL API and gets the necessary information for the algorithm.
+    Historical data comes from the local store kept up to date by FPLhistory.sync.
     
     Args:
         gameweeks: The number of past gameweeks that are taken in to consideration
@@ -55,183 +133,44 @@ def get_player_data(gameweeks):
         A second dataframe of players future fixtures
     [Team Home, Team Away, Event, Is Home, Element, First Name, Second Name, Web Name, Element Type, Opponent Team]
     '''
-    no_of_players = get_no_of_players()
-    player_data = []
-    fixtures = []
-    
-    for i in range(1, no_of_players + 1):
-        p_url = "https://fantasy.premierleague.com/api/element-summary/"+str(i)+"/"
-        rp = requests.get(p_url)
-        jsonp = rp.json()
-        data = pd.DataFrame(jsonp['history'])
-        data = data[['element', 'round', 'opponent_team', 'total_points', 'minutes']]
-        player_data.append(data)
-        
-        fdata=pd.DataFrame(jsonp['fixtures'])
-        fdata["element"] = i
-        fdata=fdata[["team_h", "team_a", "event", "is_home", "element"]]
-        fixtures.append(fdata)
-        
-    player_data=pd.concat(player_data)
-    
-    url = "https://fantasy.premierleague.com/api/bootstrap-static/"
-    r = requests.get(url)
-    json = r.json()
-    elements = pd.DataFrame(json['elements'])
-    elements = elements[['id', 'element_type', 'team_code', 'first_name', 'second_name', 'web_name']]
-    
-    player_data=pd.merge(player_data, elements, left_on=['element'], right_on=['id'], how='left').drop('id',1)
-    
-    player_data['position'] = np.select(
-        [
-        player_data['element_type'] == 1,
-        player_data['element_type'] == 2,
-        player_data['element_type'] == 3,
-        player_data['element_type'] == 4
-        ],
-        [
-        'GK',
-        'Defense',
-        'Attack',
-        'Attack'
-        ], 'other'
-        )
-    
-    earliest_gw = player_data['round'].max() - gameweeks
-    player_data = player_data.loc[player_data['round'] > earliest_gw]
-    
-    fixtures=pd.concat(fixtures)
-    fixtures = fixtures.loc[fixtures['event'] < 28]
-    elements = pd.DataFrame(json['elements'])
-    id_name = elements[['id', 'first_name', 'second_name', 'web_name', 'element_type']]
-    fixtures = pd.merge(fixtures, id_name, left_on=['element'], right_on=['id'], how='left').drop('id',1)
-    fixtures['opponent_team']= np.where(fixtures['is_home'] == True, fixtures['team_a'], fixtures['team_h'])
-    
-    return(player_data, fixtures)
-
-def remove_flagged_players(player_data):
-    '''
-    Removes gameweeks where player was flagged and thus didn't play.
-    This list is generated from FPLflagged.py which is hosted on pythonanywhere.com
-    to ensure it runs every day.
-    
-    Args:
-        Dataframe: Historical player data
-    
-    Returns:
-        Dataframe: Same as Arg except with flagged player gameweeks removed
-    '''
-    flagged_players = pd.read_csv('../Data/flagged_players.csv')
-    
-    player_data = pd.merge(player_data, flagged_players, how='left' ,on=['element','round'], indicator=True)
-    player_data = player_data.loc[player_data['_merge'] == 'left_only']
-    player_data = player_data.drop(columns=['_merge'])
-    
-    return(player_data)
-    
+    FPLhistory.sync()
+    return(read_player_data(gameweeks))
 
-def calculate_team_rating(player_data, position):
+def read_player_data(gameweeks):
     '''
-    Calculates normalised ratings for each team for each position, a rating of relative difficulty.
-    For example Man City will have a low rating because generally not many points are scored against them.
+    Does the work of get_player_data from the history store as it is, without bringing it up to date.
     
-    Args:
-        player_data: See get_player_data
-        position: GK, Defense, or Attack. Choose which position to calculate team rating for.
-    Returns: A dataframe with the rating for that position by team.
-    [Team, Points Against Per Game, Normalised Rating]
+    Returns: see get_player_data
     '''
-    team_points_against = player_data.groupby(['position', 'opponent_team'])['total_points'].sum().reset_index()
-    matches = player_data.drop_duplicates(['round', 'opponent_team', 'position']).groupby(['position', 'opponent_team']).agg(matches=('opponent_team', 'count')).reset_index()
-    team_points_against['matches'] = matches['matches']
-    team_points_against['points_against_per_game'] = team_points_against['total_points']/team_points_against['matches']
-    
-    average_points = team_points_against.loc[team_points_against['position'] == position]['points_against_per_game'].mean()
-    
-    rating = team_points_against.loc[team_points_against['position'] == position][['opponent_team', 'points_against_per_game']]
-    rating['normalised'] = rating['points_against_per_game']/average_points
-    return(rating)
-    
-def calculate_player_rating(player_data, position, team_rating):
-    '''
-    Calculates the rating for each player.
-    Average points over the last n gameweeks adjusted for average opponent difficulty.
-    Two times the coefficient of variation is subtracted from this to reward consistent points.
-    The number of minutes a player plays is also taken in to account to reward consistent minutes.
-    
-    Args:
-        player_data: See get_player_data
-        position: GK, Defense, or Attack. Choose which position to calculate player rating for.
-        team_rating: See get_team_rating
-    Returns: A dataframe with the score for each player
-    [Element, Points Per Match, Score]
-    '''
-    player = pd.merge(player_data[player_data['position'] == position], team_rating, left_on=['opponent_team'], right_on=['opponent_team'], how='left').drop('points_against_per_game',1)
-    player = player[['element', 'round', 'opponent_team', 'total_points', 'normalised', 'minutes']]
-    player['minute_mult'] = np.select(
-        [player['minutes'] >= 60, (player['minutes'] > 0) & (player['minutes'] < 60), player['minutes'] == 0],
-        [1, 0.5, 0]
-        )
-    player_total = player.groupby('element')["total_points"].sum().reset_index()
-    player_matches = player.groupby('element').agg(matches=('total_points', 'count')).reset_index()
-    player_minmult = player.groupby('element')['minute_mult'].sum().reset_index()
-    player_total['matches'] = player_matches['matches']
-    player_total['minute_mult'] = player_minmult['minute_mult']/player_total['matches']
-    player_total['minutes'] = player.groupby('element')['minutes'].sum().reset_index()['minutes']
-    player_total['opp_dif'] = player.groupby('element')['normalised'].mean().reset_index()['normalised']
-    player_total['points_per_match'] = player_total['total_points']/player_total['opp_dif']/player_total['matches']
-    player_total['points_per_match'] = player_total['points_per_match'] * player_total['minute_mult']
-    player_total['points_per_match'] = np.select(
-        [player_total['minutes'] >= 180, player_total['minutes'] < 180],
-        [player_total['points_per_match'], 0]
-        )
-    player_total['std'] = player.groupby('element')['total_points'].std().reset_index().rename(columns = {'total_points': 'std'})['std']
-    player_total['cov'] = player_total['std']/player_total['points_per_match']
-    player_total['cov'] = player_total['cov'].apply(lambda x: (abs(x) + x)/2)
-    player_total['score'] = player_total['points_per_match']  - player_total['cov']
-    player_total['score'] = player_total['score'].apply(lambda x: (abs(x) + x)/2)
-    if position == 'Defense':
-        player_total.to_csv('../Data/defense_score.csv')
-    
-    player_ppg=player_total[['element', 'score']]
-    return(player_ppg)
+    player_data = FPLratings.add_player_details(FPLhistory.read_history(gameweeks))
+    fixtures = get_fixtures()
+    return(player_data, fixtures)
 
-def assign_positional_ratings(player_data, position, fixtures):
+def get_fixtures():
     '''
-    Assigns the rating of future opposing teams dependent on position.
-    
-    Args: player_data: see get_player_data
-            position: position rating to be assigned
-    Return: a dataframe of for each players gameweek with opposing team rating
+    Returns: every players future fixtures with their details and opponent, see get_player_data
     '''
-    rating = calculate_team_rating(player_data, position)
-    ppg = calculate_player_rating(player_data, position, rating)
-    fixtures = pd.merge(fixtures, ppg, left_on=['element'], right_on=['element'], how='inner').fillna(0)
-    fixtures = pd.merge(fixtures, rating, left_on=['opponent_team'], right_on=['opponent_team'], how='left')
+    fixtures = FPLhistory.read_fixtures()
+    fixtures = fixtures.loc[fixtures['event'] <= LAST_EVENT]
+    elements = FPLapi.elements()
+    id_name = elements[['id', 'first_name', 'second_name', 'web_name', 'element_type']]
+    fixtures = pd.merge(fixtures, id_name, left_on=['element'], right_on=['id'], how='left').drop('id',1)
+    fixtures['opponent_team']= np.where(fixtures['is_home'] == True, fixtures['team_a'], fixtures['team_h'])
     return(fixtures)
 
-def calculate_projected_scores(player_data, fixtures):
+def project(player_data, fixtures, normalised, ppg, simulate=None, scenarios=None):
     '''
-    Calculates projected scores for each player for each future fixture.
-    This is based on player rating and opposing team rating.
-    
-    Args: player_data, fixtures: see get_player_data
-    Returns: A dataframe of projected points per player per fixture
-    [Element, First Name, Second Name, Web Name, Element Type, Event, Projected Points, Score]
+    Projects every future fixture from the ratings kept up to date by FPLrolling.update, or if simulate
+    is set that statistic of a Monte Carlo simulation, see fpl_algorithm.
     
+    Args: player_data, fixtures: see get_player_data, player_data with the flagged rounds removed
+                                 (see FPLratings.remove_flagged_players) and only used to simulate
+          normalised, ppg: see FPLrolling.ratings
+    Returns: see FPLratings.calculate_projected_scores
     '''
-    attack_fixtures = assign_positional_ratings(player_data, 'Attack', fixtures)
-    defense_fixtures = assign_positional_ratings(player_data, 'Defense', fixtures)
-    gk_fixtures = assign_positional_ratings(player_data, 'GK', fixtures)
-    fixtures = pd.concat([attack_fixtures, defense_fixtures, gk_fixtures])
-    
-    fixtures['projected_score'] = np.where(fixtures['is_home'] == False,
-    fixtures['score'] * fixtures['normalised'] * 0.95193226,
-    fixtures['score'] * fixtures['normalised'] * 1.04806774)
-
-    projection = fixtures[['element', 'first_name', 'second_name', 'web_name', 'element_type', 'event', 'projected_score']]
-    projection = projection.loc[projection['event'] != 0]
-    return(projection)
+    if simulate is None:
+        return(FPLratings.project_fixtures(fixtures, normalised, ppg))
+    return(FPLsimulate.simulate(player_data, fixtures, normalised, simulate, scenarios or FPLsimulate.SCENARIOS))
 
 def prepare_for_optimiser(projected_scores, team_id):
     '''
@@ -245,15 +184,26 @@ def prepare_for_optimiser(projected_scores, team_id):
     Args: projected scores, dataframe of fixture by fixture projected scores for each player
     Returns: dataframe of fixture by fixture projected scores for each player ready for optimiser
     
+    '''
+    data = shape_for_optimiser(projected_scores, FPLapi.elements(), get_current_team(team_id))
+    print('Projections Ready!')
+    return(data)
+
+def shape_for_optimiser(projected_scores, elements_df, current_team, doubtful=DOUBTFUL):
+    '''
+    Does the work of prepare_for_optimiser given the players details and current team,
+    so it can be run on recorded data.
+    
+    Args: projected scores, dataframe of fixture by fixture projected scores for each player
+          elements_df, [Id, Now Cost, Team, Status] for each player
+          current_team, see get_current_team
+          doubtful, multiplier for the projected scores of doubtful players
+    Returns: see prepare_for_optimiser
     '''
     data = projected_scores
     
     data["name"] = data["first_name"] + " " + data["web_name"]
     data=data.drop(["first_name", "web_name"], axis=1)
-    url = "https://fantasy.premierleague.com/api/bootstrap-static/"
-    r = requests.get(url)
-    json = r.json()
-    elements_df = pd.DataFrame(json['elements'])
     elements_df = elements_df[['id', 'now_cost', 'team', 'status']]
 
     data=pd.merge(data, elements_df, left_on=["element"], right_on=["id"], how="left").dropna()
@@ -261,7 +211,7 @@ def prepare_for_optimiser(projected_scores, team_id):
 
     data["projected_score"] = np.select(
         [data["status"] == "i", data["status"] == "d", data["status"] == "a"],
-        [0, data["projected_score"] * 0.5, data["projected_score"]]
+        [0, data["projected_score"] * doubtful, data["projected_score"]]
         )
 
 
@@ -273,7 +223,6 @@ def prepare_for_optimiser(projected_scores, team_id):
     d = dict(zip(a,b))
     data = data.rename(columns=d)
 
-    current_team = get_current_team(team_id)
     data=pd.merge(data, current_team, on=['element'], how='left')
     data = data.fillna(0)
 
@@ -287,11 +236,15 @@ def prepare_for_optimiser(projected_scores, team_id):
     data['Def'] = (data['element_type'] == 2).astype(float)
     data['Mid'] = (data['element_type'] == 3).astype(float)
     data['Att'] = (data['element_type'] == 4).astype(float)
-    
-    data.to_csv('../Data/ready_projections.csv', index = None)
-    print('Projections Ready!')
     return(data)
 
+def get_unavailable():
+    '''
+    Returns: the elements that can't be picked this week (injured, suspended, unavailable or left the league)
+    '''
+    elements = FPLapi.elements()
+    return(elements.loc[~elements['status'].isin(['a', 'd']), 'id'])
+
 def get_current_team(team_id):
     '''
     Calls the FPL API to return the current players in the team.
@@ -299,15 +252,10 @@ def get_current_team(team_id):
     Args: team_id, FPL ID of the team that the algorithm is running for
     Returns: Players currently in this team
     '''
-    gw_url = "https://fantasy.premierleague.com/api/bootstrap-static/"
-    r = requests.get(gw_url)
-    json = r.json()
-    events_df = pd.DataFrame(json['events'])
+    events_df = FPLapi.events()
     next_gw = events_df.loc[events_df['is_next'] == True]['id'].iloc[0]
     
-    team_url = "https://fantasy.premierleague.com/api/entry/"+str(team_id)+"/event/"+str(next_gw-1)+"/picks/"
-    r = requests.get(team_url)
-    json = r.json()
+    json = FPLapi.fetch("entry/"+str(team_id)+"/event/"+str(next_gw-1)+"/picks/")
     current_team = pd.DataFrame(json['picks'])
     current_team['in_team'] = 1
     current_team = current_team[['element', 'in_team']]
@@ -317,11 +265,59 @@ def get_no_of_players():
     '''
     Returns the number of football players with data for this season.
     '''
-    url = "https://fantasy.premierleague.com/api/bootstrap-static/"
-    r = requests.get(url)
-    json = r.json()
-    elements = pd.DataFrame(json['elements'])
-    return(len(elements))
+    return(len(FPLapi.elements()))
+
+def chip_weeks(text):
+    '''
+    Returns: dict of chip to the week column it must be played in or None, from comma separated chip[=week]
+    '''
+    chips = dict((chip.split('=') + [None])[:2] for chip in text.split(','))
+    unknown = set(chips) - set(CHIPS)
+    if unknown:
+        raise argparse.ArgumentTypeError('unknown chips ' + ', '.join(sorted(unknown)) + ', choose from ' + ', '.join(CHIPS))
+    return(chips)
+
+def output_sinks(text):
+    '''
+    Returns: list of the sinks to write the plan to, from comma separated sinks, see FPLtimiser.write_plan
+    '''
+    sinks = text.split(',')
+    unknown = set(sinks) - set(SINKS)
+    if unknown:
+        raise argparse.ArgumentTypeError('unknown outputs ' + ', '.join(sorted(unknown)) + ', choose from ' + ', '.join(SINKS))
+    return(sinks)
 
 if __name__ == '__main__':
-    fpl_algorithm(team_id, gameweeks, transfers, in_bank)
+    parser = argparse.ArgumentParser(description='Produces an optimal FPL team')
+    parser.add_argument('--offline', action='store_true', help='run purely from responses cached in ' + FPLapi.CACHE_DIR)
+    parser.add_argument('--simulate', choices=FPLsimulate.STATISTICS, default=None,
+                        help='optimise this statistic of simulated points rather than the projected score')
+    parser.add_argument('--scenarios', type=int, default=FPLsimulate.SCENARIOS)
+    parser.add_argument('--solver', default=FPLsolver.SOLVER, help='GLPK_CMD, PULP_CBC_CMD, COIN_CMD, or HiGHS (needs highspy, see requirements-highs.txt)')
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--gap', type=float, default=None, help='relative MIP gap to stop at')
+    parser.add_argument('--time-limit', type=int, default=FPLsolver.TIME_LIMIT)
+    parser.add_argument('--node-limit', type=int, default=None, help='CBC and HiGHS only')
+    parser.add_argument('--last-event', type=int, default=LAST_EVENT, help='last gameweek to plan for')
+    parser.add_argument('--window', type=int, default=None, help='plan a week at a time with this many detailed weeks')
+    parser.add_argument('--coarse', type=int, default=4, help='weeks per look-ahead week after the window')
+    parser.add_argument('--plans', type=int, default=1, help='also write the next best plans')
+    parser.add_argument('--distinct', type=int, default=1, help='fewest players any two plans differ by')
+    parser.add_argument('--chips', type=chip_weeks, default=None,
+                        help='chips left to play, e.g. wildcard,bench_boost=w24 to play bench boost in gameweek 24')
+    parser.add_argument('--engine', choices=['milp', 'heuristic', 'hybrid'], default='milp',
+                        help='heuristic answers in under a second, hybrid gives the solver its plan to start from')
+    parser.add_argument('--graphs', choices=GRAPH_MODES, default=GRAPHS,
+                        help='files and worker save the graphs without a display, worker while the optimiser runs')
+    parser.add_argument('--no-cache', action='store_true', help='recompute every stage rather than reading ' + FPLcache.CACHE_DIR)
+    parser.add_argument('--output', type=output_sinks, default=['excel'],
+                        help='what to write the plan as, comma separated from ' + ', '.join(SINKS))
+    args = parser.parse_args()
+    if args.window is not None and args.chips:
+        parser.error('--chips can\'t be played when planning a week at a time with --window')
+    FPLapi.OFFLINE = FPLapi.OFFLINE or args.offline
+    FPLcache.ENABLED = FPLcache.ENABLED and not args.no_cache
+    LAST_EVENT = args.last_event
+    solver = FPLsolver.solver_settings(args.solver, args.threads, args.gap, args.time_limit, args.node_limit)
+    fpl_algorithm(team_id, gameweeks, transfers, in_bank, args.simulate, args.scenarios, solver, args.window, args.coarse,
+                  args.plans, args.distinct, args.chips, args.engine, args.output, args.graphs)
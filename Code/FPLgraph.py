@@ -1,15 +1,20 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.offsetbox import AnchoredText
-import seaborn as sns
-import colorcet as cc
-import mplcursors
-import requests
 
-import FPLgorithm
+import FPLhistory
+
+LEAGUE_ID = os.environ.get('FPL_LEAGUE_ID', '')
+FIGURE_DIR = '../Output/figures'
+# leagues with more managers than this are drawn as the top of the league and RANK_BANDS
+MAX_LINES = 20
+RANK_BANDS = {0.1: 'League top 10%', 0.5: 'League median', 0.9: 'League bottom 10%'}
 
-LEAGUE_ID = ''
+# the plotting stack, imported by load_plotting only when there's something to draw
+plt = sns = cc = AnchoredText = None
 
 clubs_2021 = ["Arsenal",
               "Aston Villa",
@@ -32,24 +37,77 @@ clubs_2021 = ["Arsenal",
               "West Ham United",
               "Wolverhampton Wanderers"]
 
-def fpl_graphs(projected_scores_for_optimiser, player_data):
+def fpl_graphs(projected_scores_for_optimiser, team_ratings, directory=None):
     '''
     Creates visualisations of the projected scores, team ratings, and league positions
-    '''
     
-    fig1_data = prep_for_fig1(projected_scores_for_optimiser)
-    fig1_costVSscore(fig1_data)
+    Args: projected_scores_for_optimiser, see FPLgorithm.prepare_for_optimiser
+          team_ratings, see FPLratings.attack_defense_ratings
+          directory, if set the figures are drawn headless and saved there rather than shown, see render
+    Returns: see render
+    '''
+    return(render(figure_data(projected_scores_for_optimiser, team_ratings), directory))
+
+def figure_data(projected_scores_for_optimiser, team_ratings):
+    '''
+    Returns: dict of the data of each figure, all that's needed to draw them without the plotting stack,
+             the league figure None if there's no LEAGUE_ID
+    '''
+    return({'fig1': prep_for_fig1(projected_scores_for_optimiser), 'fig2': prep_for_fig2(team_ratings),
+            'fig3': prep_for_fig3() if LEAGUE_ID else None})
+
+def render(data, directory=None):
+    '''
+    Draws the figures from figure_data. Shown interactively with hover labels if directory is None,
+    otherwise drawn on the Agg backend (no display needed) and saved to directory as png.
     
-    fig2_data = prep_for_fig2(player_data)
-    fig2_attackVSdefense(fig2_data)
-  
-    fig3_data = prep_for_fig3()
-    fig3_overallrank(fig3_data)
+    Returns: list of the files saved, empty if shown
+    '''
+    load_plotting(headless=directory is not None)
+    figures = [fig1_costVSscore(data['fig1'], hover=directory is None), fig2_attackVSdefense(data['fig2'])]
+    if data['fig3'] is not None:
+        figures.append(fig3_overallrank(data['fig3']))
+    if directory is None:
+        return([])
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for fig in figures:
+        paths.append(os.path.join(directory, fig.get_label().lower().replace(' ', '_') + '.png'))
+        fig.savefig(paths[-1])
+        plt.close(fig)
+    return(paths)
+
+def render_in_worker(data, directory=FIGURE_DIR):
+    '''
+    Starts saving the figures from figure_data to directory in a worker process, see render,
+    so they're drawn while the run carries on and the plotting stack never loads in this process.
     
+    Returns: future of the list of the files saved
+    '''
+    pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+    future = pool.submit(render, data, directory)
+    # the worker finishes drawing and exits on its own
+    pool.shutdown(wait=False)
+    return(future)
+
+def load_plotting(headless=False):
+    '''
+    Imports matplotlib, seaborn and colorcet, which take longer to import than the rest of a run takes to start,
+    on the Agg backend if headless.
+    '''
+    global plt, sns, cc, AnchoredText
+    import matplotlib
+    if headless:
+        matplotlib.use('Agg')
+    if plt is None:
+        import matplotlib.pyplot as plt
+        from matplotlib.offsetbox import AnchoredText
+        import seaborn as sns
+        import colorcet as cc
     
-def fig1_costVSscore(data):
+def fig1_costVSscore(data, hover=True):
     palette = sns.color_palette(cc.glasbey, n_colors=20)
-    plt.figure('Cost Vs Score', figsize=(18,9))
+    fig = plt.figure('Cost Vs Score', figsize=(18,9))
     sns.set(style="ticks")
     sns.set_context("talk")
     sns.scatterplot(data = data, x = 'Cost', y = 'total_score', hue = 'Club', style = 'Position', palette = palette, s = 250)
@@ -58,8 +116,11 @@ def fig1_costVSscore(data):
     plt.ylabel("Score (FPLgorithm)")
     plt.legend(bbox_to_anchor=(1.05, 1), borderaxespad=0.)
     plt.tight_layout()
-    cr = mplcursors.cursor(hover=True)
-    cr.connect('add', lambda sel: sel.annotation.set_text(data['name'][sel.index]))
+    if hover:
+        import mplcursors
+        cr = mplcursors.cursor(hover=True)
+        cr.connect('add', lambda sel: sel.annotation.set_text(data['name'][sel.index]))
+    return(fig)
 
 def fig2_attackVSdefense(data):
     palette = sns.color_palette(cc.glasbey, n_colors=20)
@@ -83,17 +144,22 @@ def fig2_attackVSdefense(data):
     plt.ylabel("Defense Rating")
     plt.legend(bbox_to_anchor=(1.05, 1), borderaxespad=0.)
     plt.tight_layout()
+    return(fig)
     
 def fig3_overallrank(data):
     fig = plt.figure('Overall Rank', figsize=(18,9))
     sns.set(style="ticks")
     sns.set_context("talk")
-    sns.lineplot(data = data , x = 'event', y = 'overall_rank', hue = 'player_name')
+    bands = data['player_name'].isin(RANK_BANDS.values())
+    sns.lineplot(data = data[~bands] , x = 'event', y = 'overall_rank', hue = 'player_name')
+    if bands.any():
+        sns.lineplot(data = data[bands], x = 'event', y = 'overall_rank', style = 'player_name', color = 'black')
     sns.despine()
     plt.xlabel("Event")
     plt.ylabel("Overall Rank")
     plt.legend(bbox_to_anchor=(1.05, 1), borderaxespad=0.)
     plt.tight_layout()
+    return(fig)
 
 if __name__ == '__main__':
     fpl_graphs()
@@ -123,39 +189,30 @@ def prep_for_fig1(projected_scores_for_optimiser):
     data['Cost'] = data['now_cost']/10
     return(data)
 
-def prep_for_fig2(player_data):
-    defense = FPLgorithm.calculate_team_rating(player_data, 'Defense')
-    defense = defense[['opponent_team', 'normalised']].rename(columns={'opponent_team': 'team', 'normalised': 'defense'})
-    attack = FPLgorithm.calculate_team_rating(player_data, 'Attack')
-    attack = attack[['opponent_team', 'normalised']].rename(columns={'opponent_team': 'team', 'normalised': 'attack'})
-    
-    team_ratings = pd.merge(defense, attack, on = 'team')
+def prep_for_fig2(team_ratings):
+    team_ratings = team_ratings.copy()
     team_ratings['Club'] = team_ratings['team'].apply(lambda x: clubs_2021[x-1])
     
     return(team_ratings)
 
 def prep_for_fig3():
-    url = "https://fantasy.premierleague.com/api/leagues-classic/" + LEAGUE_ID + "/standings/"
-    r = requests.get(url)
-    json = r.json()
-    league_df = pd.DataFrame(json['standings'])
-    league_df = league_df["results"]
-    league_df = pd.DataFrame.from_records(league_df)
-    league_df = league_df[["entry", "player_name", "entry_name"]]
-    
-    team_df = []
+    team_df, league_df = FPLhistory.sync_league(LEAGUE_ID)
+    league_df = league_df[["entry", "player_name", "entry_name", "rank"]]
+    league_df = league_df[league_df['player_name'] != 'Fergus Cowie']
     
-    for i in league_df["entry"]:
-        url2 = "https://fantasy.premierleague.com/api/entry/" + str(i) + "/history/"
-        r2 = requests.get(url2)
-        json2 = r2.json()
-        data = pd.DataFrame(json2['current'])
-        data["entry"] = i
-        team_df.append(data)
-    
-    team_df = pd.concat(team_df)
-    
-    team_df = pd.merge(team_df, league_df, left_on=["entry"], right_on=["entry"], how="left")
+    team_df = pd.merge(team_df, league_df, left_on=["entry"], right_on=["entry"], how="inner")
+    if len(league_df) > MAX_LINES:
+        team_df = downsample_league(team_df, league_df)
     team_df = team_df[['event', 'overall_rank', 'player_name']]
-    team_df = team_df[team_df['player_name'] != 'Fergus Cowie']
     return(team_df)
+
+def downsample_league(team_df, league_df, lines=MAX_LINES):
+    '''
+    Cuts a league with thousands of managers down to lines lines: the top of the league, and each of
+    RANK_BANDS, that quantile of the overall rank of every manager in the league each event.
+    '''
+    top = league_df.nsmallest(lines - len(RANK_BANDS), 'rank')['entry']
+    bands = team_df.groupby('event')['overall_rank'].quantile(list(RANK_BANDS)).reset_index()
+    bands.columns = ['event', 'quantile', 'overall_rank']
+    bands['player_name'] = bands['quantile'].map(RANK_BANDS)
+    return(pd.concat([team_df.loc[team_df['entry'].isin(top)], bands]))
@@ -0,0 +1,228 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import FPLapi
+
+STORE_DIR = '../Data/history'
+HISTORY_COLUMNS = ['element', 'round', 'opponent_team', 'total_points', 'minutes', 'was_home', 'value']
+FIXTURE_COLUMNS = ['team', 'team_h', 'team_a', 'event', 'is_home']
+SYNCED_COLUMNS = ['id', 'team', 'total_points', 'minutes', 'now_cost']
+HISTORY_DTYPES = {**dict.fromkeys(HISTORY_COLUMNS, np.int64), 'was_home': np.bool_}
+FIXTURE_DTYPES = {'team_h': np.int64, 'team_a': np.int64, 'event': np.int64, 'is_home': np.bool_}
+RANK_COLUMNS = ['event', 'points', 'total_points', 'overall_rank', 'entry']
+RANK_DTYPES = {'event': np.int64, 'points': np.int64, 'total_points': np.int64, 'overall_rank': np.int64}
+ENTRY_COLUMNS = ['entry', 'player_name', 'entry_name', 'rank', 'total']
+
+def store_path(name):
+    '''
+    Returns: path of the parquet file holding name (history, rounds, fixtures, synced, or league_<id>)
+    '''
+    return(os.path.join(STORE_DIR, name + '.parquet'))
+
+def load(name, columns):
+    '''
+    Returns: the stored dataframe, or an empty one with the given columns if nothing is stored yet
+    '''
+    if not os.path.exists(store_path(name)):
+        return(pd.DataFrame(columns=columns))
+    return(pd.read_parquet(store_path(name)))
+
+def save(name, data):
+    '''
+    Writes a dataframe to the store atomically.
+    '''
+    os.makedirs(STORE_DIR, exist_ok=True)
+    tmp = store_path(name) + '.tmp'
+    data.reset_index(drop=True).to_parquet(tmp, index=False)
+    os.replace(tmp, store_path(name))
+
+def save_history(history):
+    '''
+    Writes the history to the store along with the digest of each round, see read_round_digests.
+    '''
+    save('history', history)
+    save('rounds', round_digests(history))
+
+def round_digests(history):
+    '''
+    Digests each rounds rows, summing a hash of each row so the order of the rows doesn't matter.
+
+    Args: history, see read_history
+    Returns: Dataframe [Round, Digest]
+    '''
+    history = history[HISTORY_COLUMNS].astype(HISTORY_DTYPES)
+    rounds, inverse = np.unique(history['round'].to_numpy(), return_inverse=True)
+    hashes = pd.util.hash_pandas_object(history, index=False).to_numpy()
+    digests = np.zeros(len(rounds), dtype=np.uint64)
+    np.add.at(digests, inverse, hashes)
+    return(pd.DataFrame({'round': rounds, 'digest': digests}))
+
+def read_round_digests():
+    '''
+    Reads the digest of each stored round, so a change to a round can be found without reading its rows.
+    If the history was written without them (not through save_history) they're worked out again.
+
+    Returns: see round_digests
+    '''
+    if (not os.path.exists(store_path('rounds')) or
+        os.path.getmtime(store_path('rounds')) < os.path.getmtime(store_path('history'))):
+        save('rounds', round_digests(pd.read_parquet(store_path('history'))))
+    return(pd.read_parquet(store_path('rounds')))
+
+def records_to_frame(groups, dtypes, group_values=None):
+    '''
+    Builds one dataframe from lists of json records without making a dataframe per list.
+    Each column is streamed straight in to a preallocated array of its dtype; an integer
+    column that holds a None (e.g. an unscheduled fixture's event) falls back to float with NaN.
+
+    Args: groups, list of lists of records (dicts)
+          dtypes, dict of key to take from each record to its numpy dtype
+          group_values, optional dict of column name to one value per group, repeated for each of its records
+    Returns: Dataframe with the dtypes columns followed by any group_values columns
+    '''
+    lengths = [len(records) for records in groups]
+    n = sum(lengths)
+    data = {}
+    for column, dtype in dtypes.items():
+        try:
+            data[column] = np.fromiter((record[column] for records in groups for record in records), dtype, count=n)
+        except TypeError:
+            data[column] = np.fromiter((np.nan if record[column] is None else record[column]
+                                        for records in groups for record in records), np.float64, count=n)
+    for column, values in (group_values or {}).items():
+        data[column] = np.repeat(np.asarray(values, dtype=np.int64), lengths)
+    return(pd.DataFrame(data, columns=list(dtypes) + list(group_values or {})))
+
+def sync():
+    '''
+    Brings the local per player per round history store up to date with the FPL API.
+
+    Only players whose team, total_points, or minutes in bootstrap-static differ from the last sync
+    have their element-summary downloaded again, along with one player per club for that club's fixtures.
+    Everyone else didn't play since the last sync, so their new rows are their club's new fixtures
+    with 0 points, 0 minutes, and their current price.
+
+    Returns: number of element summaries downloaded
+    '''
+    elements = FPLapi.elements()[SYNCED_COLUMNS]
+    history = load('history', HISTORY_COLUMNS)
+    synced = load('synced', SYNCED_COLUMNS)
+    if list(history.columns) != HISTORY_COLUMNS or list(synced.columns) != SYNCED_COLUMNS:
+        history = pd.DataFrame(columns=HISTORY_COLUMNS)
+        synced = pd.DataFrame(columns=SYNCED_COLUMNS)
+    last_round = history['round'].max() if len(history) else 0
+
+    compare = pd.merge(elements, synced, on='id', how='left', suffixes=('', '_synced'))
+    changed = compare['team_synced'].isnull()
+    for column in ['team', 'total_points', 'minutes']:
+        changed |= compare[column] != compare[column + '_synced']
+    refetch = set(compare.loc[changed, 'id'])
+
+    representatives = {}
+    for team, ids in elements.groupby('team')['id']:
+        in_refetch = [i for i in ids if i in refetch]
+        representatives[team] = in_refetch[0] if in_refetch else ids.iloc[0]
+
+    ids = sorted(refetch | set(representatives.values()))
+    summaries = FPLapi.element_summaries(ids)
+
+    fetched = records_to_frame([summary['history'] for summary in summaries], HISTORY_DTYPES)
+    team_of = dict(zip(elements['id'], elements['team']))
+    new_rounds = fetched.loc[fetched['element'].isin(representatives.values()) & (fetched['round'] > last_round),
+                             ['element', 'round', 'opponent_team', 'was_home']]
+    new_rounds['team'] = new_rounds['element'].map(team_of)
+    new_rounds = new_rounds.drop(columns=['element'])
+    reps = [summary for i, summary in zip(ids, summaries) if i in representatives.values()]
+    fixtures = records_to_frame([summary['fixtures'] for summary in reps], FIXTURE_DTYPES,
+                                {'team': [team_of[i] for i in ids if i in representatives.values()]})
+
+    unchanged = elements.loc[~elements['id'].isin(ids), ['id', 'team', 'now_cost']]
+    unchanged = unchanged.rename(columns={'id': 'element', 'now_cost': 'value'})
+    did_not_play = pd.merge(unchanged, new_rounds, on='team').drop(columns=['team'])
+    did_not_play['total_points'] = 0
+    did_not_play['minutes'] = 0
+
+    history = pd.concat([history.loc[~history['element'].isin(ids)], fetched, did_not_play[HISTORY_COLUMNS]])
+    history = history.astype(HISTORY_DTYPES).sort_values(['element', 'round'], kind='mergesort')
+
+    save_history(history)
+    save('fixtures', fixtures[FIXTURE_COLUMNS])
+    save('synced', elements)
+    return(len(ids))
+
+def sync_league(league_id, max_in_flight=FPLapi.MAX_IN_FLIGHT):
+    '''
+    Brings the stored rank history of every entry in a classic league up to date with the FPL API.
+
+    Every page of the standings is read, then only entries that are new or whose history stops before the
+    last finished gameweek have their history downloaded, concurrently and through the response cache.
+    Everyone else is already up to date, so re-running within a gameweek downloads no histories and each
+    new gameweek downloads each entry once. Entries that have left the league are dropped.
+
+    Args: league_id, classic league ID
+          max_in_flight, maximum number of concurrent requests
+    Returns: Dataframe of each entries rank history [Event, Points, Total Points, Overall Rank, Entry]
+             and a Dataframe of the entries [Entry, Player Name, Entry Name, Rank, Total]
+    '''
+    name = 'league_' + str(league_id)
+    entries = FPLapi.league_standings(league_id)[ENTRY_COLUMNS]
+    events = FPLapi.events()
+    finished = events.loc[events['finished'] == True, 'id']
+    last_event = finished.max() if len(finished) else 0
+
+    history = load(name, RANK_COLUMNS)
+    if list(history.columns) != RANK_COLUMNS:
+        history = pd.DataFrame(columns=RANK_COLUMNS)
+    history = history.loc[history['entry'].isin(entries['entry'])]
+    latest = history.groupby('entry')['event'].max()
+    stale = [entry for entry in entries['entry'] if latest.get(entry, 0) < last_event]
+
+    if stale:
+        fetched = records_to_frame([h['current'] for h in FPLapi.entry_histories(stale, max_in_flight)], RANK_DTYPES,
+                                   {'entry': stale})
+        kept = history.loc[~history['entry'].isin(stale)]
+        history = pd.concat([kept, fetched]) if len(kept) else fetched
+        history = history.sort_values(['entry', 'event'], kind='mergesort')
+        save(name, history)
+    return(history.reset_index(drop=True), entries)
+
+def read_history(gameweeks=None):
+    '''
+    Reads the stored history, optionally only the most recent rounds.
+
+    Args: gameweeks, number of most recent rounds to read, all if None
+    Returns: Dataframe [Element, Round, Opponent Team, Total Points, Minutes, Was Home, Value]
+    '''
+    filters = None
+    if gameweeks is not None:
+        filters = [('round', '>', latest_round() - gameweeks)]
+    return(pd.read_parquet(store_path('history'), filters=filters))
+
+def read_rounds(first_round, last_round=None):
+    '''
+    Reads only the stored rows of the rounds from first_round to last_round (inclusive).
+
+    Returns: see read_history
+    '''
+    filters = [('round', '>=', first_round)]
+    if last_round is not None:
+        filters.append(('round', '<=', last_round))
+    return(pd.read_parquet(store_path('history'), filters=filters))
+
+def latest_round():
+    '''
+    Returns: the most recent round in the store
+    '''
+    return(pd.read_parquet(store_path('history'), columns=['round'])['round'].max())
+
+def read_fixtures():
+    '''
+    Returns: Dataframe of every players future fixtures, from their current clubs fixtures
+    [Team H, Team A, Event, Is Home, Element]
+    '''
+    fixtures = pd.read_parquet(store_path('fixtures'))
+    teams = FPLapi.elements()[['id', 'team']].rename(columns={'id': 'element'})
+    fixtures = pd.merge(teams, fixtures, on='team')
+    return(fixtures[['team_h', 'team_a', 'event', 'is_home', 'element']].reset_index(drop=True))
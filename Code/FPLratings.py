@@ -0,0 +1,316 @@
+import numpy as np
+import pandas as pd
+
+import FPLapi
+
+POSITIONS = ['Attack', 'Defense', 'GK']
+HOME = 1.04806774
+AWAY = 0.95193226
+COV_PENALTY = 1
+MINUTES_CUTOFF = 180
+FLAGGED_PATH = '../Data/flagged_players.csv'
+ELEMENT_POSITIONS = {1: 'GK', 2: 'Defense', 3: 'Attack', 4: 'Attack'}
+
+def add_player_details(player_data):
+    '''
+    Adds each players details and position to their historical rows.
+    
+    Args: player_data, [Element, Round, Opponent Team, Total Points, Minutes]
+    Returns: see FPLgorithm.get_player_data
+    '''
+    elements = FPLapi.elements()
+    elements = elements[['id', 'element_type', 'team_code', 'first_name', 'second_name', 'web_name']]
+    
+    player_data=pd.merge(player_data, elements, left_on=['element'], right_on=['id'], how='left').drop('id',1)
+    
+    player_data['position'] = element_positions(player_data['element_type'])
+    return(player_data)
+
+def element_positions(element_type):
+    '''
+    Returns: array of the position (see ELEMENT_POSITIONS) of each element type, other for anything else
+    '''
+    element_type = np.asarray(element_type)
+    return(np.select([element_type == t for t in ELEMENT_POSITIONS], list(ELEMENT_POSITIONS.values()), 'other'))
+
+def remove_flagged_players(player_data):
+    '''
+    Removes gameweeks where player was flagged and thus didn't play.
+    This list is generated from FPLflagged.py which is hosted on pythonanywhere.com
+    to ensure it runs every day.
+    
+    Args:
+        Dataframe: Historical player data
+    
+    Returns:
+        Dataframe: Same as Arg except with flagged player gameweeks removed
+    '''
+    flagged_players = pd.read_csv(FLAGGED_PATH)
+    
+    player_data = pd.merge(player_data, flagged_players, how='left' ,on=['element','round'], indicator=True)
+    player_data = player_data.loc[player_data['_merge'] == 'left_only']
+    player_data = player_data.drop(columns=['_merge'])
+    
+    return(player_data)
+
+def read_flagged():
+    '''
+    Returns: Dataframe of the flagged players rounds, each once
+    [Element, Round]
+    '''
+    return(pd.read_csv(FLAGGED_PATH).dropna().astype(np.int64).drop_duplicates())
+
+def calculate_team_ratings(player_data):
+    '''
+    Calculates normalised ratings for every team for every position in one pass, a rating of relative difficulty.
+    For example Man City will have a low rating because generally not many points are scored against them.
+    A team that played more than once in a round against a position counts that round as one match.
+    
+    Args:
+        player_data: See FPLgorithm.get_player_data
+    Returns: Two arrays indexed [position (see POSITIONS), opponent team], NaN where a team didn't face that position
+        points against per game, normalised rating
+    '''
+    pos = position_codes(player_data['position'])
+    valid = pos >= 0
+    return(team_ratings(pos[valid], player_data['opponent_team'].to_numpy()[valid],
+                        player_data['round'].to_numpy()[valid], player_data['total_points'].to_numpy()[valid]))
+
+def team_ratings(pos, opp, rnd, points, n_teams=None):
+    '''
+    Does the work of calculate_team_ratings on plain arrays, one entry per row.
+    
+    Args: pos, opp, rnd, points: position code, opponent team, round, and total points of each row
+          n_teams: width of the returned arrays, enough for the largest opponent team if None
+    Returns: see calculate_team_ratings
+    '''
+    if n_teams is None:
+        n_teams = opp.max() + 1 if len(opp) else 1
+    
+    cell = pos * n_teams + opp
+    points_against = np.bincount(cell, weights=points, minlength=len(POSITIONS) * n_teams)
+    matches = np.bincount(np.unique(rnd * (len(POSITIONS) * n_teams) + cell) % (len(POSITIONS) * n_teams), minlength=len(POSITIONS) * n_teams)
+    
+    return(normalise_team_ratings(points_against.reshape(len(POSITIONS), n_teams), matches.reshape(len(POSITIONS), n_teams)))
+
+def normalise_team_ratings(points_against, matches):
+    '''
+    Divides each teams points against by its matches against each position and normalises
+    by the average over the teams that faced that position.
+    
+    Args: points_against, matches: arrays indexed [position, opponent team]
+    Returns: see calculate_team_ratings
+    '''
+    with np.errstate(invalid='ignore', divide='ignore'):
+        points_against_per_game = points_against / matches
+    points_against_per_game[matches == 0] = np.nan
+    
+    normalised = np.full_like(points_against_per_game, np.nan)
+    for p in range(len(POSITIONS)):
+        faced = ~np.isnan(points_against_per_game[p])
+        average_points = points_against_per_game[p][faced].sum() / faced.sum() if faced.any() else np.nan
+        normalised[p] = points_against_per_game[p] / average_points
+    return(points_against_per_game, normalised)
+
+def calculate_team_rating(player_data, position):
+    '''
+    Calculates normalised ratings for each team for one position, see calculate_team_ratings.
+    
+    Args:
+        player_data: See FPLgorithm.get_player_data
+        position: GK, Defense, or Attack. Choose which position to calculate team rating for.
+    Returns: A dataframe with the rating for that position by team.
+    [Team, Points Against Per Game, Normalised Rating]
+    '''
+    points_against_per_game, normalised = calculate_team_ratings(player_data)
+    p = POSITIONS.index(position)
+    teams = np.flatnonzero(~np.isnan(points_against_per_game[p]))
+    rating = pd.DataFrame({'opponent_team': teams,
+                           'points_against_per_game': points_against_per_game[p][teams],
+                           'normalised': normalised[p][teams]})
+    return(rating)
+
+def attack_defense_ratings(player_data):
+    '''
+    Returns: the normalised defense and attack rating of each team, see calculate_team_rating
+    [Team, Defense, Attack]
+    '''
+    defense = calculate_team_rating(player_data, 'Defense')
+    defense = defense[['opponent_team', 'normalised']].rename(columns={'opponent_team': 'team', 'normalised': 'defense'})
+    attack = calculate_team_rating(player_data, 'Attack')
+    attack = attack[['opponent_team', 'normalised']].rename(columns={'opponent_team': 'team', 'normalised': 'attack'})
+    return(pd.merge(defense, attack, on = 'team'))
+
+def calculate_player_ratings(player_data, normalised, cov_penalty=COV_PENALTY, minutes_cutoff=MINUTES_CUTOFF):
+    '''
+    Calculates the rating for every player.
+    Average points over the last n gameweeks adjusted for average opponent difficulty.
+    Two times the coefficient of variation is subtracted from this to reward consistent points.
+    The number of minutes a player plays is also taken in to account to reward consistent minutes.
+    Everything is a segment reduction over the rows sorted by player.
+    
+    Args:
+        player_data: See FPLgorithm.get_player_data
+        normalised: normalised team ratings, see calculate_team_ratings
+        cov_penalty, minutes_cutoff: see player_scores
+    Returns: A dataframe with the score for each player
+    [Element, Position Code, Score]
+    '''
+    pos = position_codes(player_data['position'])
+    valid = pos >= 0
+    totals = player_totals(player_data['element'].to_numpy()[valid], pos[valid], player_data['opponent_team'].to_numpy()[valid],
+                           player_data['total_points'].to_numpy()[valid], player_data['minutes'].to_numpy()[valid], normalised)
+    return(score_players(*totals, cov_penalty=cov_penalty, minutes_cutoff=minutes_cutoff))
+
+def player_totals(element, pos, opp, points, minutes, normalised):
+    '''
+    Does the segment reductions of calculate_player_ratings on plain arrays, one entry per row.
+    
+    Args: element, pos, opp, points, minutes: player id, position code, opponent team, total points, and minutes of each row
+          normalised: see calculate_team_ratings
+    Returns: the per player arrays taken by score_players
+    '''
+    order = np.argsort(element, kind='mergesort')
+    element = element[order]
+    pos = pos[order]
+    points = points[order]
+    minutes = minutes[order]
+    opp_dif = normalised[pos, opp[order]]
+    
+    starts = np.flatnonzero(np.r_[True, element[1:] != element[:-1]]) if len(element) else np.zeros(0, dtype=int)
+    matches = np.diff(np.r_[starts, len(element)])
+    
+    minute_mult = minute_multiplier(minutes)
+    
+    total_points = segment_sum(points, starts)
+    squares = segment_sum((points - np.repeat(total_points / matches, matches)) ** 2, starts)
+    opp_dif = segment_sum(opp_dif, starts) / matches
+    return(element[starts], pos[starts], total_points, matches, segment_sum(minute_mult, starts),
+           segment_sum(minutes, starts), opp_dif, squares)
+
+def score_players(element, position_code, total_points, matches, minute_mult, minutes, opp_dif, squares,
+                  cov_penalty=COV_PENALTY, minutes_cutoff=MINUTES_CUTOFF):
+    '''
+    Turns each players totals over the window in to their score, see calculate_player_ratings.
+    
+    Args: one array entry per player of
+        element, position_code: player id and index in POSITIONS
+        total_points, matches, minute_mult, minutes, opp_dif, squares: see player_scores
+        cov_penalty, minutes_cutoff: see player_scores
+    Returns: A dataframe with the score for each player
+    [Element, Position Code, Score]
+    '''
+    score = player_scores(total_points, matches, minute_mult, minutes, opp_dif, squares, cov_penalty, minutes_cutoff)[4]
+    
+    player_ppg = pd.DataFrame({'element': element, 'position_code': position_code,
+                               'score': np.nan_to_num(score, nan=0.0, posinf=np.inf, neginf=-np.inf)})
+    return(player_ppg)
+
+def player_scores(total_points, matches, minute_mult, minutes, opp_dif, squares,
+                  cov_penalty=COV_PENALTY, minutes_cutoff=MINUTES_CUTOFF):
+    '''
+    The scoring formula of score_players, with its workings.
+    
+    Args: one array entry per player of
+        total_points, matches, minute_mult, minutes: totals over the players rows
+        opp_dif: mean normalised rating of the teams they played
+        squares: sum of squared deviations of their points from their mean
+        cov_penalty: how many times the coefficient of variation is subtracted
+        minutes_cutoff: players with fewer minutes than this over the window score 0
+    Returns: arrays of minute multiplier per match, points per match, std, cov, and score
+    '''
+    with np.errstate(invalid='ignore', divide='ignore'):
+        minute_mult = minute_mult / matches
+        points_per_match = total_points / opp_dif / matches * minute_mult
+        points_per_match = np.where(minutes >= minutes_cutoff, points_per_match, 0)
+        std = np.where(matches > 1, np.sqrt(squares / (matches - 1)), np.nan)
+        cov = std / points_per_match
+        cov = (np.abs(cov) + cov) / 2
+        score = points_per_match - cov_penalty * cov
+        score = (np.abs(score) + score) / 2
+    return(minute_mult, points_per_match, std, cov, score)
+
+def minute_multiplier(minutes):
+    '''
+    Returns: 1 for each 60+ minute appearance, 0.5 for a shorter one, and 0 if they didn't play
+    '''
+    return(np.select([minutes >= 60, (minutes > 0) & (minutes < 60), minutes == 0], [1, 0.5, 0]))
+
+def segment_sum(values, starts):
+    '''
+    Returns: sum of values over each run of rows beginning at starts
+    '''
+    if len(starts) == 0:
+        return(np.zeros(0, dtype=values.dtype))
+    return(np.add.reduceat(values, starts))
+
+def position_lookup():
+    '''
+    Returns: array of every players position code (see position_codes) indexed by element id, -1 for ids that aren't a player
+    '''
+    elements = FPLapi.elements()
+    ids = elements['id'].to_numpy()
+    lookup = np.full(ids.max() + 1 if len(ids) else 1, -1)
+    lookup[ids] = position_codes(element_positions(elements['element_type']))
+    return(lookup)
+
+def position_codes(position):
+    '''
+    Returns: array of the index in POSITIONS of each position, -1 for anything else
+    '''
+    position = np.asarray(position)
+    return(np.select([position == name for name in POSITIONS], range(len(POSITIONS)), -1))
+
+def calculate_projected_scores(player_data, fixtures, home=HOME, away=AWAY,
+                               cov_penalty=COV_PENALTY, minutes_cutoff=MINUTES_CUTOFF):
+    '''
+    Calculates projected scores for each player for each future fixture.
+    This is based on player rating and opposing team rating.
+    The team rating matrix and every player rating are calculated once, then each fixture is projected
+    by indexing in to them.
+    
+    Args: player_data, fixtures: see FPLgorithm.get_player_data
+          home, away: see project_fixtures
+          cov_penalty, minutes_cutoff: see player_scores
+    Returns: A dataframe of projected points per player per fixture
+    [Element, First Name, Second Name, Web Name, Element Type, Event, Projected Points]
+    
+    '''
+    points_against_per_game, normalised = calculate_team_ratings(player_data)
+    ppg = calculate_player_ratings(player_data, normalised, cov_penalty, minutes_cutoff)
+    return(project_fixtures(fixtures, normalised, ppg, home, away))
+
+def project_fixtures(fixtures, normalised, ppg, home=HOME, away=AWAY):
+    '''
+    Projects each future fixture by indexing in to the player and team ratings.
+    Fixtures of players without a rating are dropped. Rows are grouped by position in the order of POSITIONS.
+    
+    Args: fixtures: see FPLgorithm.get_player_data
+          normalised: see calculate_team_ratings
+          ppg: see calculate_player_ratings
+          home, away: multipliers for home and away fixtures
+    Returns: see calculate_projected_scores
+    '''
+    fixture_element = fixtures['element'].to_numpy()
+    row = np.searchsorted(ppg['element'].to_numpy(), fixture_element)
+    row = np.minimum(row, max(len(ppg) - 1, 0))
+    rated = (ppg['element'].to_numpy()[row] == fixture_element) if len(ppg) else np.zeros(len(fixtures), dtype=bool)
+    
+    order = np.flatnonzero(rated)
+    pos = ppg['position_code'].to_numpy()[row[order]]
+    order = order[np.argsort(pos, kind='mergesort')]
+    pos = ppg['position_code'].to_numpy()[row[order]]
+    score = ppg['score'].to_numpy()[row[order]]
+    
+    opp = fixtures['opponent_team'].to_numpy()[order]
+    opp_rating = np.full(len(order), np.nan)
+    known = opp < normalised.shape[1]
+    opp_rating[known] = normalised[pos[known], opp[known]]
+    
+    projection = fixtures[['element', 'first_name', 'second_name', 'web_name', 'element_type', 'event']].iloc[order]
+    projection['projected_score'] = np.where(fixtures['is_home'].to_numpy()[order] == False,
+    score * opp_rating * away,
+    score * opp_rating * home)
+    projection.index = np.concatenate([np.arange(n) for n in np.bincount(pos, minlength=len(POSITIONS))])
+    projection = projection.loc[projection['event'] != 0]
+    return(projection)
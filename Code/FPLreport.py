@@ -0,0 +1,144 @@
+import contextlib
+import cProfile
+import datetime
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    # not on Windows, where the peak memory of the process isn't recorded
+    resource = None
+
+REPORT_PATH = '../Output/run_report.json'
+PROFILE_DIR = '../Output/profile'
+# comma separated: memory traces each stages own peak memory, cpu profiles each outermost stage
+PROFILE = [p for p in os.environ.get('FPL_PROFILE', '').split(',') if p]
+
+_run = {'parameters': {}, 'stages': [], 'solves': []}
+_stack = []
+_began = [time.perf_counter()]
+
+def new_run(**parameters):
+    '''
+    Starts a new run report with the parameters of the run, forgetting the last.
+    '''
+    _run.clear()
+    _run.update({'started': datetime.datetime.now().isoformat(timespec='seconds'), 'parameters': parameters,
+                 'profile': PROFILE, 'stages': [], 'solves': []})
+    _stack.clear()
+    _began[0] = time.perf_counter()
+    if 'memory' in PROFILE and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def peak_rss_mb():
+    '''
+    Returns: the most memory the process has used so far in MB, None where it isn't known
+    '''
+    if resource is None:
+        return(None)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return(peak / 2**20 if sys.platform == 'darwin' else peak / 2**10)
+
+@contextlib.contextmanager
+def stage(name):
+    '''
+    Times a stage of the run and records it in the run report with the peak memory of the process so far
+    (process_peak_rss_mb, the same for every stage after the largest) and how much the stage raised it
+    (peak_rss_growth_mb, 0 unless the stage used more memory than any before it). A stage within another is named parent/child. If PROFILE has memory the stages own peak of traced
+    memory is recorded too, and if it has cpu each outermost stage is profiled to PROFILE_DIR/<name>.prof.
+
+    Returns: the stages entry in the run report, to which more can be added
+    '''
+    entry = {'stage': '/'.join([frame['name'] for frame in _stack] + [name])}
+    _run['stages'].append(entry)
+    process_peak = peak_rss_mb()
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        # the peak is reset for the stage, so every stage it's within keeps the peak so far
+        peak = tracemalloc.get_traced_memory()[1]
+        for frame in _stack:
+            frame['peak'] = max(frame['peak'], peak)
+        reset_peak()
+    profiler = None
+    if 'cpu' in PROFILE and not _stack:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    frame = {'name': name, 'peak': 0}
+    _stack.append(frame)
+    began = time.perf_counter()
+    try:
+        yield entry
+    finally:
+        entry['seconds'] = time.perf_counter() - began
+        _stack.pop()
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            entry['profile'] = os.path.join(PROFILE_DIR, entry['stage'] + '.prof')
+            profiler.dump_stats(entry['profile'])
+        entry['process_peak_rss_mb'] = peak_rss_mb()
+        if process_peak is not None:
+            entry['peak_rss_growth_mb'] = entry['process_peak_rss_mb'] - process_peak
+        if tracing:
+            entry['peak_traced_mb'] = max(frame['peak'], tracemalloc.get_traced_memory()[1]) / 2**20
+
+def reset_peak():
+    '''
+    Resets the peak traced memory to what's traced now. Python 3.8 has no tracemalloc.reset_peak,
+    so there tracing is restarted, which forgets what was allocated before and the peak is then of
+    what's allocated since.
+    '''
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.stop()
+        tracemalloc.start()
+
+def record(key, value):
+    '''
+    Sets key of the run report to value.
+    '''
+    _run[key] = value
+
+def add(key, value):
+    '''
+    Adds value to the list key of the run report, e.g. the report of each solve.
+    '''
+    _run.setdefault(key, []).append(value)
+
+def run_report():
+    '''
+    Returns: the run report so far, with the total seconds of each stage and of the run
+    '''
+    totals = {}
+    for entry in _run['stages']:
+        if 'seconds' in entry:
+            totals[entry['stage']] = totals.get(entry['stage'], 0) + entry['seconds']
+    return({**_run, 'totals': totals, 'seconds': time.perf_counter() - _began[0], 'process_peak_rss_mb': peak_rss_mb()})
+
+def write_report(path=REPORT_PATH):
+    '''
+    Writes the run report as json and prints the time of each outermost stage.
+    '''
+    report = run_report()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, default=to_json)
+    print(', '.join(stage + ' ' + str(round(seconds, 2)) + 's' for stage, seconds in report['totals'].items() if '/' not in stage) +
+          ', total ' + str(round(report['seconds'], 2)) + 's')
+
+def to_json(value):
+    '''
+    Converts the numpy values json can't write.
+    '''
+    if isinstance(value, np.generic):
+        return(value.item())
+    if isinstance(value, np.ndarray):
+        return(value.tolist())
+    return(str(value))
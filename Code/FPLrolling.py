@@ -0,0 +1,250 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import FPLhistory
+import FPLratings
+
+STATE_PATH = '../Data/rolling_state.npz'
+ROW_COLUMNS = ['element', 'round', 'opponent_team', 'total_points', 'minutes', 'position_code']
+
+def new_state(gameweeks):
+    '''
+    Creates an empty rolling window of gameweeks rounds.
+
+    Holds running totals per player (indexed by element id) and per [position code, opponent team],
+    which grow as new ids turn up. The rows that went in to the totals are kept too, so a round
+    leaving the window is subtracted exactly as it was added even if the flagged list changed since.
+    So are the digest of each round in the window (see FPLhistory.round_digests) and the flagged
+    rounds of the window when they went in, to find out whether the window is still right, see update.
+
+    Returns: dict of numpy arrays
+    '''
+    n_positions = len(FPLratings.POSITIONS)
+    state = {'gameweeks': np.array(gameweeks),
+             'team_points': np.zeros((n_positions, 1), dtype=np.int64),
+             'team_matches': np.zeros((n_positions, 1), dtype=np.int64),
+             'player_position': np.full(1, -1),
+             'player_points': np.zeros(1, dtype=np.int64),
+             'player_matches': np.zeros(1, dtype=np.int64),
+             'player_minute_mult': np.zeros(1),
+             'player_minutes': np.zeros(1, dtype=np.int64),
+             'player_points_squared': np.zeros(1, dtype=np.int64),
+             'player_opponents': np.zeros((1, 1), dtype=np.int64)}
+    for column in ROW_COLUMNS:
+        state['row_' + column] = np.zeros(0, dtype=np.int64)
+    state['digest_round'] = np.zeros(0, dtype=np.int64)
+    state['digest'] = np.zeros(0, dtype=np.uint64)
+    state['flagged_element'] = np.zeros(0, dtype=np.int64)
+    state['flagged_round'] = np.zeros(0, dtype=np.int64)
+    return(state)
+
+def grow(state, n_elements, n_teams):
+    '''
+    Pads the player and team arrays with zeros so they hold at least n_elements players and n_teams teams.
+    '''
+    n_elements = max(n_elements, len(state['player_matches']))
+    n_teams = max(n_teams, state['team_matches'].shape[1])
+    for key, value in state.items():
+        if key.startswith('player_') or key.startswith('team_'):
+            pad = [(0, n_elements - value.shape[0]) if key.startswith('player_') else (0, 0)]
+            if value.ndim == 2:
+                pad.append((0, n_teams - value.shape[1]))
+            state[key] = np.pad(value, pad, constant_values=-1 if key == 'player_position' else 0)
+
+def add_rows(state, rows, sign=1):
+    '''
+    Adds (sign 1) or subtracts (sign -1) whole rounds of rows to the running totals.
+    Only the rows given are touched so this costs O(len(rows)).
+
+    Args: state, see new_state
+          rows, dict or dataframe of ROW_COLUMNS arrays, every row of each round in it
+          sign, 1 to add or -1 to subtract
+    '''
+    element, rnd, opp, points, minutes, pos = [np.asarray(rows[c], dtype=np.int64) for c in ROW_COLUMNS]
+    if len(element) == 0:
+        return
+    grow(state, element.max() + 1, opp.max() + 1)
+
+    np.add.at(state['team_points'], (pos, opp), sign * points)
+    cells = np.unique(np.stack([rnd, pos, opp]), axis=1)
+    np.add.at(state['team_matches'], (cells[1], cells[2]), sign)
+
+    np.add.at(state['player_points'], element, sign * points)
+    np.add.at(state['player_matches'], element, sign)
+    np.add.at(state['player_minute_mult'], element, sign * FPLratings.minute_multiplier(minutes))
+    np.add.at(state['player_minutes'], element, sign * minutes)
+    np.add.at(state['player_points_squared'], element, sign * points ** 2)
+    np.add.at(state['player_opponents'], (element, opp), sign)
+    if sign > 0:
+        state['player_position'][element] = pos
+        for column, values in zip(ROW_COLUMNS, [element, rnd, opp, points, minutes, pos]):
+            state['row_' + column] = np.concatenate([state['row_' + column], values])
+
+def remove_rounds(state, rounds):
+    '''
+    Subtracts every stored row from the given rounds and forgets them.
+    '''
+    leaving = np.isin(state['row_round'], rounds)
+    if not leaving.any():
+        return
+    add_rows(state, {c: state['row_' + c][leaving] for c in ROW_COLUMNS}, -1)
+    for column in ROW_COLUMNS:
+        state['row_' + column] = state['row_' + column][~leaving]
+
+def advance(state, rows, latest_round):
+    '''
+    Moves the window on to end at latest_round.
+    The last round already in the window is replaced by its rows in rows (if any) so late
+    corrections such as bonus points are picked up, new rounds are added, and rounds
+    that have fallen out of the window are subtracted.
+
+    Args: state, see new_state
+          rows, dataframe of ROW_COLUMNS for every round after the last one in the window
+                and optionally that round itself
+          latest_round, the round the window now ends at
+    '''
+    first_round = latest_round - int(state['gameweeks']) + 1
+    rows = rows.loc[rows['round'] >= first_round]
+    remove_rounds(state, np.unique(rows['round']))
+    add_rows(state, rows)
+    remove_rounds(state, np.unique(state['row_round'][state['row_round'] < first_round]))
+
+def ratings(state):
+    '''
+    Calculates the team and player ratings from the running totals, giving the same result as
+    FPLratings.calculate_team_ratings and calculate_player_ratings over the rows in the window.
+    Only per player and per team totals are touched, never the rows.
+
+    Returns: normalised team ratings, see FPLratings.calculate_team_ratings
+             player ratings, see FPLratings.calculate_player_ratings
+    '''
+    points_against_per_game, normalised = FPLratings.normalise_team_ratings(state['team_points'], state['team_matches'])
+
+    players = np.flatnonzero(state['player_matches'] > 0)
+    pos = state['player_position'][players]
+    matches = state['player_matches'][players]
+    points = state['player_points'][players]
+    opponents = state['player_opponents'][players]
+    with np.errstate(invalid='ignore'):
+        opp_dif = np.where(opponents > 0, opponents * normalised[pos], 0).sum(axis=1) / matches
+    squares = state['player_points_squared'][players] - points.astype(float) ** 2 / matches
+    ppg = FPLratings.score_players(players, pos, points, matches, state['player_minute_mult'][players],
+                                   state['player_minutes'][players], opp_dif, squares)
+    return(normalised, ppg)
+
+def window_rows(history, flagged, lookup):
+    '''
+    Gets rows from the history store ready to go in the window: flagged rounds are removed
+    and each row gets its players position code, as FPLratings.remove_flagged_players and
+    add_player_details do but by array lookups.
+
+    Args: history, see FPLhistory.read_history
+          flagged, see FPLratings.read_flagged
+          lookup, see FPLratings.position_lookup
+    Returns: Dataframe of ROW_COLUMNS
+    '''
+    element = history['element'].to_numpy()
+    rows = history.assign(position_code=player_positions(lookup, element))
+    # rounds are below 256, so each element and round is one key
+    keep = ~np.isin(element * 256 + history['round'].to_numpy(), flagged['element'].to_numpy() * 256 + flagged['round'].to_numpy())
+    return(rows.loc[keep & (rows['position_code'] >= 0).to_numpy(), ROW_COLUMNS])
+
+def player_positions(lookup, element):
+    '''
+    Returns: the position code of each element in lookup, see FPLratings.position_lookup
+    '''
+    element = np.asarray(element)
+    return(np.where(element < len(lookup), lookup[np.minimum(element, len(lookup) - 1)], -1))
+
+def digests_between(rounds, digests, first_round, last_round):
+    '''
+    Returns: dict of each round from first_round to last_round (inclusive) to its digest, see FPLhistory.round_digests
+    '''
+    return({r: d for r, d in zip(np.asarray(rounds).tolist(), np.asarray(digests).tolist()) if first_round <= r <= last_round})
+
+def flagged_between(element, rounds, first_round, last_round):
+    '''
+    Returns: set of the (element, round) flagged from first_round to last_round (inclusive), see FPLratings.read_flagged
+    '''
+    return({(e, r) for e, r in zip(np.asarray(element).tolist(), np.asarray(rounds).tolist()) if first_round <= r <= last_round})
+
+def changed(state, digests, flagged, lookup, first_round, last_round):
+    '''
+    Checks whether the rows of the rounds from first_round to last_round (inclusive) would go in to the window
+    differently now, from the digest of each round in the store, the flagged list and the players positions.
+
+    Args: state, see new_state
+          digests, see FPLhistory.read_round_digests
+          flagged, see FPLratings.read_flagged
+          lookup, see FPLratings.position_lookup
+    Returns: True if they would
+    '''
+    return(digests_between(digests['round'], digests['digest'], first_round, last_round) !=
+           digests_between(state['digest_round'], state['digest'], first_round, last_round) or
+           flagged_between(flagged['element'], flagged['round'], first_round, last_round) !=
+           flagged_between(state['flagged_element'], state['flagged_round'], first_round, last_round) or
+           moved_players(state, lookup))
+
+def moved_players(state, lookup):
+    '''
+    Returns: whether a player in the window now has a different position to the one their rows went in with,
+             see FPLratings.position_lookup
+    '''
+    players = np.flatnonzero(state['player_matches'] > 0)
+    return(bool((player_positions(lookup, players) != state['player_position'][players]).any()))
+
+def load_state(gameweeks):
+    '''
+    Returns: the saved state, or a new one if there isn't one for this many gameweeks or it's from
+             before the flagged rounds were kept
+    '''
+    if os.path.exists(STATE_PATH):
+        with np.load(STATE_PATH) as saved:
+            state = dict(saved)
+        if int(state['gameweeks']) == gameweeks and 'flagged_round' in state:
+            return(state)
+    return(new_state(gameweeks))
+
+def save_state(state):
+    '''
+    Saves the state atomically.
+    '''
+    os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
+    tmp = STATE_PATH + '.tmp.npz'
+    np.savez(tmp, **state)
+    os.replace(tmp, STATE_PATH)
+
+def update(gameweeks):
+    '''
+    Brings the saved window up to date with the history store (see FPLhistory.sync) and
+    returns the ratings. Only the rows of the rounds since the last update, and the last round
+    again, are read from the store and added to the running totals, so refreshing after a gameweek
+    costs O(new rows) not O(window). The rounds staying in the window aren't read: their digests
+    kept by the store (see FPLhistory.read_round_digests), their flagged rounds and the positions of
+    the players in them are checked against the state, and if the store has gone backwards or
+    any of those has changed the window is rebuilt. If nothing has changed nothing is read or written.
+
+    Args: gameweeks, the number of past gameweeks that are taken in to consideration
+    Returns: see ratings
+    '''
+    state = load_state(gameweeks)
+    digests = FPLhistory.read_round_digests()
+    flagged = FPLratings.read_flagged()
+    lookup = FPLratings.position_lookup()
+    latest_round = int(digests['round'].max())
+    first_round = latest_round - gameweeks + 1
+    last_round = state['row_round'].max() if len(state['row_round']) else 0
+    if last_round == latest_round and not changed(state, digests, flagged, lookup, first_round, last_round):
+        return(ratings(state))
+    # the rounds staying in the window, the last round is replaced by advance anyway
+    if last_round > latest_round or changed(state, digests, flagged, lookup, first_round, last_round - 1):
+        state, last_round = new_state(gameweeks), 0
+    advance(state, window_rows(FPLhistory.read_rounds(max(last_round, first_round, 1)), flagged, lookup), latest_round)
+    in_window = (digests['round'] >= first_round).to_numpy()
+    state['digest_round'], state['digest'] = digests['round'].to_numpy()[in_window], digests['digest'].to_numpy()[in_window]
+    in_window = (flagged['round'] >= first_round).to_numpy()
+    state['flagged_element'], state['flagged_round'] = flagged['element'].to_numpy()[in_window], flagged['round'].to_numpy()[in_window]
+    save_state(state)
+    return(ratings(state))
@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+
+import FPLratings
+
+SCENARIOS = 100000
+CHUNK_SIZE = 2**22
+QUANTILES = [0.1, 0.5, 0.9]
+HAUL = 10
+SEED = 0
+STATISTICS = ['mean'] + ['q' + str(int(q * 100)) for q in QUANTILES] + ['haul_prob']
+
+def player_samples(player_data, normalised, minutes_cutoff):
+    '''
+    Gets the points each player could score against an average opponent: each of their rows in the
+    window divided by the average normalised rating of the teams they played. Players with fewer
+    minutes than minutes_cutoff over the window only ever score 0, as in FPLratings.player_scores.
+
+    Args: player_data: see FPLgorithm.get_player_data
+          normalised: see FPLratings.calculate_team_ratings
+    Returns: element ids sorted, position codes, index of each players first sample, number of samples,
+             and the samples array
+    '''
+    pos = FPLratings.position_codes(player_data['position'])
+    valid = pos >= 0
+    element = player_data['element'].to_numpy()[valid]
+    order = np.argsort(element, kind='mergesort')
+    element = element[order]
+    pos = pos[valid][order]
+    points = player_data['total_points'].to_numpy()[valid][order].astype(float)
+    minutes = player_data['minutes'].to_numpy()[valid][order]
+    opp_dif = normalised[pos, player_data['opponent_team'].to_numpy()[valid][order]]
+
+    starts = np.flatnonzero(np.r_[True, element[1:] != element[:-1]]) if len(element) else np.zeros(0, dtype=int)
+    counts = np.diff(np.r_[starts, len(element)])
+    opp_dif = FPLratings.segment_sum(opp_dif, starts) / counts
+    played = FPLratings.segment_sum(minutes, starts) >= minutes_cutoff
+    with np.errstate(invalid='ignore', divide='ignore'):
+        samples = np.where(np.repeat(played, counts), points / np.repeat(opp_dif, counts), 0)
+    return(element[starts], pos[starts], starts, counts, np.nan_to_num(samples, nan=0.0))
+
+def tally_stats(draws, player, factor, starts, counts, samples):
+    '''
+    Gets the STATISTICS of single fixtures from which of the players samples each scenario drew.
+    A fixture can only score as many different values as the player has samples, so the draws are
+    counted per value and the statistics read from the counts, giving the same result as sorting them.
+
+    Args: draws, array [fixture, scenario] of the index of the sample drawn within the players samples
+          player, factor: index of each fixtures player in starts and counts, and its multiplier
+          starts, counts, samples: see player_samples
+    Returns: array [statistic, fixture]
+    '''
+    n, scenarios = draws.shape
+    width = counts[player].max()
+    tallies = np.bincount((draws + np.arange(n)[:, None] * width).ravel(), minlength=n * width).reshape(n, width)
+    index = np.minimum(starts[player, None] + np.arange(width), len(samples) - 1)
+    values = np.where(np.arange(width) < counts[player, None], samples[index] * factor[:, None], np.inf)
+    order = np.argsort(values, axis=1, kind='mergesort')
+    values = np.take_along_axis(values, order, axis=1)
+    tallies = np.take_along_axis(tallies, order, axis=1)
+    drawn = tallies > 0
+    cumulative = tallies.cumsum(axis=1)
+
+    def kth(k):
+        return(np.take_along_axis(values, (cumulative <= k).sum(axis=1)[:, None], axis=1)[:, 0])
+
+    stats = [np.where(drawn, tallies * values, 0).sum(axis=1) / scenarios]
+    for q in QUANTILES:
+        position = q * (scenarios - 1)
+        lower = int(np.floor(position))
+        upper = min(lower + 1, scenarios - 1)
+        stats.append(kth(lower) + (kth(upper) - kth(lower)) * (position - lower))
+    stats.append(np.where(drawn & (values >= HAUL), tallies, 0).sum(axis=1) / scenarios)
+    return(np.vstack(stats))
+
+def quantiles(points, q):
+    '''
+    Same as np.quantile(points, q, axis=1) but only partially sorts each row around the values needed.
+    '''
+    position = np.asarray(q) * (points.shape[1] - 1)
+    lower = np.floor(position).astype(int)
+    upper = np.minimum(lower + 1, points.shape[1] - 1)
+    points = np.partition(points, np.unique(np.r_[lower, upper]), axis=1)
+    return((points[:, lower] + (points[:, upper] - points[:, lower]) * (position - lower)).T)
+
+def simulate(player_data, fixtures, normalised, statistic='mean', scenarios=SCENARIOS, home=None, away=None,
+             minutes_cutoff=None, seed=SEED):
+    '''
+    Simulates every players points in every future gameweek instead of giving one projected score.
+    In each scenario each fixture draws one of the players samples (see player_samples) and multiplies
+    it by the opponents normalised rating and the home or away multiplier. A players fixtures in the
+    same gameweek are added up before the statistics are taken, so double gameweeks are simulated whole.
+
+    Scenarios are drawn as one array per block of gameweeks, with blocks kept to CHUNK_SIZE draws,
+    so memory doesn't grow with the number of scenarios or players.
+
+    Args: player_data, fixtures: see FPLgorithm.get_player_data
+          normalised: see FPLratings.calculate_team_ratings
+          statistic: which of STATISTICS becomes the projected score the optimiser maximises
+          scenarios: number of scenarios
+          home, away: see FPLratings.project_fixtures, FPLratings.HOME and AWAY if None
+          minutes_cutoff: see player_samples, FPLratings.MINUTES_CUTOFF if None
+          seed: seed of the random number generator
+    Returns: A dataframe of projected points per player per gameweek in the layout of
+        FPLratings.calculate_projected_scores, with a column for each of STATISTICS
+    [Element, First Name, Second Name, Web Name, Element Type, Event, Projected Points, Mean, Q10, Q50, Q90, Haul Prob]
+    '''
+    home = FPLratings.HOME if home is None else home
+    away = FPLratings.AWAY if away is None else away
+    minutes_cutoff = FPLratings.MINUTES_CUTOFF if minutes_cutoff is None else minutes_cutoff
+    element, pos, starts, counts, samples = player_samples(player_data, normalised, minutes_cutoff)
+
+    fixture_element = fixtures['element'].to_numpy()
+    player = np.minimum(np.searchsorted(element, fixture_element), max(len(element) - 1, 0))
+    rated = (element[player] == fixture_element) if len(element) else np.zeros(len(fixtures), dtype=bool)
+    opp = fixtures['opponent_team'].to_numpy()
+    known = np.zeros(len(fixtures), dtype=bool)
+    known[rated] = opp[rated] < normalised.shape[1]
+    factor = np.full(len(fixtures), np.nan)
+    factor[known] = normalised[pos[player[known]], opp[known]]
+    factor *= np.where(fixtures['is_home'].to_numpy() == False, away, home)
+    keep = known & ~np.isnan(factor) & (fixtures['event'].to_numpy() != 0)
+
+    order = np.flatnonzero(keep)
+    order = order[np.lexsort((fixtures['event'].to_numpy()[order], fixture_element[order]))]
+    player, factor = player[order], factor[order]
+    keys = fixture_element[order] * (fixtures['event'].max() + 1) + fixtures['event'].to_numpy()[order]
+    group_starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.zeros(0, dtype=int)
+    bounds = np.r_[group_starts, len(keys)]
+
+    rng = np.random.default_rng(seed)
+    stats = np.zeros((len(STATISTICS), len(group_starts)))
+    sizes = np.diff(bounds)
+    for groups in [np.flatnonzero(sizes == 1), np.flatnonzero(sizes > 1)]:
+        block = (np.cumsum(sizes[groups]) - 1) // max(CHUNK_SIZE // scenarios, 1)
+        for chunk in np.split(groups, np.flatnonzero(np.diff(block)) + 1):
+            if len(chunk) == 0:
+                continue
+            rows = np.concatenate([np.arange(bounds[i], bounds[i + 1]) for i in chunk]) if sizes[chunk[0]] > 1 else bounds[chunk]
+            draws = (rng.random((len(rows), scenarios), dtype=np.float32) * counts[player[rows], None]).astype(np.intp)
+            if sizes[chunk[0]] == 1:
+                stats[:, chunk] = tally_stats(draws, player[rows], factor[rows], starts, counts, samples)
+            else:
+                points = samples[starts[player[rows], None] + draws] * factor[rows, None]
+                points = np.add.reduceat(points, np.r_[0, np.cumsum(sizes[chunk])[:-1]], axis=0)
+                stats[:, chunk] = np.vstack([points.mean(axis=1), quantiles(points, QUANTILES), (points >= HAUL).mean(axis=1)])
+
+    projection = fixtures[['element', 'first_name', 'second_name', 'web_name', 'element_type', 'event']].iloc[order[group_starts]]
+    projection = projection.reset_index(drop=True)
+    for name, values in zip(STATISTICS, stats):
+        projection[name] = values
+    projection['projected_score'] = projection[statistic]
+    return(projection)
@@ -0,0 +1,252 @@
+import inspect
+import os
+import re
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pulp
+
+SOLVER = os.environ.get('FPL_SOLVER', 'GLPK_CMD')
+TIME_LIMIT = 900
+CBC_SOLVERS = ['PULP_CBC_CMD', 'COIN_CMD']
+PULP_SETTINGS = {'gapRel': 'gap', 'threads': 'thread', 'maxNodes': 'node limit'}
+
+def solver_settings(name=None, threads=None, gap=None, time_limit=TIME_LIMIT, node_limit=None):
+    '''
+    Chooses the solver the optimiser uses and how long it can take.
+    
+    Args: name, GLPK_CMD, PULP_CBC_CMD, COIN_CMD, HiGHS, or another of pulp.listSolvers(), SOLVER if None
+          threads, number of threads (GLPK only has one), solvers without the setting ignore it and say so
+          gap, relative MIP gap to stop at, e.g. 0.01 stops once the solution is within 1% of the best possible
+          time_limit, seconds to stop after
+          node_limit, branch and bound nodes to stop after (CBC, HiGHS, and the pulp solvers that take it)
+    Returns: dict of the settings
+    '''
+    return({'name': name or SOLVER, 'threads': threads, 'gap': gap, 'time_limit': time_limit, 'node_limit': node_limit})
+
+def solve(prob, variables, model, solver=None, start=None):
+    '''
+    Solves the problem from FPLtimiser.to_problem with the chosen solver.
+    HiGHS is given the model as an MPS file through highspy, everything else goes through pulp.
+    
+    Args: prob, variables: see FPLtimiser.to_problem
+          model, see FPLtimiser.build_model
+          solver, see solver_settings, the defaults if None
+          start, feasible values of the variables for the solver to start from (a MIP start),
+                 see FPLtimiser.initial_solution. GLPK can't take one so it's ignored. The solution is
+                 never worse than the start, which is kept if the solver finds nothing better or fails.
+    Returns: dict report of the solve
+        solver, status (Optimal, Feasible, Not Solved, Infeasible or Unbounded), objective,
+        bound (best possible objective), gap (relative between objective and bound),
+        start (objective of the starting solution), seconds, progress (see log_progress)
+             array of the value of each variable in the solution, nan if there isn't one
+    '''
+    solver = solver or solver_settings()
+    directory = tempfile.mkdtemp()
+    began = time.perf_counter()
+    try:
+        if solver['name'] == 'HiGHS':
+            report, x = solve_highs(variables, model, solver, directory, start)
+        else:
+            report, x = solve_pulp(prob, variables, solver, directory, start)
+    except pulp.PulpSolverError:
+        # CBC can crash when stopped on time with a start
+        if start is None:
+            raise
+        report = {'solver': solver['name'], 'status': 'Not Solved', 'objective': None, 'bound': None, 'gap': None, 'progress': []}
+        x = np.full(len(variables), np.nan)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    
+    if start is not None:
+        report['start'] = float(model['objective'] @ start)
+        if report['status'] not in ['Optimal', 'Feasible'] or report['objective'] < report['start'] - 1e-6:
+            print(report['solver'] + ' found nothing better than the starting solution (' + report['status'] + '), keeping it')
+            x = start
+            report['status'], report['objective'] = 'Feasible', report['start']
+    else:
+        report['start'] = None
+    if report['objective'] is not None and report['bound'] is not None:
+        report['gap'] = abs(report['bound'] - report['objective']) / max(abs(report['objective']), 1e-9)
+    if report['status'] == 'Optimal' and report['gap'] is not None and report['gap'] > 1e-6:
+        report['status'] = 'Feasible'
+    report['seconds'] = time.perf_counter() - began
+    return(report, x)
+
+def solve_pulp(prob, variables, solver, directory, start=None):
+    '''
+    Solves with a pulp solver, reading the best bound from the solvers log where it has one.
+    '''
+    name = solver['name']
+    log_path = os.path.join(directory, 'solver.log')
+    if start is not None and name != 'GLPK_CMD':
+        for variable, value in zip(variables, start.tolist()):
+            variable.setInitialValue(value)
+    if name == 'GLPK_CMD':
+        if solver['threads'] or solver['node_limit']:
+            print('GLPK has no thread or node limit settings, ignoring them')
+        if start is not None:
+            print('GLPK can\'t take a starting solution, ignoring it')
+        options = ['--log', log_path] + (['--mipgap', str(solver['gap'])] if solver['gap'] is not None else [])
+        pulp_solver = pulp.GLPK_CMD(msg=False, timeLimit=solver['time_limit'], options=options)
+    elif name in CBC_SOLVERS:
+        options = ['maxNodes ' + str(solver['node_limit'])] if solver['node_limit'] else []
+        pulp_solver = pulp.getSolver(name, msg=False, timeLimit=solver['time_limit'], gapRel=solver['gap'],
+                                     threads=solver['threads'], logPath=log_path, options=options,
+                                     warmStart=start is not None)
+    else:
+        # pulp's names for the settings, given only to the solvers whose class takes them
+        settings = {'gapRel': solver['gap'], 'threads': solver['threads'] or None, 'maxNodes': solver['node_limit'] or None,
+                    'warmStart': True if start is not None else None}
+        takes = inspect.signature(getattr(pulp, name, pulp.LpSolver)).parameters
+        ignored = [setting for setting in ['gapRel', 'threads', 'maxNodes'] if settings[setting] is not None and setting not in takes]
+        if ignored:
+            print(name + ' has no ' + ' or '.join(PULP_SETTINGS[setting] for setting in ignored) +
+                  (' settings, ignoring them' if len(ignored) > 1 else ' setting, ignoring it'))
+        if start is not None and 'warmStart' not in takes:
+            print(name + ' can\'t take a starting solution, ignoring it')
+        pulp_solver = pulp.getSolver(name, msg=False, timeLimit=solver['time_limit'],
+                                     **{setting: value for setting, value in settings.items() if value is not None and setting in takes})
+    prob.solve(pulp_solver)
+    
+    found = prob.sol_status in [pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible]
+    objective = pulp.value(prob.objective) if found else None
+    statuses = {pulp.LpSolutionOptimal: 'Optimal', pulp.LpSolutionIntegerFeasible: 'Feasible',
+                pulp.LpSolutionInfeasible: 'Infeasible', pulp.LpSolutionUnbounded: 'Unbounded'}
+    report = {'solver': name, 'status': statuses.get(prob.sol_status, 'Not Solved'),
+              'objective': objective, 'bound': None, 'gap': None, 'progress': []}
+    if os.path.exists(log_path):
+        with open(log_path) as f:
+            log = f.read()
+        report['bound'] = log_bound(name, log, objective)
+        # pulp gives CBC the negated objective when maximising
+        report['progress'] = log_progress(name, log, -1 if prob.sense == pulp.LpMaximize and name in CBC_SOLVERS else 1)
+    # pulp reads the solution in to the variables one by one, this gathers them back in to one array
+    x = np.array([np.nan if v.varValue is None else v.varValue for v in variables], dtype=float) if found else np.full(len(variables), np.nan)
+    return(report, x)
+
+def log_bound(name, log, objective):
+    '''
+    Returns: the best possible objective from a GLPK or CBC log, None if it doesn't say
+    '''
+    if name == 'GLPK_CMD':
+        progress = re.findall(r'mip =\s*(\S+)\s*[<>]=\s*(tree is empty|\S+)', log)
+        if progress:
+            return(objective if progress[-1][1] == 'tree is empty' else float(progress[-1][1]))
+    elif name in CBC_SOLVERS:
+        if 'Result - Optimal solution found' in log:
+            return(objective)
+        bound = re.findall(r'(?:Upper|Lower) bound:\s+(\S+)', log)
+        if bound:
+            return(float(bound[-1]))
+    return(None)
+
+def log_progress(name, log, sign=1):
+    '''
+    Reads how the solve went from a GLPK, CBC or HiGHS log.
+    
+    Args: sign, -1 if the log has the negated objective
+    Returns: list of dicts of seconds (or simplex iterations for GLPK, which doesn't log the time),
+             objective (None until a solution is found) and bound, each time the solver logged them
+    '''
+    def number(text):
+        try:
+            value = sign * float(text)
+        except ValueError:
+            return(None)
+        return(value if np.isfinite(value) and abs(value) < 1e30 else None)
+    
+    if name == 'GLPK_CMD':
+        progress = re.findall(r'\+\s*(\d+): mip =\s*(not found yet|\S+)\s*[<>]=\s*(tree is empty|\S+)', log)
+        return([{'iterations': int(i), 'objective': number(o), 'bound': number(b)} for i, o, b in progress])
+    if name in CBC_SOLVERS:
+        progress = re.findall(r'After \d+ nodes, \d+ on tree, (\S+) best solution, best possible (\S+) \((\S+) seconds\)', log)
+        return([{'seconds': float(t), 'objective': number(o), 'bound': number(b)} for o, b, t in progress])
+    if name == 'HiGHS':
+        progress = re.findall(r'^\s*[A-Za-z]?\s+\d+\s+\d+\s+\d+\s+\S+%\s+(\S+)\s+(\S+)\s+\S+\s+\d+\s+\d+\s+\d+\s+\d+\s+(\S+)s$',
+                              log, flags=re.MULTILINE)
+        return([{'seconds': float(t), 'objective': number(o), 'bound': number(b)} for b, o, t in progress])
+    return([])
+
+def solve_highs(variables, model, solver, directory, start=None):
+    '''
+    Solves with HiGHS (needs the highspy package) from an MPS file written by write_mps.
+    '''
+    import highspy
+    path = os.path.join(directory, 'model.mps')
+    write_mps(model, path)
+    log_path = os.path.join(directory, 'solver.log')
+    highs = highspy.Highs()
+    highs.setOptionValue('log_to_console', False)
+    highs.setOptionValue('log_file', log_path)
+    for option, value in [('threads', solver['threads']), ('mip_rel_gap', solver['gap']),
+                          ('time_limit', solver['time_limit']), ('mip_max_nodes', solver['node_limit'])]:
+        if value is not None:
+            highs.setOptionValue(option, float(value) if option in ['mip_rel_gap', 'time_limit'] else int(value))
+    highs.readModel(path)
+    if start is not None:
+        solution = highspy.HighsSolution()
+        solution.col_value = start.tolist()
+        highs.setSolution(solution)
+    highs.run()
+    
+    info = highs.getInfo()
+    status = highs.modelStatusToString(highs.getModelStatus())
+    found = info.primal_solution_status == highspy.SolutionStatus.kSolutionStatusFeasible
+    x = np.array(highs.getSolution().col_value, dtype=float) if found else np.full(len(variables), np.nan)
+    statuses = {'Optimal': 'Optimal', 'Infeasible': 'Infeasible', 'Unbounded': 'Unbounded'}
+    with open(log_path) as f:
+        log = f.read()
+    # the file minimises the negated objective
+    return({'solver': 'HiGHS', 'status': statuses.get(status, 'Feasible' if found else 'Not Solved'),
+            'objective': -info.objective_function_value if found else None,
+            'bound': -info.mip_dual_bound if np.isfinite(info.mip_dual_bound) else None, 'gap': None,
+            'progress': log_progress('HiGHS', log, -1)}, x)
+
+def write_mps(model, path):
+    '''
+    Writes a model from FPLtimiser.build_model to a free MPS file in one go from its arrays, for solvers
+    outside pulp. The objective is negated so the file minimises.
+    '''
+    # sense -1, 0, 1 indexes L, E, G
+    sense_code = np.array(['E', 'G', 'L'])[np.asarray(model['sense'], dtype=int)]
+    binary = model['category'] == pulp.LpBinary
+    
+    # every column is listed with an objective entry if it has no other, row -1 being the objective
+    objective = np.flatnonzero((model['objective'] != 0) | ~np.isin(np.arange(len(model['names'])), model['col']))
+    col = np.r_[model['col'], objective]
+    row = np.r_[model['row'], np.full(len(objective), -1)]
+    value = np.r_[model['value'], -model['objective'][objective]]
+    order = np.lexsort((row, col))
+    col, row, value = col[order], row[order], value[order]
+    names = ['C' + str(j) for j in range(len(model['names']))]
+    row_names = ['OBJ'] + ['R' + str(r) for r in range(len(sense_code))]
+    
+    lines = ['NAME Optimiser', 'ROWS', ' N OBJ']
+    lines += [' ' + s + ' ' + r for s, r in zip(sense_code.tolist(), row_names[1:])]
+    lines.append('COLUMNS')
+    integer = binary[col]
+    start = np.flatnonzero(np.r_[True, integer[1:] != integer[:-1]]).tolist() if len(col) else []
+    col, row, value = col.tolist(), (row + 1).tolist(), value.tolist()
+    for k, s in enumerate(start):
+        e = start[k + 1] if k + 1 < len(start) else len(col)
+        if integer[s]:
+            lines.append("    MARKER 'MARKER' 'INTORG'")
+        lines += ['    ' + names[j] + ' ' + row_names[r] + ' ' + repr(v) for j, r, v in zip(col[s:e], row[s:e], value[s:e])]
+        if integer[s]:
+            lines.append("    MARKER 'MARKER' 'INTEND'")
+    lines.append('RHS')
+    rhs = np.flatnonzero(model['rhs'])
+    lines += ['    RHS R' + str(r) + ' ' + repr(v) for r, v in zip(rhs.tolist(), model['rhs'][rhs].tolist())]
+    lines.append('BOUNDS')
+    # binaries fixed at 0 (see FPLtimiser.update_model) or 1 (a chip played in a chosen week) are written
+    # as integers with their bounds
+    free = binary & (model['low'] <= 0) & (model['up'] >= 1)
+    lines += [' BV BND ' + names[j] for j in np.flatnonzero(free).tolist()]
+    for j in np.flatnonzero(~free).tolist():
+        lines += [' LO BND ' + names[j] + ' ' + str(model['low'][j]), ' UP BND ' + names[j] + ' ' + str(model['up'][j])]
+    lines.append('ENDATA')
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
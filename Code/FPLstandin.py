@@ -0,0 +1,201 @@
+import argparse
+import hashlib
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+PAGE_SIZE = 50
+
+def make_season(seed=0, current_gw=20, players_per_team=30, league_size=20):
+    '''
+    Generates a deterministic synthetic season shaped like the FPL API so the
+    pipeline can be run and timed without touching the real thing.
+    The whole 38 gameweek season is drawn up front, only rounds up to current_gw are exposed,
+    so two seasons with the same seed but different current_gw agree on their shared history.
+
+    Args: seed, random seed
+          current_gw, the latest finished gameweek
+          players_per_team, number of elements per club
+          league_size, number of entries in the synthetic classic league
+    Returns: dict of endpoint path to decoded json
+    '''
+    rng = np.random.RandomState(seed)
+    teams = np.arange(1, 21)
+    attack = rng.uniform(0.7, 1.3, 20)
+    defense = rng.uniform(0.7, 1.3, 20)
+
+    # double round robin by the circle method
+    rotation = list(teams)
+    schedule = []
+    for r in range(19):
+        pairs = [(rotation[k], rotation[19 - k]) for k in range(10)]
+        schedule.append([(h, a) if r % 2 == 0 else (a, h) for h, a in pairs])
+        rotation = [rotation[0]] + [rotation[-1]] + rotation[1:-1]
+    schedule += [[(a, h) for h, a in rnd] for rnd in schedule]
+    fixture_ids = {}
+    for gw, rnd in enumerate(schedule, start=1):
+        for h, a in rnd:
+            fixture_ids[(gw, h)] = fixture_ids[(gw, a)] = len(fixture_ids) // 2 + 1
+
+    types = ([1] * 3 + [2] * 10 + [3] * 11 + [4] * 6) * (players_per_team // 30 + 1)
+    elements = []
+    history = {}
+    for t in teams:
+        for k in range(players_per_team):
+            element = len(elements) + 1
+            element_type = types[k]
+            quality = rng.gamma(2.0, 0.6)
+            p_start = rng.beta(2, 1.2)
+            status = rng.choice(['a', 'd', 'i'], p=[0.9, 0.05, 0.05])
+            cost = int(np.clip(40 + quality * 25 + element_type * 5, 40, 130))
+            rows = []
+            for gw in range(1, 39):
+                h, a = next(f for f in schedule[gw - 1] if t in f)
+                is_home = h == t
+                opponent = a if is_home else h
+                u = rng.uniform()
+                minutes = 90 if u < p_start else int(rng.randint(1, 30)) if u < p_start + 0.15 else 0
+                points = 0
+                if minutes > 0:
+                    lam = quality * attack[t - 1] * defense[opponent - 1] * (1.1 if is_home else 0.9) * minutes / 90
+                    points = (2 if minutes >= 60 else 1) + int(rng.poisson(lam) * [6, 6, 5, 4][element_type - 1] / 2)
+                    if element_type <= 2 and minutes >= 60 and rng.uniform() < 0.35 / attack[opponent - 1]:
+                        points += 4
+                rows.append({'element': element, 'fixture': fixture_ids[(gw, t)], 'opponent_team': int(opponent),
+                             'total_points': points, 'was_home': bool(is_home), 'round': gw, 'minutes': minutes,
+                             'value': cost})
+            history[element] = rows
+            played = [r for r in rows if r['round'] <= current_gw]
+            elements.append({'id': element, 'code': 100000 + element, 'element_type': element_type,
+                             'team': int(t), 'team_code': int(t) + 100, 'first_name': 'First' + str(element),
+                             'second_name': 'Second' + str(element), 'web_name': 'Player' + str(element),
+                             'now_cost': cost,
+                             'status': str(status),
+                             'total_points': sum(r['total_points'] for r in played),
+                             'minutes': sum(r['minutes'] for r in played)})
+
+    api = {}
+    api['bootstrap-static/'] = {
+        'events': [{'id': gw, 'finished': gw <= current_gw, 'is_current': gw == current_gw,
+                    'is_next': gw == current_gw + 1, 'is_previous': gw == current_gw - 1} for gw in range(1, 39)],
+        'teams': [{'id': int(t), 'code': int(t) + 100, 'name': 'Club' + str(t), 'short_name': 'C' + str(t)} for t in teams],
+        'elements': elements,
+        'element_types': [{'id': 1, 'singular_name_short': 'GKP'}, {'id': 2, 'singular_name_short': 'DEF'},
+                          {'id': 3, 'singular_name_short': 'MID'}, {'id': 4, 'singular_name_short': 'FWD'}]}
+    for e in elements:
+        t = e['team']
+        fixtures = []
+        for gw in range(current_gw + 1, 39):
+            h, a = next(f for f in schedule[gw - 1] if t in f)
+            fixtures.append({'id': fixture_ids[(gw, t)], 'team_h': int(h), 'team_a': int(a), 'event': gw,
+                             'finished': False, 'is_home': bool(h == t)})
+        api['element-summary/' + str(e['id']) + '/'] = {
+            'fixtures': fixtures, 'history': [r for r in history[e['id']] if r['round'] <= current_gw]}
+
+    points = np.array([[r['total_points'] for r in history[e['id']]] for e in elements])
+    squads = {}
+    standings = []
+    for entry in range(1000, 1000 + league_size):
+        squad = pick_squad(elements, np.random.RandomState(entry))
+        squads[entry] = squad
+        gw_points = points[np.array(squad) - 1, :current_gw].sum(axis=0)
+        total = np.cumsum(gw_points)
+        api['entry/' + str(entry) + '/history/'] = {
+            'current': [{'event': gw, 'points': int(gw_points[gw - 1]), 'total_points': int(total[gw - 1]),
+                         'overall_rank': int(5000000 / (1 + total[gw - 1] / 100))} for gw in range(1, current_gw + 1)],
+            'past': [], 'chips': []}
+        standings.append({'entry': entry, 'player_name': 'Manager ' + str(entry),
+                          'entry_name': 'Team ' + str(entry), 'total': int(total[-1]) if current_gw else 0})
+    standings.sort(key=lambda s: -s['total'])
+    for rank, s in enumerate(standings, start=1):
+        s['rank'] = rank
+    api['entry/'] = squads
+    api['leagues-classic/'] = standings
+    return(api)
+
+def pick_squad(elements, rng):
+    '''
+    Picks a valid 15 man squad (2/5/5/3, max 3 per club, within 100m) at random
+    from the cheaper half of each position.
+    '''
+    options = {}
+    for element_type in range(1, 5):
+        of_type = sorted((e for e in elements if e['element_type'] == element_type), key=lambda e: e['now_cost'])
+        options[element_type] = of_type[:len(of_type) // 2]
+    while True:
+        squad = []
+        for element_type, n in [(1, 2), (2, 5), (3, 5), (4, 3)]:
+            squad += [options[element_type][k] for k in rng.choice(len(options[element_type]), n, replace=False)]
+        clubs = np.bincount([e['team'] for e in squad])
+        if clubs.max() <= 3 and sum(e['now_cost'] for e in squad) <= 1000:
+            return([e['id'] for e in squad])
+
+def make_handler(api, latency):
+    '''
+    Returns a request handler serving the synthetic season with a fixed per request latency.
+    '''
+    class StandinHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            url = urlparse(self.path)
+            path = url.path.split('/api/', 1)[-1].lstrip('/')
+            if path.startswith('leagues-classic/'):
+                page = int(parse_qs(url.query).get('page_standings', ['1'])[0])
+                results = api['leagues-classic/'][(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+                body = {'league': {'id': int(path.split('/')[1]), 'name': 'Standin League'},
+                        'standings': {'has_next': page * PAGE_SIZE < len(api['leagues-classic/']),
+                                      'page': page, 'results': results}}
+            elif path.startswith('entry/') and path.endswith('/picks/') and int(path.split('/')[1]) in api['entry/']:
+                squad = api['entry/'][int(path.split('/')[1])]
+                body = {'picks': [{'element': p, 'position': k + 1, 'multiplier': 2 if k == 0 else 1,
+                                   'is_captain': k == 0, 'is_vice_captain': k == 1} for k, p in enumerate(squad)]}
+            elif path in api:
+                body = api[path]
+            else:
+                self.send_error(404)
+                return
+            payload = json.dumps(body).encode()
+            etag = '"' + hashlib.sha1(payload).hexdigest()[:16] + '"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return(StandinHandler)
+
+def serve(port=8000, latency=0.05, **season):
+    '''
+    Serves a synthetic season on localhost. Point the pipeline at it with
+    FPL_API_URL=http://127.0.0.1:<port>/api/
+    '''
+    api = make_season(**season)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(api, latency))
+    server.daemon_threads = True
+    return(server)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the FPL API')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every response')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--gameweek', type=int, default=20, help='latest finished gameweek')
+    parser.add_argument('--players-per-team', type=int, default=30)
+    parser.add_argument('--league-size', type=int, default=20)
+    args = parser.parse_args()
+    server = serve(args.port, args.latency, seed=args.seed, current_gw=args.gameweek,
+                   players_per_team=args.players_per_team, league_size=args.league_size)
+    print('Serving stand-in FPL API on http://127.0.0.1:' + str(args.port) + '/api/')
+    server.serve_forever()
@@ -0,0 +1,237 @@
+import argparse
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import FPLapi
+import FPLgorithm
+import FPLhistory
+import FPLratings
+
+REPORT_PATH = '../Output/sweep.csv'
+ROW_COLUMNS = ['element', 'round', 'opponent_team', 'total_points', 'minutes', 'was_home', 'position_code', 'flagged']
+PARAMETERS = ['gameweeks', 'home', 'away', 'cov_penalty', 'minutes_cutoff', 'doubtful']
+METRICS = {'mae': True, 'rmse': True, 'corr': False, 'top_points': False}
+TOP_N = 11
+
+_shared = {}
+_totals = {}
+
+def share(array):
+    '''
+    Copies an array in to a new block of shared memory.
+
+    Returns: the SharedMemory block, which the caller must close and unlink,
+             and the (name, shape, dtype) needed to attach to it
+    '''
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+    return(block, (block.name, array.shape, array.dtype.str))
+
+def attach(spec):
+    '''
+    Returns: the SharedMemory block and an array viewing it without copying, see share
+    '''
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=name)
+    return(block, np.ndarray(shape, dtype, buffer=block.buf))
+
+def init_worker(rows_spec, ratings_spec, windows):
+    '''
+    Attaches each worker process to the shared rows and team ratings once.
+    The blocks are kept in _shared so the views stay valid for the life of the worker.
+    '''
+    for key, spec in [('rows', rows_spec), ('ratings', ratings_spec)]:
+        _shared[key + '_block'], _shared[key] = attach(spec)
+    _shared['round_starts'] = np.searchsorted(_shared['rows'][ROW_COLUMNS.index('round')],
+                                              np.arange(_shared['ratings'].shape[1] + 2))
+    _shared['windows'] = windows
+
+def recorded_rows():
+    '''
+    Gets every recorded row of the season as one integer array, sorted by round so any run of rounds
+    is a contiguous slice. Each row carries its players position code and whether they were on the
+    flagged list that round.
+
+    Returns: array [len(ROW_COLUMNS), rows]
+    '''
+    history = FPLratings.add_player_details(FPLhistory.read_history())
+    history['position_code'] = FPLratings.position_codes(history['position'])
+    flagged = pd.read_csv(FPLratings.FLAGGED_PATH).dropna().astype(np.int64).drop_duplicates()
+    flagged['flagged'] = 1
+    history = pd.merge(history, flagged, how='left', on=['element', 'round'])
+    history['flagged'] = history['flagged'].fillna(0)
+    history = history.loc[history['position_code'] >= 0].sort_values(['round', 'element'], kind='mergesort')
+    return(np.stack([history[column].to_numpy().astype(np.int64) for column in ROW_COLUMNS]))
+
+def rating_tensor(rows, windows, last):
+    '''
+    Calculates the team rating matrix for every window length after every gameweek up to last,
+    from the rows that weren't flagged, see FPLratings.calculate_team_ratings.
+
+    Returns: array [window, gameweek, position, opponent team]
+    '''
+    element, rnd, opp, points, minutes, was_home, pos, flagged = rows
+    n_teams = opp.max() + 1
+    ratings = np.full((len(windows), last + 1, len(FPLratings.POSITIONS), n_teams), np.nan)
+    for w, gameweeks in enumerate(windows):
+        for gameweek in range(1, last + 1):
+            keep = (rnd > gameweek - gameweeks) & (rnd <= gameweek) & (flagged == 0)
+            ratings[w, gameweek] = FPLratings.team_ratings(pos[keep], opp[keep], rnd[keep], points[keep], n_teams)[1]
+    return(ratings)
+
+def rounds(first_round, last_round):
+    '''
+    Returns: view of the shared rows of the rounds from first_round to last_round (inclusive)
+    '''
+    starts = _shared['round_starts']
+    return(_shared['rows'][:, starts[max(first_round, 0)]:starts[last_round + 1]])
+
+def window_totals(gameweeks, gameweek):
+    '''
+    Per player totals for a window, see FPLratings.player_totals. They only depend on the window
+    so each worker keeps them for the configurations that share it.
+    '''
+    key = (gameweeks, gameweek)
+    if key not in _totals:
+        element, rnd, opp, points, minutes, was_home, pos, flagged = rounds(gameweek - gameweeks + 1, gameweek)
+        keep = flagged == 0
+        normalised = _shared['ratings'][_shared['windows'].index(gameweeks), gameweek]
+        _totals[key] = FPLratings.player_totals(element[keep], pos[keep], opp[keep], points[keep], minutes[keep], normalised)
+    return(_totals[key])
+
+def evaluate_config(config, first, last):
+    '''
+    Projects the following gameweek after every gameweek from first to last with one set of parameters
+    and compares the projections with what happened. Players flagged in the following gameweek
+    have their projection multiplied by the doubtful factor.
+
+    Args: config, dict of PARAMETERS
+          first, last: the first and last gameweeks whose data is used to project
+    Returns: dict of the parameters and the mean of each of METRICS over the gameweeks
+    '''
+    scores = {metric: [] for metric in METRICS}
+    for gameweek in range(first, last + 1):
+        element, pos, total_points, matches, minute_mult, minutes, opp_dif, squares = window_totals(config['gameweeks'], gameweek)
+        score = FPLratings.player_scores(total_points, matches, minute_mult, minutes, opp_dif, squares,
+                                         config['cov_penalty'], config['minutes_cutoff'])[-1]
+        score = np.nan_to_num(score, nan=0.0)
+
+        upcoming = rounds(gameweek + 1, gameweek + 1)
+        player = np.minimum(np.searchsorted(element, upcoming[0]), max(len(element) - 1, 0))
+        rated = (element[player] == upcoming[0]) if len(element) else np.zeros(upcoming.shape[1], dtype=bool)
+        player, (fixture_element, rnd, opp, points, minutes, was_home, fixture_pos, flagged) = player[rated], upcoming[:, rated]
+
+        normalised = _shared['ratings'][_shared['windows'].index(config['gameweeks']), gameweek]
+        projected = (score[player] * normalised[pos[player], opp] * np.where(was_home == 1, config['home'], config['away'])
+                     * np.where(flagged == 1, config['doubtful'], 1))
+        known = ~np.isnan(projected)
+
+        players, index = np.unique(fixture_element[known], return_inverse=True)
+        if len(players) < 2:
+            continue
+        projected = np.bincount(index, weights=projected[known])
+        actual = np.bincount(index, weights=points[known])
+        scores['mae'].append(np.abs(projected - actual).mean())
+        scores['rmse'].append(np.sqrt(((projected - actual) ** 2).mean()))
+        scores['corr'].append(np.corrcoef(projected, actual)[0, 1] if projected.std() > 0 else np.nan)
+        scores['top_points'].append(actual[np.argsort(-projected, kind='mergesort')[:TOP_N]].sum())
+    return({**config, **{metric: np.nanmean(values) if values else np.nan for metric, values in scores.items()}})
+
+def grid(values):
+    '''
+    Args: values, dict of each of PARAMETERS to a list of values to try
+    Returns: list of configs, every combination of the values
+    '''
+    return([dict(zip(PARAMETERS, combination)) for combination in itertools.product(*[values[p] for p in PARAMETERS])])
+
+def random_configs(values, n, seed=0):
+    '''
+    Args: values, dict of each of PARAMETERS to a list of values, each sampled uniformly between
+                  its smallest and largest value (gameweeks and minutes_cutoff as whole numbers)
+          n, number of configs
+    Returns: list of configs
+    '''
+    rng = np.random.RandomState(seed)
+    columns = {}
+    for p in PARAMETERS:
+        low, high = min(values[p]), max(values[p])
+        if p in ['gameweeks', 'minutes_cutoff']:
+            columns[p] = rng.randint(low, high + 1, n)
+        else:
+            columns[p] = rng.uniform(low, high, n)
+    return([{p: columns[p][i].item() for p in PARAMETERS} for i in range(n)])
+
+def sweep(configs, first, last, workers=None, sort='mae'):
+    '''
+    Evaluates every config over the recorded season in a pool of worker processes.
+    The recorded rows and the team rating matrix for every window length are placed in shared memory
+    once, and each worker reads them in place, so only the small configs are sent with each task.
+
+    Args: configs, list of dicts of PARAMETERS, see grid and random_configs
+          first, last: the first and last gameweeks whose data is used to project
+          workers: number of worker processes
+          sort: one of METRICS to sort the results by, best first
+    Returns: Dataframe of results per config, also written to REPORT_PATH
+    '''
+    start = time.perf_counter()
+    rows = recorded_rows()
+    last = min(last, rows[ROW_COLUMNS.index('round')].max() - 1)
+    windows = sorted(set(int(config['gameweeks']) for config in configs))
+    ratings = rating_tensor(rows, windows, last)
+
+    blocks = []
+    try:
+        rows_block, rows_spec = share(rows)
+        blocks.append(rows_block)
+        ratings_block, ratings_spec = share(ratings)
+        blocks.append(ratings_block)
+        del rows, ratings
+
+        evaluate = partial(evaluate_config, first=first, last=last)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(rows_spec, ratings_spec, windows)) as pool:
+            report = pd.DataFrame(pool.map(evaluate, configs, chunksize=max(len(configs) // 64, 1)))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    report = report.sort_values(sort, ascending=METRICS[sort], kind='mergesort').reset_index(drop=True)
+    report.to_csv(REPORT_PATH, index=False)
+    print(report.head(10).to_string(index=False))
+    print(str(len(configs)) + ' configurations over gameweeks ' + str(first + 1) + '-' + str(last + 1) +
+          ' in ' + str(round(time.perf_counter() - start, 2)) + 's')
+    return(report)
+
+def values_list(text, kind=float):
+    '''
+    Returns: list of values from comma separated text
+    '''
+    return([kind(value) for value in text.split(',')])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Searches the projection parameters on the recorded season')
+    parser.add_argument('--first', type=int, default=8, help='first gameweek to project after')
+    parser.add_argument('--last', type=int, default=37, help='last gameweek to project after')
+    parser.add_argument('--gameweeks', type=partial(values_list, kind=int), default=[4, 6, 8, 10])
+    parser.add_argument('--home', type=values_list, default=[1, FPLratings.HOME, 1.1])
+    parser.add_argument('--away', type=values_list, default=[0.9, FPLratings.AWAY, 1])
+    parser.add_argument('--cov-penalty', type=values_list, default=[0, 0.5, FPLratings.COV_PENALTY, 2])
+    parser.add_argument('--minutes-cutoff', type=partial(values_list, kind=int), default=[90, FPLratings.MINUTES_CUTOFF, 270])
+    parser.add_argument('--doubtful', type=values_list, default=[0.25, FPLgorithm.DOUBTFUL, 0.75])
+    parser.add_argument('--random', type=int, default=None, help='sample this many configs between the smallest and largest values instead of the full grid')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--sort', choices=list(METRICS), default='mae')
+    args = parser.parse_args()
+    FPLapi.OFFLINE = True
+
+    values = {p: getattr(args, p) for p in PARAMETERS}
+    configs = grid(values) if args.random is None else random_configs(values, args.random, args.seed)
+    sweep(configs, args.first, args.last, args.workers, args.sort)
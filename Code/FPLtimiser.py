@@ -1,236 +1,1140 @@
+import hashlib
+import os
+import time
+
+import numpy as np
 import pandas as pd
 import pulp
 
-def fpl_optimiser(projected_scores_for_optimiser, transfers, in_bank):
+import FPLreport
+import FPLsolver
+
+def fpl_optimiser(projected_scores_for_optimiser, transfers, in_bank, solver=None, window=None, coarse=4, unavailable=None,
+                  plans=1, distinct=1, chips=None, engine='milp', sinks=('excel',)):
+    '''
+    Writes the optimal squad/starters/captain for each week with FPL transfer logic to Output/optimal_teams.
+    The solver starts from the squads of the last run where they're still possible, see initial_solution.
+    
+    Args: solver, see FPLsolver.solver_settings, the defaults if None
+          window, coarse: plan a week at a time with window detailed weeks, see rolling_horizon,
+                          rather than all the weeks at once if window is None, in which case the model
+                          of the last run is reused if only the projections changed, see optimise
+          unavailable, elements that can't be bought
+          plans, distinct: if plans is more than 1 also write the next best plans, see top_plans,
+                           to optimal_teams_plan<n>.xlsx with how they compare in alternative_plans.csv
+          chips, chips that can be played, see build_model, not when planning a week at a time (a ValueError)
+          engine, milp to solve the model, heuristic for a good plan in well under a second (see heuristic),
+                  or hybrid to solve the model starting from the heuristics plan if it's better than the last runs
+          sinks, what to write the plan as, see write_plan
+    '''
+    if window is not None and chips:
+        raise ValueError('Chips can\'t be played when planning a week at a time, see rolling_horizon')
+    if engine == 'heuristic':
+        squad_df, start_df, strong_bench_df, cap_df, report, plan_df = heuristic(projected_scores_for_optimiser, transfers, in_bank,
+                                                                                 unavailable)
+    elif plans > 1:
+        found, comparison = top_plans(projected_scores_for_optimiser, transfers, in_bank, plans, distinct, solver,
+                                      unavailable=unavailable, chips=chips)
+        squad_df, start_df, strong_bench_df, cap_df, report, plan_df = found[0]
+        with FPLreport.stage('write'):
+            for plan, frames in enumerate(found[1:]):
+                write_plan('../Output/optimal_teams_plan' + str(plan + 2), frames[5], frames[:4], sinks, frames[4].get('chips'))
+            comparison.to_csv('../Output/alternative_plans.csv', index=False)
+        print(comparison.to_string(index=False))
+    elif window is None:
+        squad_df, start_df, strong_bench_df, cap_df, report, plan_df = optimise(projected_scores_for_optimiser, transfers, in_bank,
+                                                                                solver, previous=read_previous(PREVIOUS_PATH),
+                                                                                reuse=True, unavailable=unavailable, chips=chips,
+                                                                                heuristic_start=engine == 'hybrid')
+    else:
+        squad_df, start_df, strong_bench_df, cap_df, report, plan_df = rolling_horizon(projected_scores_for_optimiser, transfers,
+                                                                                       in_bank, window, coarse, solver,
+                                                                                       unavailable=unavailable,
+                                                                                       heuristic_start=engine == 'hybrid')
+    if report['status'] in ['Optimal', 'Feasible']:
+        save_previous(squad_df, PREVIOUS_PATH)
+    with FPLreport.stage('write'):
+        write_plan('../Output/optimal_teams', plan_df, [squad_df, start_df, strong_bench_df, cap_df], sinks, report.get('chips'))
+
+def write_plan(path, plan_df, frames, sinks=('excel',), chips=None):
     '''
-    Creates excel workbook of optimal squad/starters/captain for each week with FPL transfer logic.
+    Writes a plan to each of sinks (see SINKS), path with the sinks extension: excel the squad, start,
+    strong bench and captain workbook (see write_workbook), csv, json (a record per row) or parquet the
+    plan dataframe (see plan_frame), which are much quicker to write and read back in than the workbook.
+    
+    Args: path, without an extension
+          plan_df, see plan_frame
+          frames, the squad, start, strong bench and captain dataframes, see optimise
+          chips, the week each chip is played, see chip_weeks
+    '''
+    for sink in sinks:
+        if sink == 'excel':
+            write_workbook(frames, path + '.xlsx', chips)
+        elif sink == 'csv':
+            plan_df.to_csv(path + '.csv', index=False)
+        elif sink == 'json':
+            plan_df.to_json(path + '.json', orient='records', indent=1)
+        elif sink == 'parquet':
+            plan_df.to_parquet(path + '.parquet', index=False)
+        else:
+            raise ValueError('Unknown sink ' + sink + ', expected one of ' + ', '.join(SINKS))
+
+def write_workbook(frames, path, chips=None):
+    '''
+    Writes the squad, start, strong bench and captain dataframes from optimise to an excel workbook,
+    and the week each chip is played if chips (see chip_weeks) are given.
+    '''
+    squad_df, start_df, strong_bench_df, cap_df = frames
+    writer = pd.ExcelWriter(path, engine = 'xlsxwriter')
+    squad_df.to_excel(writer, sheet_name = 'Squad', index=False)
+    start_df.to_excel(writer, sheet_name = 'Start', index=False)
+    strong_bench_df.to_excel(writer, sheet_name = 'StrongBench', index=False)
+    cap_df.to_excel(writer, sheet_name = 'Captain', index=False)
+    if chips:
+        pd.DataFrame({'chip': list(chips), 'week': list(chips.values())}).to_excel(writer, sheet_name = 'Chips', index=False)
+    writer.save()
+
+FAMILIES = ['squad', 'start', 'bench', 'strong_bench', 'cap', 'both']
+PREFIXES = {'squad': 'x', 'start': 'y', 'bench': 'be', 'strong_bench': 'sb', 'cap': 'z', 'both': 'b'}
+TEAMS = 20
+SQUAD_POSITIONS = {'GK': 2, 'Def': 5, 'Mid': 5, 'Att': 3}
+CHIPS = {'wildcard': 'wc', 'free_hit': 'fh', 'bench_boost': 'bb'}
+CHIP_FAMILIES = {'free_hit': 'hit', 'bench_boost': 'boost'}
+CHIP_PREFIXES = {'hit': 'fhx', 'boost': 'bbx'}
+CHIP_PENALTY = 0.01
+THRESHOLDS = [0, 1, 2, 4]
+SINKS = ['excel', 'csv', 'json', 'parquet']
+PLAN_FAMILIES = ['squad', 'start', 'bench', 'strong_bench', 'cap']
+PREVIOUS_PATH = '../Data/previous_squads.csv'
+MODEL_PATH = '../Data/optimiser_model.npz'
+MODEL_ARRAYS = ['category', 'low', 'up', 'objective', 'row', 'col', 'value', 'sense', 'rhs']
+
+_models = {}
+
+def optimise(projected_scores_for_optimiser, transfers, in_bank, solver=None, prune=True, previous=None, warm_start=True,
+             reuse=False, unavailable=None, chips=None, heuristic_start=False):
+    '''
+    Finds the optimal squad/starters/captain for each week with FPL transfer logic.
+    
+    Args: projected_scores_for_optimiser, see FPLgorithm.prepare_for_optimiser
+          transfers, free transfers available (15 for a wildcard)
+          in_bank, money in the bank
+          solver, see FPLsolver.solver_settings, the defaults (GLPK with a 15 minute limit) if None
+          prune, whether to first remove players that can't be in an optimal squad, see prune_dominated
+          previous, squads of a previous solution to start from, see read_previous, or a list of them
+          warm_start, whether to give the solver a starting solution, see initial_solution
+          reuse, whether to reuse the model of the last run with the same players, team, transfers and bank,
+                 see reusable_model. Only its objective and bounds are updated, pruned players are fixed out
+                 of the squad rather than removed, and it starts from the last solution if previous is None
+          unavailable, elements that can't be bought (e.g. injured), fixed out of the squad unless already in it
+          chips, chips that can be played, see build_model
+          heuristic_start, whether the plan of heuristic is also a starting solution
+    Returns: squad, start, strong bench and captain dataframes, one row per player picked
+             and a 0/1 column per week, the solve report, see FPLsolver.solve, with the week
+             each chip is played if there are chips, see chip_weeks, and the plan dataframe, see plan_frame
     '''
     print("Starting Optimisation...")
     data = projected_scores_for_optimiser
+    if heuristic_start:
+        plan = heuristic(data, transfers, in_bank, unavailable)
+        previous = [p for p in [previous, squads_frame(plan[0]) if plan[4]['status'] == 'Feasible' else None] if p is not None] or None
+    with FPLreport.stage('model_build'):
+        kept = data
+        if prune:
+            kept = prune_dominated(data, None if previous is None else pd.concat(previous if isinstance(previous, list) else [previous])['element'],
+                                   chips)
+        fixed = data['element'].isin(unavailable if unavailable is not None else []) & (data['in_team'] != 1)
+        if reuse:
+            key = structure_key(data, transfers, in_bank, chips)
+            model, prob, variables = reusable_model(data, transfers, in_bank, key, chips)
+            update_model(model, data, (fixed | ~data.index.isin(kept.index)).to_numpy())
+            update_problem(prob, variables, model)
+            previous = previous if previous is not None else _models[key].get('previous')
+        else:
+            data = kept
+            model = build_model(data, transfers, in_bank, chips)
+            update_model(model, data, fixed.loc[data.index].to_numpy())
+            prob, variables = to_problem(model)
+    squad_df, start_df, strong_bench_df, cap_df, report, plan_df, values = solve_model(data, model, prob, variables, transfers,
+                                                                                       solver, previous, warm_start)
+    if reuse and report['status'] in ['Optimal', 'Feasible']:
+        _models[key]['previous'] = squads_frame(squad_df)
+    return(squad_df, start_df, strong_bench_df, cap_df, report, plan_df)
+
+def solve_model(projected_scores_for_optimiser, model, prob, variables, transfers, solver=None, previous=None, warm_start=True):
+    '''
+    Solves a model from build_model and its pulp problem from to_problem, see optimise.
+    The solve report and the size of the model (see model_size) are added to the run report, see FPLreport.
     
-    player_ids = data.index
+    Returns: squad, start, strong bench and captain dataframes, the solve report and the plan dataframe, see optimise,
+             the report with the size of the model, and array [family, week, player] of the solutions variables, see FAMILIES
+    '''
+    data = projected_scores_for_optimiser
+    size = model_size(model)
+    print('Model: ' + ', '.join(str(n) + ' ' + name for name, n in size.items()))
+    with FPLreport.stage('solve'):
+        start = initial_solution(data, model, transfers, previous) if warm_start else None
+        report, x = FPLsolver.solve(prob, variables, model, solver, start)
+    report['model'] = size
+    FPLreport.add('solves', report)
+    print(report['solver'] + ': ' + report['status'] + ', objective ' + str(report['objective']) +
+          ', bound ' + str(report['bound']) + ', gap ' + str(report['gap']) + ', started from ' + str(report['start']) +
+          ', ' + str(round(report['seconds'], 1)) + 's')
     
-    weeks = len(data.columns[5:-25])  
-    free_transfers = transfers
-    bank = in_bank
+    with FPLreport.stage('extraction'):
+        weeks, players = model['weeks'], model['players']
+        # the solvers binaries can be a little off 0 or 1, and nan where there's no solution
+        x = np.round(np.nan_to_num(x))
+        values = x[:len(FAMILIES) * weeks * players].reshape(len(FAMILIES), weeks, players)
+        if model['chips']:
+            report['chips'] = chip_weeks(model, x)
+            print('Chips: ' + ', '.join(chip + ' ' + str(week) for chip, week in report['chips'].items()))
+        squad_df, start_df, strong_bench_df, cap_df = solution_frames(data, values, model['columns'])
+        plan_df = plan_frame(data, values, model['columns'], report.get('chips'))
+    return(squad_df, start_df, strong_bench_df, cap_df, report, plan_df, values)
+
+def model_size(model):
+    '''
+    Returns: dict of the number of variables, constraints and nonzero coefficients of a model from build_model
+    '''
+    return({'variables': len(model['names']), 'constraints': len(model['sense']), 'nonzeros': len(model['value'])})
+
+def top_plans(projected_scores_for_optimiser, transfers, in_bank, plans=3, distinct=1, solver=None, prune=True, unavailable=None,
+              chips=None):
+    '''
+    Finds the best few plans, each with squads differing from every better plan by at least distinct
+    players over the weeks. The model is built once and kept, and after each solve a cut ruling out
+    squads within distinct players of that plan is added (a no-good cut), so each further plan is one more solve.
+    Pruned players are left out of every plan, so an alternative is never just a swap for a dominated player.
+    
+    Args: see optimise
+          plans, number of plans
+          distinct, fewest players (summed over the weeks) any two plans' squads differ by
+    Returns: list of the plans found, best first, each the squad, start, strong bench and captain dataframes,
+             the solve report and the plan dataframe, see optimise, and a dataframe comparing each plan with the best
+    [Plan, Objective, Loss, Changes, Differences]
+    '''
+    print("Starting Optimisation...")
+    data = projected_scores_for_optimiser
+    with FPLreport.stage('model_build'):
+        if prune:
+            data = prune_dominated(data, chips=chips)
+        model = build_model(data, transfers, in_bank, chips)
+        update_model(model, data, (data['element'].isin(unavailable if unavailable is not None else []) & (data['in_team'] != 1)).to_numpy())
+        prob, variables = to_problem(model)
+    var = family_variables(model['weeks'], model['players'])
+    
+    found, squads = [], []
+    for plan in range(plans):
+        solution = solve_model(data, model, prob, variables, transfers, solver)
+        report, values = solution[4], solution[6]
+        if report['status'] not in ['Optimal', 'Feasible']:
+            # the first plan is returned either way, as optimise would
+            if not found:
+                found.append(solution[:6])
+            break
+        found.append(solution[:6])
+        squads.append(values[FAMILIES.index('squad')] > 0.5)
+        add_cut(model, prob, variables, var['squad'][squads[-1]], squads[-1].sum() - distinct)
+    return(found, compare_plans(data, model['columns'], [plan[4] for plan in found[:len(squads)]], squads))
+
+def add_cut(model, prob, variables, col, rhs):
+    '''
+    Adds the constraint that the variables col add up to at most rhs to a model from build_model and its pulp problem.
+    '''
+    model['row'] = np.r_[model['row'], np.full(len(col), len(model['sense']))]
+    model['col'] = np.r_[model['col'], col]
+    model['value'] = np.r_[model['value'], np.ones(len(col))]
+    model['sense'] = np.r_[model['sense'], -1]
+    model['rhs'] = np.r_[model['rhs'], rhs]
+    prob.addConstraint(pulp.LpConstraint(pulp.LpAffineExpression([(variables[j], 1) for j in col.tolist()]), -1, rhs=rhs))
+
+def compare_plans(projected_scores_for_optimiser, columns, reports, squads):
+    '''
+    Args: columns, the week columns
+          reports, the solve report of each plan, see FPLsolver.solve
+          squads, array [week, player] of each plans squads
+    Returns: dataframe of each plans objective, how much less it is than the best plans, how many players
+             its squads differ from the best plans by, and who is in (+) and out (-) each week compared to the best plan
+    '''
+    names = projected_scores_for_optimiser['name'].to_numpy()
+    rows = []
+    for plan, (report, squad) in enumerate(zip(reports, squads)):
+        differences = []
+        for a, week in enumerate(columns):
+            added, removed = names[squad[a] & ~squads[0][a]], names[squads[0][a] & ~squad[a]]
+            if len(added):
+                differences.append(week + ': ' + ' '.join(['+' + n for n in added] + ['-' + n for n in removed]))
+        rows.append({'plan': plan + 1, 'objective': report['objective'], 'loss': reports[0]['objective'] - report['objective'],
+                     'changes': int((squad & ~squads[0]).sum()), 'differences': '; '.join(differences)})
+    return(pd.DataFrame(rows, columns=['plan', 'objective', 'loss', 'changes', 'differences']))
+
+def solution_frames(projected_scores_for_optimiser, values, columns):
+    '''
+    Args: projected_scores_for_optimiser, see optimise
+          values, array [family, week, player] of the solutions variables, see FAMILIES
+          columns, the week columns
+    Returns: squad, start, strong bench and captain dataframes, see optimise
+    '''
+    data = projected_scores_for_optimiser
+    output = {c: data[c].to_numpy() for c in ['element', 'name', 'now_cost', 'in_team']}
+    frames = []
+    for family in ['squad', 'start', 'strong_bench', 'cap']:
+        picked = values[FAMILIES.index(family)]
+        rows = (picked != 0).any(axis=0)
+        frames.append(pd.DataFrame({**{c: v[rows] for c, v in output.items()},
+                                    **{family + '_' + c: week[rows] for c, week in zip(columns, picked)}}))
+    return(frames)
+
+def plan_frame(projected_scores_for_optimiser, values, columns, chips=None):
+    '''
+    Gathers a solution in to one tidy dataframe, a row for each player in the squad or lineup each week.
+    In a free hit week the lineup is the free hit squad while the squad is the one held for the week after.
+    
+    Args: projected_scores_for_optimiser, see optimise
+          values, array [family, week, player] of the solutions variables, see FAMILIES
+          columns, the week columns
+          chips, the week each chip is played, see chip_weeks
+    Returns: dataframe [week, element, name, position, team, now_cost, in_team, squad, start, bench, strong_bench, cap,
+                        points (projected), bought (in the squad but not the week before), chip (played that week)]
+    '''
+    data = projected_scores_for_optimiser
+    picked = values[[FAMILIES.index(family) for family in PLAN_FAMILIES]]
+    week, player = np.nonzero(picked.any(axis=0))
+    squad = values[FAMILIES.index('squad')]
+    before = np.vstack([data['in_team'].to_numpy(dtype=float), squad[:-1]])
+    played = {c: chip for chip, c in (chips or {}).items() if c is not None}
+    plan_df = pd.DataFrame({'week': np.array(columns, dtype=object)[week],
+                            'element': data['element'].to_numpy()[player],
+                            'name': data['name'].to_numpy()[player],
+                            'position': np.array(list(SQUAD_POSITIONS))[np.argmax(data[list(SQUAD_POSITIONS)].to_numpy(), axis=1)][player],
+                            'team': data['team'].to_numpy()[player],
+                            'now_cost': data['now_cost'].to_numpy()[player],
+                            'in_team': data['in_team'].to_numpy()[player]})
+    for family, family_values in zip(PLAN_FAMILIES, picked):
+        plan_df[family] = family_values[week, player].astype(int)
+    plan_df['points'] = np.nan_to_num(data[columns].to_numpy(dtype=float).T)[week, player]
+    plan_df['bought'] = ((squad[week, player] > 0.5) & (before[week, player] < 0.5)).astype(int)
+    plan_df['chip'] = [played.get(c, '') for c in plan_df['week']]
+    return(plan_df)
+
+def rolling_horizon(projected_scores_for_optimiser, transfers, in_bank, window=3, coarse=4, solver=None, prune=True,
+                    unavailable=None, heuristic_start=False):
+    '''
+    Plans a long horizon a week at a time, as solve time grows steeply with the number of weeks.
+    Each solve has the next window weeks in full detail followed by the rest of the horizon grouped in to
+    look-ahead weeks of coarse weeks each, whose projected points are added up. Only the first weeks squad,
+    starters, strong bench and captain are kept, then the window slides on a week from that squad with the
+    free transfers and bank it leaves. Each solve starts from the plan of the one before, see initial_solution.
+    Chips aren't played, as a chip played within the window changes the weeks after the one kept.
+    
+    Args: see optimise
+          window, number of weeks solved in full detail
+          coarse, number of weeks grouped in to each look-ahead week
+    Returns: see optimise, with a report of the whole plan
+        solver, status (the worst of the solves), objective (of the whole plan), solves, seconds
+    '''
+    start = time.perf_counter()
+    data = projected_scores_for_optimiser
+    columns = list(data.columns[5:-25])
+    values = np.zeros((len(FAMILIES), len(columns), len(data)))
+    in_team = data['in_team'].to_numpy(dtype=float)
+    cost = data['now_cost'].to_numpy(dtype=float)
+    previous = None
+    statuses = []
+    for k in range(len(columns)):
+        later = columns[k + window:]
+        look_ahead = [data[later[b:b + coarse]].sum(axis=1).rename(later[b]) for b in range(0, len(later), coarse)]
+        step = pd.concat([data.iloc[:, :5], data[columns[k:k + window]]] + look_ahead + [data.iloc[:, -25:]], axis=1)
+        step['in_team'] = in_team
+        squad_df, start_df, strong_bench_df, cap_df, report, plan_df = optimise(step, transfers, in_bank, solver, prune, previous,
+                                                                                unavailable=unavailable, heuristic_start=heuristic_start)
+        statuses.append(report['status'])
+        if report['status'] not in ['Optimal', 'Feasible']:
+            break
+        
+        for family, frame in zip(['squad', 'start', 'strong_bench', 'cap'], [squad_df, start_df, strong_bench_df, cap_df]):
+            picked = frame.loc[frame[family + '_' + columns[k]] > 0.5, 'element']
+            values[FAMILIES.index(family), k] = data['element'].isin(picked).to_numpy()
+        squad = values[FAMILIES.index('squad'), k]
+        transfers = next_transfers(transfers, int(round(15 - in_team @ squad)))
+        in_bank = in_team @ cost + in_bank - squad @ cost
+        in_team = squad
+        previous = squads_frame(squad_df)
+    
+    values[FAMILIES.index('bench')] = values[FAMILIES.index('squad')] * (1 - values[FAMILIES.index('start')])
+    points = data[columns].to_numpy(dtype=float).T
+    objective = (points * (values[FAMILIES.index('start')] + values[FAMILIES.index('cap')] +
+                           0.1 * values[FAMILIES.index('strong_bench')])).sum()
+    order = ['Optimal', 'Feasible', 'Not Solved', 'Infeasible', 'Unbounded']
+    report = {'solver': report['solver'], 'status': max(statuses, key=order.index), 'objective': objective,
+              'solves': len(statuses), 'seconds': time.perf_counter() - start}
+    print('Rolling horizon: ' + report['status'] + ', objective ' + str(objective) + ', ' + str(len(statuses)) +
+          ' solves, ' + str(round(report['seconds'], 1)) + 's')
+    squad_df, start_df, strong_bench_df, cap_df = solution_frames(data, values, columns)
+    return(squad_df, start_df, strong_bench_df, cap_df, report, plan_frame(data, values, columns))
+
+def next_transfers(transfers, changes):
+    '''
+    Returns: the free transfers available the week after making changes with transfers free,
+             see the transfer rules in build_model
+    '''
+    return(1 if transfers == 15 else min(transfers + 1 - changes, 2))
+
+def heuristic(projected_scores_for_optimiser, transfers, in_bank, unavailable=None):
+    '''
+    Finds a good squad/starters/captain for each week with FPL transfer logic in well under a second,
+    for when there's no time to wait for the solver. A plan is made for each of THRESHOLDS, see
+    heuristic_squads, and checked against every constraint of build_model (see feasible), and the best
+    feasible plan is kept. Its plan also makes a good starting solution for the solver, see optimise.
+    
+    Args: see optimise
+    Returns: see optimise, with a report of solver (heuristic), status (Feasible, or Infeasible if no
+             plan meets the constraints, when the best plan is returned anyway), objective, seconds
+    '''
+    start = time.perf_counter()
+    data = projected_scores_for_optimiser
+    columns = list(data.columns[5:-25])
+    buyable = ~data['element'].isin(unavailable if unavailable is not None else []).to_numpy() | (data['in_team'].to_numpy() == 1)
+    points = np.nan_to_num(data[columns].to_numpy(dtype=float).T)
+    model = build_model(data, transfers, in_bank)
+    update_model(model, data, ~buyable)
+    objective, status = None, 'Infeasible'
+    for threshold in THRESHOLDS:
+        squads = heuristic_squads(data, transfers, in_bank, buyable, threshold)
+        plan = lineups(data, columns, squads)
+        plan_objective = (points * (plan['start'] + plan['cap'] + 0.1 * plan['strong_bench'])).sum()
+        plan_feasible = feasible(model, assignment(data, model, transfers, squads))
+        if objective is None or (plan_feasible, plan_objective) > (status == 'Feasible', objective):
+            x, objective, status = plan, plan_objective, 'Feasible' if plan_feasible else 'Infeasible'
+    report = {'solver': 'heuristic', 'status': status, 'objective': objective, 'seconds': time.perf_counter() - start}
+    FPLreport.add('solves', report)
+    print('Heuristic: ' + status + ', objective ' + str(objective) + ', ' + str(round(report['seconds'], 2)) + 's')
+    values = np.array([x[family] for family in FAMILIES])
+    squad_df, start_df, strong_bench_df, cap_df = solution_frames(data, values, columns)
+    return(squad_df, start_df, strong_bench_df, cap_df, report, plan_frame(data, values, columns))
+
+def heuristic_squads(projected_scores_for_optimiser, transfers, in_bank, buyable=None, threshold=0):
+    '''
+    Picks a squad each week greedily. With a wildcard the first squad is the better of the current team and
+    the players projected the most points over the weeks that fit in the budget (see greedy_squad), each
+    improved by swaps until none helps. Otherwise each week the transfers available are spent one at a time
+    on the swap that most improves the squads points over the rest of the weeks were it held, as long as
+    one improves them by more than threshold (see improve), so a higher threshold saves transfers for
+    bigger gains later. Every squad keeps to the budget, positions and team limits and the transfers
+    follow the rules in build_model. If no full squad fits the budget the weeks from then on are left
+    empty, which heuristic reports as infeasible.
+    
+    Args: see optimise
+          buyable, array of whether each player can be brought in to the squad, all of them if None
+          threshold, fewest points a transfer must gain
+    Returns: array [week, player] of 0/1
+    '''
+    data = projected_scores_for_optimiser
+    columns = list(data.columns[5:-25])
+    points = np.nan_to_num(data[columns].to_numpy(dtype=float).T)
+    cost = data['now_cost'].to_numpy(dtype=float)
+    in_team = data['in_team'].to_numpy() == 1
+    position = np.argmax(data[list(SQUAD_POSITIONS)].to_numpy(), axis=1)
+    team = data['team'].to_numpy().astype(int)
+    buyable = np.ones(len(data), dtype=bool) if buyable is None else buyable
+    budget = cost[in_team].sum() + in_bank
+    
+    current = np.flatnonzero(in_team)[np.argsort(position[in_team], kind='mergesort')]
+    squads = np.zeros((len(columns), len(data)))
+    slots, available = current, transfers
+    for a in range(len(columns)):
+        held = slots
+        if a == 0 and transfers == 15:
+            starts = [greedy_squad(points.sum(axis=0), cost, position, team, budget, buyable)] + [current]
+            starts = [s for s in starts if len(s) == 15]
+            if not starts:
+                break
+            tried = [improve(s, points, cost, position, team, budget, buyable) for s in starts]
+            slots = max(tried, key=lambda s: lineup_points(points[:, s]).sum())
+        else:
+            slots = improve(slots, points[a:], cost, position, team, budget, buyable, available if a == 0 else min(available, 2),
+                            threshold)
+        squads[a, slots] = 1
+        available = next_transfers(available, 15 - np.isin(slots, held).sum())
+    return(squads)
+
+def greedy_squad(value, cost, position, team, budget, buyable):
+    '''
+    Fills a squad with the highest value players that fit, keeping enough of the budget back
+    to fill the rest of the squad with the cheapest players the team limits allow, see cheapest_fill.
+    If the rest can't be filled that way the player is skipped, and if no more players fit the squad
+    is finished with the last fill found, so the squad is only short of 15 if even the cheapest squad
+    doesn't fit the budget.
+    
+    Args: value, array of each players value
+          cost, position, team: arrays of each players cost, position (index of SQUAD_POSITIONS) and team
+          budget, most the squad can cost
+          buyable, see heuristic_squads
+    Returns: array of the squads players in position order
+    '''
+    by_cost = np.argsort(cost, kind='mergesort')
+    by_cost = by_cost[buyable[by_cost]].tolist()
+    position, team = position.tolist(), team.tolist()
+    counts = squad_counts()
+    slots, spent = [], 0
+    fill = cheapest_fill(slots, counts, by_cost, position, team)
+    if fill is None or cost[fill].sum() > budget:
+        slots = np.array(fill or [], dtype=int)
+        return(slots[np.argsort(np.array(position)[slots], kind='mergesort')])
+    for j in np.argsort(-value, kind='mergesort').tolist():
+        if len(slots) == 15:
+            break
+        if not buyable[j] or j in slots or not fits(counts, position[j], team[j]):
+            continue
+        add_player(counts, position[j], team[j])
+        rest = cheapest_fill(slots + [j], counts, by_cost, position, team)
+        if rest is None or spent + cost[j] + cost[rest].sum() > budget + 1e-9:
+            add_player(counts, position[j], team[j], -1)
+            continue
+        slots.append(j)
+        spent += cost[j]
+        fill = rest
+    slots = np.array(slots + fill, dtype=int)
+    return(slots[np.argsort(np.array(position)[slots], kind='mergesort')])
+
+def squad_counts():
+    '''
+    Returns: the counts of an empty squad the squad rules are checked against, see fits: the players of
+             each position, of each team, and of goalkeepers and defenders of each team
+    '''
+    return([[0] * len(SQUAD_POSITIONS), [0] * (TEAMS + 1), [0] * (TEAMS + 1)])
+
+def fits(counts, p, t):
+    '''
+    Returns: whether a player of position p and team t can join a squad with counts (see squad_counts) within
+             the position counts of SQUAD_POSITIONS, 3 players a team and 2 goalkeepers and defenders a team
+    '''
+    return(counts[0][p] < list(SQUAD_POSITIONS.values())[p] and counts[1][t] < 3 and (p >= 2 or counts[2][t] < 2))
+
+def add_player(counts, p, t, sign=1):
+    '''
+    Adds (or with sign -1 removes) a player of position p and team t to counts, see squad_counts.
+    '''
+    counts[0][p] += sign
+    counts[1][t] += sign
+    counts[2][t] += sign * (p < 2)
+
+def cheapest_fill(slots, counts, by_cost, position, team):
+    '''
+    Fills the rest of a squad with the cheapest players that fit, see fits.
+    
+    Args: slots, list of the players in the squad so far
+          counts, of the squad so far, see squad_counts
+          by_cost, list of the players that can be bought, cheapest first
+          position, team: lists of each players position and team
+    Returns: list of the players added, None if the squad can't be filled
+    '''
+    counts = [list(c) for c in counts]
+    taken = set(slots)
+    added = []
+    for j in by_cost:
+        if len(slots) + len(added) == 15:
+            break
+        if j not in taken and fits(counts, position[j], team[j]):
+            add_player(counts, position[j], team[j])
+            added.append(j)
+    return(added if len(slots) + len(added) == 15 else None)
+
+def improve(slots, points, cost, position, team, budget, buyable, limit=None, threshold=0):
+    '''
+    Local search: makes the swap of a squad player for one of the same position that most improves
+    the squads points (see lineup_points) until limit swaps have been made or no swap improves them
+    by more than threshold.
+    Every swap the budget or team limits allow is scored at once.
+    
+    Args: slots, array of the squads players in position order
+          points, array [week, player] of the projected points of the weeks the squad is held for
+          cost, position, team, budget, buyable: see greedy_squad
+          limit, most swaps, no limit if None
+          threshold, fewest points a swap must gain
+    Returns: array of the new squads players in position order
+    '''
+    slots = slots.copy()
+    same = position[slots][:, None] == position[None, :]
+    defence = position < 2
+    best = lineup_points(points[:, slots]).sum()
+    for swap in range(100 if limit is None else limit):
+        in_squad = np.zeros(len(position), dtype=bool)
+        in_squad[slots] = True
+        count = np.bincount(team[slots], minlength=TEAMS + 1)
+        defenders = np.bincount(team[slots][defence[slots]], minlength=TEAMS + 1)
+        leaving = team[slots][:, None] == team[None, :]
+        valid = (same & buyable & ~in_squad & (cost[slots].sum() - cost[slots][:, None] + cost <= budget + 1e-9) &
+                 (count[team] - leaving < 3) & (~defence | (defenders[team] - (leaving & defence[slots][:, None]) < 2)))
+        k, j = np.nonzero(valid)
+        if len(k) == 0:
+            break
+        candidates = np.repeat(points[:, slots][None], len(k), axis=0)
+        candidates[np.arange(len(k)), :, k] = points[:, j].T
+        scores = lineup_points(candidates).sum(axis=1)
+        c = np.argmax(scores)
+        if scores[c] <= best + threshold + 1e-9:
+            break
+        slots[k[c]], best = j[c], scores[c]
+    return(slots)
+
+def lineup_points(points):
+    '''
+    The points a squad scores with its best starters, captain and strong bench, as the objective of
+    build_model counts them, see lineups.
+    
+    Args: points, array [..., 15] of the squads points in position order (2 GK, 5 Def, 5 Mid, 3 Att)
+    Returns: array [...]
+    '''
+    gk = points[..., :2].max(axis=-1)
+    defenders, midfielders, attackers = [-np.sort(-points[..., a:b], axis=-1) for a, b in [(2, 7), (7, 12), (12, 15)]]
+    rest = -np.sort(-np.concatenate([defenders[..., 3:], midfielders[..., 2:], attackers[..., 1:]], axis=-1), axis=-1)
+    starters = gk + defenders[..., :3].sum(axis=-1) + midfielders[..., :2].sum(axis=-1) + attackers[..., 0] + rest[..., :4].sum(axis=-1)
+    captain = np.maximum.reduce([gk, defenders[..., 0], midfielders[..., 0], attackers[..., 0]])
+    return(starters + captain + 0.1 * rest[..., 4:6].sum(axis=-1))
+
+def prune_dominated(projected_scores_for_optimiser, always_keep=None, chips=None):
+    '''
+    Removes players that can be swapped for a better one in any squad, so they never need to be in the model.
+    
+    Player j dominates player i if they play the same position, j costs no more and j is projected at
+    least as many points in every week (the earlier row winning ties). Swapping i for j wherever i is in
+    a squad is only blocked if j is already in the squad or j's team is full, so i is removed if
+    its dominators come from more teams than could be blocked, see blockable_teams. Players in the
+    current team are always kept.
+    
+    Args: projected_scores_for_optimiser, see FPLgorithm.prepare_for_optimiser
+          always_keep, elements to keep as well, e.g. the players of a previous solution
+          chips, chips that can be played, see build_model, as a wildcard lets the squad hold more players
+    Returns: the same dataframe without the dominated players
+    '''
+    data = projected_scores_for_optimiser
     columns = data.columns[5:-25]
+    points = data[columns].to_numpy(dtype=float)
+    cost = data['now_cost'].to_numpy(dtype=float)
+    team = data['team'].to_numpy().astype(int)
+    keep = np.ones(len(data), dtype=bool)
+    
+    for position in SQUAD_POSITIONS:
+        rows = np.flatnonzero(data[position].to_numpy() == 1)
+        p, c = points[rows], cost[rows]
+        at_least = (c[:, None] <= c[None, :]) & (p[:, None, :] >= p[None, :, :]).all(axis=2)
+        equal = (c[:, None] == c[None, :]) & (p[:, None, :] == p[None, :, :]).all(axis=2)
+        dominates = at_least & (~equal | (rows[:, None] < rows[None, :]))
+        teams = np.zeros((len(rows), TEAMS + 1))
+        teams[np.arange(len(rows)), team[rows]] = 1
+        dominating_teams = ((dominates.T.astype(float) @ teams) > 0).sum(axis=1)
+        keep[rows[dominating_teams > blockable_teams(position, len(columns), 'wildcard' in (chips or {}))]] = False
     
-    squad_var = {i: {} for i in range(1,weeks+1)}
-    start_var = {i: {} for i in range(1,weeks+1)}
-    bench_var = {i: {} for i in range(1,weeks+1)}
-    strong_bench_var = {i: {} for i in range(1,weeks+1)}
-    cap_var = {i: {} for i in range(1,weeks+1)}
-    both_var = {i: {} for i in range(1, weeks+1)}
-    week = {i: {} for i in range(1,weeks+1)}
-    a_transfers_var = {i: [] for i in range(1,weeks+1)}
-    in_team = data['in_team']
-    cost = data['now_cost']
-    GK = data['GK']
-    DEF = data['Def']
-    MID = data['Mid']
-    ATT = data['Att']
-    team1 = data['team1']
-    team2 = data['team2']
-    team3 = data['team3']
-    team4 = data['team4']
-    team5 = data['team5']
-    team6 = data['team6']
-    team7 = data['team7']
-    team8 = data['team8']
-    team9 = data['team9']
-    team10 = data['team10']
-    team11 = data['team11']
-    team12 = data['team12']
-    team13 = data['team13']
-    team14 = data['team14']
-    team15 = data['team15']
-    team16 = data['team16']
-    team17 = data['team17']
-    team18 = data['team18']
-    team19 = data['team19']
-    team20 = data['team20']
-    
-    #vars
-    for a in range(1,weeks+1):
-        a_transfers_var[a] = pulp.LpVariable("wk" + str(a) + "at",lowBound=0, upBound=2, cat='integer')
-        for i in player_ids:
-            squad_var[a][i] = pulp.LpVariable('wk' + str(a) + 'x' + str(i), cat='Binary')
-            start_var[a][i] = pulp.LpVariable('wk' + str(a) + 'y' + str(i), cat='Binary')
-            bench_var[a][i] = pulp.LpVariable('wk' + str(a) + 'be' + str(i), cat='Binary')
-            strong_bench_var[a][i] = pulp.LpVariable('wk' + str(a) + 'sb' + str(i), cat='Binary')
-            cap_var[a][i] = pulp.LpVariable('wk' + str(a) + 'z' + str(i), cat='Binary')
-            both_var[a][i] = pulp.LpVariable('wk' + str(a) + '+' + 'wk' + str(a+1) + 'b' + str(i), cat='Binary')
-            week[a][i] = data[columns[a-1]][i]
+    keep |= data['in_team'].to_numpy() == 1
+    if always_keep is not None:
+        keep |= data['element'].isin(always_keep).to_numpy()
+    print('Pruned ' + str((~keep).sum()) + ' of ' + str(len(data)) + ' players')
+    return(data.loc[keep])
 
-    prob = pulp.LpProblem("Optimiser", pulp.LpMaximize)
+def blockable_teams(position, weeks, wildcard=False):
+    '''
+    The most teams whose players could all be unavailable to swap in for a player of position,
+    in any squad over weeks weeks.
+    
+    Over the weeks the squad holds at most 15 + changes players, where changes is at most weeks
+    (see the transfer rules in build_model), and 15 more if a wildcard can be played as it lifts
+    a weeks limit. A team is blocked if its players are in the squad already (one of the squads
+    players of that position each), if it has 3 players in the squad, or for GK and Def if it has
+    2 GK and Def in the squad. Each is a separate team so this finds the most teams the squads
+    players can block between them. A free hit squad is a separate squad of one week, so a player
+    in it can be swapped on its own and it blocks no more teams than the weeks squad does.
+    
+    Returns: number of teams
+    '''
+    changes = (weeks + (15 if wildcard else 0)) if weeks > 1 else 0
+    others = 15 + changes - 1
+    same_position = SQUAD_POSITIONS[position] - 1 + changes
+    goal_keepers_defenders = 7 + changes - 1
+    most = 0
+    for in_squad in range(same_position + 1):
+        for defence_full in range((goal_keepers_defenders - in_squad) // 2 + 1 if position in ['GK', 'Def'] else 1):
+            full = (others - in_squad - 2 * defence_full) // 3
+            if full >= 0:
+                most = max(most, in_squad + defence_full + full)
+    return(min(most, TEAMS))
+
+def build_model(projected_scores_for_optimiser, transfers, in_bank, chips=None):
+    '''
+    Builds the optimisers model as sparse arrays, each constraint family generated for every week,
+    player and team at once from the position and team columns rather than one pulp sum at a time.
+    Variables are numbered family by family (see FAMILIES), week by week, player by player,
+    followed by the transfers available in each week, then the chip variables, see chip_variables.
+    
+    Chips are decided by the one solve rather than trying each week in turn. Each chip can be played
+    once over the weeks and only one chip a week:
+        wildcard, the weeks changes aren't limited and don't use up free transfers
+        free hit, the weeks starters and bench come from a separate squad of 15 (in the squad limits
+                  and budget) and the squad is kept unchanged for the week after
+        bench boost, the bench players score the weeks points as well
+    
+    Args: see optimise
+          chips, dict of the chips that can be played (see CHIPS) to the week column they must be played in,
+                 or None to let the solver choose
+    Returns: dict of
+        names, category, low, up, objective: arrays with one entry per variable
+        row, col, value: arrays of the nonzero constraint coefficients
+        sense, rhs: arrays with one entry per constraint, sense as in pulp (-1 <=, 0 ==, 1 >=)
+        weeks, players, columns: number of weeks and players and the week columns
+        chips: list of the chips in the model
+    '''
+    data = projected_scores_for_optimiser
+    columns = list(data.columns[5:-25])
+    weeks = len(columns)
+    players = len(data)
+    free_transfers = transfers
+    bank = in_bank
+    
+    points = data[columns].to_numpy(dtype=float).T
+    in_team = data['in_team'].to_numpy(dtype=float)
+    cost = data['now_cost'].to_numpy(dtype=float)
+    GK, DEF, MID, ATT = [data[c].to_numpy(dtype=float) for c in ['GK', 'Def', 'Mid', 'Att']]
+    team = data[['team' + str(t) for t in range(1, TEAMS + 1)]].to_numpy(dtype=float).T
+    chips = chips or {}
+    
+    var = family_variables(weeks, players)
+    transfers_var = len(FAMILIES) * weeks * players + np.arange(weeks)
+    chip_var, n_vars = chip_variables(weeks, players, chips)
+    var.update(chip_var)
+    
+    names = ['wk' + str(a + 1) + ('+wk' + str(a + 2) if family == 'both' else '') + PREFIXES[family] + str(i)
+             for family in FAMILIES for a in range(weeks) for i in data.index]
+    names += ['wk' + str(a + 1) + 'at' for a in range(weeks)]
+    for name in chip_var:
+        if name in CHIPS:
+            names += ['wk' + str(a + 1) + CHIPS[name] for a in range(weeks)]
+        else:
+            names += ['wk' + str(a + 1) + CHIP_PREFIXES[name] + str(i) for a in range(weeks) for i in data.index]
+    # the transfers available are continuous, as they always have been
+    category = np.full(n_vars, pulp.LpBinary, dtype=object)
+    category[transfers_var] = pulp.LpContinuous
+    category = category.astype(str)
+    low = np.zeros(n_vars)
+    up = np.ones(n_vars)
+    up[transfers_var] = 2
+    for chip, week in chips.items():
+        if week is not None:
+            low[var[chip][columns.index(week)]] = 1
     
     #Objective
-    prob += pulp.lpSum([((week[a][i] * start_var[a][i]) + (week[a][i] * cap_var[a][i]) + (0.1*week[a][i] * strong_bench_var[a][i]) ) for a in range(1,weeks+1) for i in player_ids])
+    objective = objective_coefficients(var, points, n_vars)
     
+    blocks = []
+    ones = np.ones((weeks, players))
+    #a wildcard lifts the limits on a weeks changes (15 is more than any week can make), without one the
+    #coefficients are 0 and dropped
+    wildcard = var.get('wildcard', np.zeros(weeks, dtype=int))
+    relax = 15 if 'wildcard' in var else 0
     #15 in squad and 11 in starters and 1 captain, starters in squad, captain in starters
-    for a in range(1,weeks+1):
-        prob += pulp.lpSum([squad_var[a][i] for i in player_ids]) == 15
-        prob += pulp.lpSum([start_var[a][i] for i in player_ids]) == 11
-        prob += pulp.lpSum([bench_var[a][i] for i in player_ids]) == 4
-        prob += pulp.lpSum([strong_bench_var[a][i] for i in player_ids]) == 2
-        prob += pulp.lpSum([cap_var[a][i] for i in player_ids]) == 1
-        prob += pulp.lpSum([both_var[a][i] for i in player_ids]) >= 13
-        
-        for i in player_ids:
-            prob += start_var[a][i] <= squad_var[a][i]
-            prob += bench_var[a][i] <= squad_var[a][i]
-            prob += cap_var[a][i] <= start_var[a][i]
-            prob += strong_bench_var[a][i] <= bench_var[a][i]
-            prob += start_var[a][i] + bench_var[a][i] <= 1
+    add_constraints(blocks, var['squad'], ones, 0, 15)
+    add_constraints(blocks, var['start'], ones, 0, 11)
+    add_constraints(blocks, var['bench'], ones, 0, 4)
+    add_constraints(blocks, var['strong_bench'], ones, 0, 2)
+    add_constraints(blocks, var['cap'], ones, 0, 1)
+    add_constraints(blocks, np.c_[var['both'], np.roll(wildcard, -1)], np.c_[ones, np.r_[np.full(weeks - 1, min(relax, 13)), 0]], 1, 13)
+    for inner, outer in [('start', 'squad'), ('bench', 'squad'), ('cap', 'start'), ('strong_bench', 'bench')]:
+        if 'free_hit' in var and outer == 'squad':
+            #or the free hit squad in a free hit week
+            free_hit = np.repeat(var['free_hit'], players)
+            add_constraints(blocks, np.stack([var[inner].ravel(), var[outer].ravel(), free_hit], axis=1), [1, -1, -1], -1, 0)
+            add_constraints(blocks, np.stack([var[inner].ravel(), var['hit'].ravel(), free_hit], axis=1), [1, -1, 1], -1, 1)
+            add_constraints(blocks, np.stack([var[inner].ravel(), var[outer].ravel(), var['hit'].ravel()], axis=1), [1, -1, -1], -1, 0)
+        else:
+            add_constraints(blocks, np.stack([var[inner].ravel(), var[outer].ravel()], axis=1), [1, -1], -1, 0)
+    add_constraints(blocks, np.stack([var['start'].ravel(), var['bench'].ravel()], axis=1), [1, 1], -1, 1)
     
     #week 1 only different to current team by max FT
-    prob += pulp.lpSum([squad_var[1][i] * in_team[i] for i in player_ids]) >= 15 - free_transfers
+    add_constraints(blocks, np.r_[var['squad'][0], wildcard[0]][None], np.r_[in_team, relax][None], 1, 15 - free_transfers)
     
     #initial amount of transfers is set accounting for wildcard
     if free_transfers == 15:
-        prob += a_transfers_var[1] == 1
+        add_constraints(blocks, transfers_var[:1, None], [[1]], 0, 1)
     else:
-        prob += a_transfers_var[1] <= free_transfers + 1 - 15 + pulp.lpSum([squad_var[1][i] * in_team[i] for i in player_ids])
+        add_constraints(blocks, np.r_[transfers_var[0], var['squad'][0], wildcard[0]][None], np.r_[1, -in_team, -relax][None],
+                        -1, free_transfers + 1 - 15)
     
     #amount of transfers available can't be 0 after initial
-    for a in range(1,weeks+1):
-        prob += a_transfers_var[a] >= 1
+    add_constraints(blocks, transfers_var[:, None], [[1]], 1, 1)
     
     #transfer rules(max 2 a week, accrue 1 a week + starting n) + limit no. of changes to available transfers
-    for a in range(1,weeks):
-        prob += a_transfers_var[a+1] <= a_transfers_var[a] + 1 - 15 + pulp.lpSum([both_var[a][i] for i in player_ids])
-        prob += 15 - pulp.lpSum([both_var[a][i] for i in player_ids]) <= a_transfers_var[a]
-    
-        for i in player_ids:
-            prob += squad_var[a+1][i] >= both_var[a][i]
-            prob += squad_var[a][i] >= both_var[a][i]
-            
-        prob += pulp.lpSum(
-        [15 - pulp.lpSum([both_var[b][i] for i in player_ids])
-        for b in range(1, a+1)]) <= a - 1 + a_transfers_var[1]
+    if weeks > 1:
+        both = var['both'][:-1]
+        add_constraints(blocks, np.c_[transfers_var[1:], transfers_var[:-1], both, wildcard[1:]],
+                        np.r_[1, -1, -np.ones(players), -relax][None], -1, 1 - 15)
+        add_constraints(blocks, np.c_[transfers_var[:-1], both, wildcard[1:]], np.r_[-np.ones(players + 1), -relax][None], -1, -15)
+        add_constraints(blocks, np.stack([both.ravel(), var['squad'][1:].ravel()], axis=1), [1, -1], -1, 0)
+        add_constraints(blocks, np.stack([both.ravel(), var['squad'][:-1].ravel()], axis=1), [1, -1], -1, 0)
+        for a in range(1, weeks):
+            add_constraints(blocks, np.r_[transfers_var[0], both[:a].ravel(), wildcard[1:a + 1]][None],
+                            np.r_[-np.ones(a * players + 1), np.full(a, -relax)][None], -1, a - 1 - 15 * a)
     
     #cost can't be more than current value + bank
-    for a in range(1,weeks+1):
-        prob += pulp.lpSum([squad_var[a][i] * cost[i] for i in player_ids]) <= sum([in_team[i] * cost[i] for i in player_ids]) + bank
+    add_constraints(blocks, var['squad'], cost[None], -1, in_team @ cost + bank)
     
     #squad has 2 gk, 5 def, 5 mid, 3 att, starting team has 1 gk, 3-5 def, 2-5 mid, 1-3 att
-    for a in range(1,weeks+1):
-        prob += pulp.lpSum([strong_bench_var[a][i] * GK[i] for i in player_ids]) == 0
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] for i in player_ids]) == 2
-        prob += pulp.lpSum([squad_var[a][i] * DEF[i] for i in player_ids]) == 5
-        prob += pulp.lpSum([squad_var[a][i] * MID[i] for i in player_ids]) == 5
-        prob += pulp.lpSum([squad_var[a][i] * ATT[i] for i in player_ids]) == 3
-        
-        prob += pulp.lpSum([start_var[a][i] * GK[i] for i in player_ids]) == 1
-        prob += pulp.lpSum([start_var[a][i] * DEF[i] for i in player_ids]) >= 3
-        prob += pulp.lpSum([start_var[a][i] * DEF[i] for i in player_ids]) <= 5
-        prob += pulp.lpSum([start_var[a][i] * MID[i] for i in player_ids]) >= 2
-        prob += pulp.lpSum([start_var[a][i] * MID[i] for i in player_ids]) <= 5
-        prob += pulp.lpSum([start_var[a][i] * ATT[i] for i in player_ids]) >= 1
-        prob += pulp.lpSum([start_var[a][i] * ATT[i] for i in player_ids]) <= 3
-    
-    #squad has max of 3 players of any PL team
-    for a in range(1,weeks+1):
-        prob += pulp.lpSum([squad_var[a][i] * team1[i] for i in player_ids]) <= 3
-        prob += pulp.lpSum([squad_var[a][i] * team2[i] for i in player_ids]) <= 3
-        prob += pulp.lpSum([squad_var[a][i] * team3[i] for i in player_ids]) <= 3
-        prob += pulp.lpSum([squad_var[a][i] * team4[i] for i in player_ids]) <= 3
-        prob += pulp.lpSum([squad_var[a][i] * team5[i] for i in player_ids]) <= 3
-        prob += pulp.lpSum([squad_var[a][i] * team6[i] for i in player_ids]) <= 3
-        prob += pulp.lpSum([squad_var[a][i] * team7[i] for i in player_ids]) <= 3
-        prob += pulp.lpSum([squad_var[a][i] * team8[i] for i in player_ids]) <= 3
-        prob += pulp.lpSum([squad_var[a][i] * team9[i] for i in player_ids]) <= 3
-        prob += pulp.lpSum([squad_var[a][i] * team10[i] for i in player_ids]) <= 3
-        prob += pulp.lpSum([squad_var[a][i] * team11[i] for i in player_ids]) <= 3
-        prob += pulp.lpSum([squad_var[a][i] * team12[i] for i in player_ids]) <= 3
-        prob += pulp.lpSum([squad_var[a][i] * team13[i] for i in player_ids]) <= 3
-        prob += pulp.lpSum([squad_var[a][i] * team14[i] for i in player_ids]) <= 3
-        prob += pulp.lpSum([squad_var[a][i] * team15[i] for i in player_ids]) <= 3
-        prob += pulp.lpSum([squad_var[a][i] * team16[i] for i in player_ids]) <= 3
-        prob += pulp.lpSum([squad_var[a][i] * team17[i] for i in player_ids]) <= 3
-        prob += pulp.lpSum([squad_var[a][i] * team18[i] for i in player_ids]) <= 3
-        prob += pulp.lpSum([squad_var[a][i] * team19[i] for i in player_ids]) <= 3
-        prob += pulp.lpSum([squad_var[a][i] * team20[i] for i in player_ids]) <= 3
-        
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] * team1[i] for i in player_ids]) + pulp.lpSum([squad_var[a][i] * DEF[i] * team1[i] for i in player_ids]) <= 2
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] * team2[i] for i in player_ids]) + pulp.lpSum([squad_var[a][i] * DEF[i] * team2[i] for i in player_ids]) <= 2
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] * team3[i] for i in player_ids]) + pulp.lpSum([squad_var[a][i] * DEF[i] * team3[i] for i in player_ids]) <= 2
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] * team4[i] for i in player_ids]) + pulp.lpSum([squad_var[a][i] * DEF[i] * team4[i] for i in player_ids]) <= 2
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] * team5[i] for i in player_ids]) + pulp.lpSum([squad_var[a][i] * DEF[i] * team5[i] for i in player_ids]) <= 2
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] * team6[i] for i in player_ids]) + pulp.lpSum([squad_var[a][i] * DEF[i] * team6[i] for i in player_ids]) <= 2
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] * team7[i] for i in player_ids]) + pulp.lpSum([squad_var[a][i] * DEF[i] * team7[i] for i in player_ids]) <= 2
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] * team8[i] for i in player_ids]) + pulp.lpSum([squad_var[a][i] * DEF[i] * team8[i] for i in player_ids]) <= 2
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] * team9[i] for i in player_ids]) + pulp.lpSum([squad_var[a][i] * DEF[i] * team9[i] for i in player_ids]) <= 2
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] * team10[i] for i in player_ids]) + pulp.lpSum([squad_var[a][i] * DEF[i] * team10[i] for i in player_ids]) <= 2
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] * team11[i] for i in player_ids]) + pulp.lpSum([squad_var[a][i] * DEF[i] * team11[i] for i in player_ids]) <= 2
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] * team12[i] for i in player_ids]) + pulp.lpSum([squad_var[a][i] * DEF[i] * team12[i] for i in player_ids]) <= 2
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] * team13[i] for i in player_ids]) + pulp.lpSum([squad_var[a][i] * DEF[i] * team13[i] for i in player_ids]) <= 2
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] * team14[i] for i in player_ids]) + pulp.lpSum([squad_var[a][i] * DEF[i] * team14[i] for i in player_ids]) <= 2
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] * team15[i] for i in player_ids]) + pulp.lpSum([squad_var[a][i] * DEF[i] * team15[i] for i in player_ids]) <= 2
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] * team16[i] for i in player_ids]) + pulp.lpSum([squad_var[a][i] * DEF[i] * team16[i] for i in player_ids]) <= 2
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] * team17[i] for i in player_ids]) + pulp.lpSum([squad_var[a][i] * DEF[i] * team17[i] for i in player_ids]) <= 2
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] * team18[i] for i in player_ids]) + pulp.lpSum([squad_var[a][i] * DEF[i] * team18[i] for i in player_ids]) <= 2
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] * team19[i] for i in player_ids]) + pulp.lpSum([squad_var[a][i] * DEF[i] * team19[i] for i in player_ids]) <= 2
-        prob += pulp.lpSum([squad_var[a][i] * GK[i] * team20[i] for i in player_ids]) + pulp.lpSum([squad_var[a][i] * DEF[i] * team20[i] for i in player_ids]) <= 2
-    
-    prob.solve(pulp.GLPK_CMD(timeLimit=900))
-    print(pulp.LpStatus[prob.status])
-    
-    output = data[['element', 'name', 'now_cost', 'in_team']]
-    
-    squad = {i: {} for i in range(1,weeks+1)}
-    start = {i: {} for i in range(1,weeks+1)}
-    strong_bench = {i: {} for i in range(1,weeks+1)}
-    cap = {i: {} for i in range(1,weeks+1)}
-    
-    squad_col = []
-    start_col = []
-    strong_bench_col = []
-    cap_col = []
-    
-    for a in range(0, weeks):
-        squad_col.append('squad_' + columns[a])
-        start_col.append('start_' + columns[a])
-        strong_bench_col.append('strong_bench_' + columns[a])
-        cap_col.append('cap_' + columns[a])
-    
-    for a in range(1,weeks+1):
-        for i in player_ids:
-            squad[a][i] = squad_var[a][i].varValue
-            start[a][i] = start_var[a][i].varValue
-            strong_bench[a][i] = strong_bench_var[a][i].varValue
-            cap[a][i] = cap_var[a][i].varValue
-    
-    squad_df = pd.DataFrame(squad)
-    squad_df.columns = squad_col
-    squad_df['element'] = output['element'] 
-    squad_df = squad_df.loc[(squad_df.iloc[:,:-1] != 0).any(axis=1)]
-    squad_df = pd.merge(output, squad_df, on=['element'], how='right')
-    
-    start_df = pd.DataFrame(start)
-    start_df.columns = start_col
-    start_df['element'] = output['element'] 
-    start_df = start_df.loc[(start_df.iloc[:,:-1] != 0).any(axis=1)]
-    start_df = pd.merge(output, start_df, on=['element'], how='right')
-    
-    strong_bench_df = pd.DataFrame(strong_bench)
-    strong_bench_df.columns = strong_bench_col
-    strong_bench_df['element'] = output['element'] 
-    strong_bench_df = strong_bench_df.loc[(strong_bench_df.iloc[:,:-1] != 0).any(axis=1)]
-    strong_bench_df = pd.merge(output, strong_bench_df, on=['element'], how='right')
-    
-    cap_df = pd.DataFrame(cap)
-    cap_df.columns = cap_col 
-    cap_df['element'] = output['element'] 
-    cap_df = cap_df.loc[(cap_df.iloc[:,:-1] != 0).any(axis=1)]
-    cap_df = pd.merge(output, cap_df, on=['element'], how='right')
-    
-    writer = pd.ExcelWriter('../Output/optimal_teams.xlsx', engine = 'xlsxwriter')
-    squad_df.to_excel(writer, sheet_name = 'Squad', index=False)
-    start_df.to_excel(writer, sheet_name = 'Start', index=False)
-    strong_bench_df.to_excel(writer, sheet_name = 'StrongBench', index=False)
-    cap_df.to_excel(writer, sheet_name = 'Captain', index=False)
-    writer.save()
+    add_constraints(blocks, var['strong_bench'], GK[None], 0, 0)
+    for position, count in [(GK, 2), (DEF, 5), (MID, 5), (ATT, 3)]:
+        add_constraints(blocks, var['squad'], position[None], 0, count)
+    add_constraints(blocks, var['start'], GK[None], 0, 1)
+    for position, least, most in [(DEF, 3, 5), (MID, 2, 5), (ATT, 1, 3)]:
+        add_constraints(blocks, var['start'], position[None], 1, least)
+        add_constraints(blocks, var['start'], position[None], -1, most)
+    
+    #squad has max of 3 players of any PL team, and max of 2 of its gk and def
+    add_constraints(blocks, np.repeat(var['squad'], TEAMS, axis=0), np.tile(team, (weeks, 1)), -1, 3)
+    add_constraints(blocks, np.repeat(var['squad'], TEAMS, axis=0), np.tile(team * (GK + DEF), (weeks, 1)), -1, 2)
+    
+    if 'free_hit' in var:
+        #the free hit squad follows the squad rules when played and is empty when not, the squad stays the same
+        add_constraints(blocks, np.c_[var['hit'], var['free_hit']], np.r_[np.ones(players), -15][None], 0, 0)
+        for position, count in [(GK, 2), (DEF, 5), (MID, 5), (ATT, 3)]:
+            add_constraints(blocks, np.c_[var['hit'], var['free_hit']], np.r_[position, -count][None], 0, 0)
+        #the limits are scaled by whether it's played, which gives the solver much tighter bounds
+        add_constraints(blocks, np.stack([var['hit'].ravel(), np.repeat(var['free_hit'], players)], axis=1), [1, -1], -1, 0)
+        add_constraints(blocks, np.c_[var['hit'], var['free_hit']], np.r_[cost, -(in_team @ cost + bank)][None], -1, 0)
+        for limit, most in [(team, 3), (team * (GK + DEF), 2)]:
+            add_constraints(blocks, np.c_[np.repeat(var['hit'], TEAMS, axis=0), np.repeat(var['free_hit'], TEAMS)],
+                            np.c_[np.tile(limit, (weeks, 1)), np.full(weeks * TEAMS, -most)], -1, 0)
+        add_constraints(blocks, np.r_[var['squad'][0], var['free_hit'][0]][None], np.r_[in_team, -15][None], 1, 0)
+        if weeks > 1:
+            add_constraints(blocks, np.c_[var['both'][:-1], var['free_hit'][1:]], np.r_[np.ones(players), -15][None], 1, 0)
+    
+    if 'bench_boost' in var:
+        #the bench players scoring in a bench boost week
+        add_constraints(blocks, np.stack([var['boost'].ravel(), var['bench'].ravel()], axis=1), [1, -1], -1, 0)
+        add_constraints(blocks, np.c_[var['boost'], var['bench_boost']], np.r_[np.ones(players), -4][None], -1, 0)
+    
+    #each chip once and one chip a week
+    played = [var[chip] for chip in CHIPS if chip in var]
+    for chip in played:
+        add_constraints(blocks, chip[None], [[1]], -1, 1)
+    if len(played) > 1:
+        add_constraints(blocks, np.stack(played, axis=1), [[1]], -1, 1)
+    
+    row, col, value, sense, rhs = stack_constraints(blocks)
+    return({'names': names, 'category': category, 'low': low, 'up': up, 'objective': objective,
+            'row': row, 'col': col, 'value': value, 'sense': sense, 'rhs': rhs,
+            'weeks': weeks, 'players': players, 'columns': columns, 'chips': [chip for chip in CHIPS if chip in chips]})
+
+def family_variables(weeks, players):
+    '''
+    Returns: dict of each of FAMILIES to an array [week, player] of its variable numbers, see build_model
+    '''
+    return({family: np.arange(weeks * players).reshape(weeks, players) + f * weeks * players for f, family in enumerate(FAMILIES)})
+
+def chip_variables(weeks, players, chips):
+    '''
+    Numbers the chip variables after the transfers available, see build_model.
+    
+    Args: chips, the chips in the model
+    Returns: dict of each chip (see CHIPS) to an array [week] of whether it's played that week, the free hit
+             squad (hit) and the bench players boosted (boost) to arrays [week, player], see CHIP_FAMILIES,
+             and the number of variables of the model
+    '''
+    n_vars = len(FAMILIES) * weeks * players + weeks
+    var = {}
+    for chip in CHIPS:
+        if chip in chips:
+            var[chip] = n_vars + np.arange(weeks)
+            n_vars += weeks
+            if chip in CHIP_FAMILIES:
+                var[CHIP_FAMILIES[chip]] = n_vars + np.arange(weeks * players).reshape(weeks, players)
+                n_vars += weeks * players
+    return(var, n_vars)
+
+def chip_weeks(model, x):
+    '''
+    Args: x, the value of each variable in a solution of the model
+    Returns: dict of each chip of the model to the week column it's played in, None if it isn't
+    '''
+    var = chip_variables(model['weeks'], model['players'], model['chips'])[0]
+    played = {}
+    for chip in model['chips']:
+        weeks = np.array(model['columns'])[x[var[chip]] > 0.5]
+        played[chip] = str(weeks[0]) if len(weeks) else None
+    return(played)
+
+def objective_coefficients(var, points, n_vars):
+    '''
+    Returns: the objective coefficient of every variable, the points of the starters and captain
+             and a tenth of the points of the strong bench, the points of the bench in a bench boost week,
+             less CHIP_PENALTY for playing a chip so none is played for nothing
+    '''
+    objective = np.zeros(n_vars)
+    objective[var['start']] = points
+    objective[var['cap']] = points
+    objective[var['strong_bench']] = 0.1 * points
+    if 'boost' in var:
+        objective[var['boost']] = points
+    for chip in CHIPS:
+        if chip in var:
+            objective[var[chip]] = -CHIP_PENALTY
+    return(objective)
+
+def update_model(model, projected_scores_for_optimiser, fixed):
+    '''
+    Sets the objective of a model from build_model to the projections of the same players,
+    and fixes the fixed players out of every squad (every one of their variables is 0).
+    
+    Args: fixed, array of whether each player is fixed out
+    '''
+    data = projected_scores_for_optimiser
+    weeks, players = model['weeks'], model['players']
+    var = family_variables(weeks, players)
+    var.update(chip_variables(weeks, players, model['chips'])[0])
+    n_vars = len(model['names'])
+    model['objective'] = objective_coefficients(var, data[model['columns']].to_numpy(dtype=float).T, n_vars)
+    model['up'][model['category'] == pulp.LpBinary] = 1
+    model['up'][np.concatenate([var[family][:, fixed].ravel() for family in var if var[family].ndim == 2])] = 0
+
+def update_problem(prob, variables, model):
+    '''
+    Gives the pulp problem of a model from to_problem its models current objective and bounds.
+    '''
+    objective = np.flatnonzero(model['objective'])
+    prob.setObjective(pulp.LpAffineExpression([(variables[j], c) for j, c in zip(objective.tolist(), model['objective'][objective].tolist())]))
+    for variable, low, up in zip(variables, model['low'].tolist(), model['up'].tolist()):
+        variable.lowBound, variable.upBound = low, up
+
+def structure_key(projected_scores_for_optimiser, transfers, in_bank, chips=None):
+    '''
+    Returns: a hash of everything build_model uses other than the projected points,
+             so two models with the same key only differ in their objective
+    '''
+    data = projected_scores_for_optimiser
+    columns = list(data.columns[5:-25])
+    structure = data.drop(columns=columns)
+    key = hashlib.sha1(pd.util.hash_pandas_object(structure).to_numpy().tobytes())
+    key.update(repr((columns, list(structure.columns), transfers, in_bank, sorted((chips or {}).items()))).encode())
+    return(key.hexdigest())
+
+def reusable_model(projected_scores_for_optimiser, transfers, in_bank, key, chips=None):
+    '''
+    Gets the model and pulp problem of the players, team, transfers and bank, from memory if they were
+    used earlier in the session, from MODEL_PATH if they were used in the last run, otherwise building it.
+    Only the latest is kept.
+    
+    Args: see build_model
+          key, see structure_key
+    Returns: model, prob, variables, see to_problem
+    '''
+    if key not in _models:
+        model = load_model(key)
+        if model is None:
+            model = build_model(projected_scores_for_optimiser, transfers, in_bank, chips)
+            save_model(model, key)
+        _models.clear()
+        _models[key] = dict(zip(['model', 'prob', 'variables'], (model,) + to_problem(model)))
+    return(_models[key]['model'], _models[key]['prob'], _models[key]['variables'])
+
+def load_model(key):
+    '''
+    Returns: the model saved by save_model, None if there isn't one or it has a different key
+    '''
+    if not os.path.exists(MODEL_PATH):
+        return(None)
+    with np.load(MODEL_PATH) as saved:
+        if str(saved['key']) != key:
+            return(None)
+        model = {name: saved[name] for name in MODEL_ARRAYS}
+        model.update({'names': saved['names'].tolist(), 'columns': saved['columns'].tolist(), 'chips': saved['chips'].tolist(),
+                      'weeks': int(saved['weeks']), 'players': int(saved['players'])})
+    return(model)
+
+def save_model(model, key):
+    '''
+    Saves a model from build_model atomically, with the key of the players, team, transfers and bank it was built for.
+    '''
+    os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
+    tmp = MODEL_PATH + '.tmp.npz'
+    np.savez(tmp, key=key, names=np.array(model['names']), columns=np.array(model['columns']), chips=np.array(model['chips'], dtype=str),
+             weeks=model['weeks'], players=model['players'], **{name: model[name] for name in MODEL_ARRAYS})
+    os.replace(tmp, MODEL_PATH)
+
+def initial_solution(projected_scores_for_optimiser, model, transfers, previous=None):
+    '''
+    Builds a starting solution for the solver: the best of the squads of the previous solutions that are
+    still possible (prices, transfers or projections can change) and the current team held every week.
+    Each weeks starters, strong bench and captain are the best the squad can field and the
+    transfers available follow from the changes made, see assignment.
+    
+    Args: projected_scores_for_optimiser, transfers: see optimise
+          model, see build_model
+          previous, see read_previous
+    Returns: array of a value per variable of the model, None if neither is possible
+    '''
+    data = projected_scores_for_optimiser
+    candidates = []
+    for stored in (previous if isinstance(previous, list) else [previous]):
+        if stored is None or len(stored.columns) < 2:
+            continue
+        stored = stored.set_index('element').reindex(data['element'].to_numpy()).fillna(0)
+        stored_weeks = np.array([int(c[1:]) for c in stored.columns])
+        squads = []
+        for c in model['columns']:
+            # weeks the previous solution didn't reach hold its last squad
+            earlier = np.flatnonzero(stored_weeks <= int(c[1:]))
+            k = earlier[np.argmax(stored_weeks[earlier])] if len(earlier) else np.argmin(stored_weeks)
+            squads.append(stored.iloc[:, k].to_numpy(dtype=float))
+        candidates.append(np.array(squads))
+    candidates.append(np.tile(data['in_team'].to_numpy(dtype=float), (model['weeks'], 1)))
+    
+    best = None
+    for squads in candidates:
+        x = assignment(data, model, transfers, squads)
+        if feasible(model, x) and (best is None or model['objective'] @ x > model['objective'] @ best):
+            best = x
+    return(best)
+
+def assignment(projected_scores_for_optimiser, model, transfers, squads):
+    '''
+    Fills in every variable of the model for a squad each week, see lineups.
+    Chips are only played in the weeks they must be, a free hit squad being the weeks squad.
+    
+    Args: squads, array [week, player] of 0/1
+    Returns: array of a value per variable of the model
+    '''
+    data = projected_scores_for_optimiser
+    weeks, players = model['weeks'], model['players']
+    x = lineups(data, model['columns'], squads)
+    
+    in_team = data['in_team'].to_numpy(dtype=float)
+    available = np.zeros(weeks)
+    available[0] = next_transfers(transfers, 15 - in_team @ x['squad'][0])
+    for a in range(1, weeks):
+        available[a] = next_transfers(available[a - 1], 15 - x['both'][a - 1].sum())
+    values = np.concatenate([x[family].ravel() for family in FAMILIES] + [available] + [np.zeros(len(model['names']) - weeks * (len(FAMILIES) * players + 1))])
+    var = chip_variables(weeks, players, model['chips'])[0]
+    for chip in model['chips']:
+        values[var[chip]] = model['low'][var[chip]]
+    if 'free_hit' in var:
+        values[var['hit']] = x['squad'] * values[var['free_hit']][:, None]
+    return(values)
+
+def lineups(projected_scores_for_optimiser, columns, squads):
+    '''
+    Picks each weeks starters, strong bench and captain from a squad each week. The starters are the best
+    goalkeeper and the best of each outfield position up to the formations minimums, then the best of the rest,
+    the strong bench the two best outfield substitutes and the captain the best starter.
+    
+    Args: columns, the week columns
+          squads, array [week, player] of 0/1
+    Returns: dict of each of FAMILIES to an array [week, player] of 0/1
+    '''
+    data = projected_scores_for_optimiser
+    weeks, players = squads.shape
+    points = np.nan_to_num(data[columns].to_numpy(dtype=float).T)
+    position = data[list(SQUAD_POSITIONS)].to_numpy() == 1
+    squad = squads > 0.5
+    x = {family: np.zeros((weeks, players)) for family in FAMILIES}
+    x['squad'] = squad.astype(float)
+    for a in range(weeks):
+        order = np.argsort(-points[a], kind='mergesort')
+        start = np.zeros(players, dtype=bool)
+        for p, least in enumerate([1, 3, 2, 1]):
+            start[order[(squad[a] & position[:, p])[order]][:least]] = True
+        start[order[(squad[a] & ~start & ~position[:, 0])[order]][:11 - start.sum()]] = True
+        bench = squad[a] & ~start
+        x['start'][a] = start
+        x['bench'][a] = bench
+        x['strong_bench'][a, order[(bench & ~position[:, 0])[order]][:2]] = 1
+        x['cap'][a, order[start[order]][:1]] = 1
+    x['both'][:-1] = squad[:-1] & squad[1:]
+    x['both'][-1] = squad[-1]
+    return(x)
+
+def feasible(model, x, tolerance=1e-6):
+    '''
+    Returns: whether the values x (one per variable) are within the bounds and meet every constraint of the model
+    '''
+    activity = np.bincount(model['row'], weights=model['value'] * x[model['col']], minlength=len(model['sense']))
+    slack = activity - model['rhs']
+    met = np.where(model['sense'] == 0, np.abs(slack) <= tolerance, model['sense'] * slack >= -tolerance)
+    return(bool(met.all() and (x >= model['low'] - tolerance).all() and (x <= model['up'] + tolerance).all()))
+
+def read_previous(path=PREVIOUS_PATH):
+    '''
+    Returns: the squads saved by save_previous [Element, w1, w2, ...] of 0/1, None if there are none
+    '''
+    if not os.path.exists(path):
+        return(None)
+    return(pd.read_csv(path))
+
+def save_previous(squad_df, path=PREVIOUS_PATH):
+    '''
+    Saves the squad each week of a solution for the next run to start from.
+    '''
+    squads_frame(squad_df).to_csv(path, index=False)
+
+def squads_frame(squad_df):
+    '''
+    Returns: the squad each week of a solution in the layout of read_previous
+    '''
+    squads = squad_df[['element'] + [c for c in squad_df.columns if c.startswith('squad_')]]
+    squads.columns = ['element'] + [c[len('squad_'):] for c in squads.columns[1:]]
+    return(squads)
+
+def add_constraints(blocks, col, value, sense, rhs):
+    '''
+    Adds a block of constraints of the same shape to blocks.
+    
+    Args: blocks, list of the blocks so far
+          col, array [constraint, term] of variable numbers
+          value, coefficients, broadcast to the shape of col
+          sense, rhs: one for all the constraints or one per constraint
+    '''
+    col = np.asarray(col)
+    value = np.broadcast_to(np.asarray(value, dtype=float), col.shape)
+    n = col.shape[0]
+    blocks.append((np.repeat(np.arange(n), col.shape[1]), col.ravel(), value.ravel(),
+                   np.broadcast_to(sense, n), np.broadcast_to(np.asarray(rhs, dtype=float), n)))
+
+def stack_constraints(blocks):
+    '''
+    Numbers the constraints of every block in turn and drops zero coefficients.
+    
+    Returns: row, col, value, sense, rhs arrays, see build_model
+    '''
+    offsets = np.cumsum([0] + [len(block[3]) for block in blocks])
+    row = np.concatenate([block[0] + offset for block, offset in zip(blocks, offsets)])
+    col, value, sense, rhs = [np.concatenate([block[k] for block in blocks]) for k in range(1, 5)]
+    nonzero = value != 0
+    return(row[nonzero], col[nonzero], value[nonzero], sense, rhs)
+
+def to_problem(model):
+    '''
+    Creates the pulp problem of a model from build_model, making each constraint straight from its
+    coefficients. Constraints left with no coefficients are dropped if they hold.
+    
+    Returns: the problem, and its variables in the order of the model
+    '''
+    variables = [pulp.LpVariable(name, low, up, category) for name, low, up, category in
+                 zip(model['names'], model['low'].tolist(), model['up'].tolist(), model['category'])]
+    # pulp gives binaries bounds of 0 and 1 whatever they're made with, so those fixed at 0 (see update_model)
+    # or 1 (a chip played in a chosen week, see build_model) are set after
+    for j in np.flatnonzero((model['low'] > 0) | (model['up'] < 1)).tolist():
+        variables[j].lowBound, variables[j].upBound = model['low'][j], model['up'][j]
+    prob = pulp.LpProblem("Optimiser", pulp.LpMaximize)
+    objective = np.flatnonzero(model['objective'])
+    prob.setObjective(pulp.LpAffineExpression([(variables[j], c) for j, c in zip(objective.tolist(), model['objective'][objective].tolist())]))
+    
+    order = np.argsort(model['row'], kind='stable')
+    bounds = np.searchsorted(model['row'][order], np.arange(len(model['sense']) + 1)).tolist()
+    col = model['col'][order].tolist()
+    value = model['value'][order].tolist()
+    for r, (sense, rhs) in enumerate(zip(model['sense'].tolist(), model['rhs'].tolist())):
+        start, end = bounds[r], bounds[r + 1]
+        if start == end and sense * (0 - rhs) >= 0 and (sense != 0 or rhs == 0):
+            continue
+        expression = pulp.LpAffineExpression([(variables[j], v) for j, v in zip(col[start:end], value[start:end])])
+        prob.addConstraint(pulp.LpConstraint(expression, sense, rhs=rhs))
+    return(prob, variables)
     
 if __name__ == '__main__':
     fpl_optimiser()
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+# the modules in Code import each other by name and read and write ../Data and ../Output from Code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Code'))
+
+import FPLbench
+import FPLtimiser
+
+
+@pytest.fixture(params=[(150, 3, 3)], ids=lambda params: 'players{}-weeks{}-seed{}'.format(*params))
+def team_data(request, tmp_path, monkeypatch):
+    '''
+    Synthetic projections (players, weeks, seed, see FPLbench.synthetic_projections) with the heuristic's
+    week 1 wildcard squad as the current team. Parametrise it indirectly for other projections.
+    The optimiser's model is kept in tmp_path.
+    '''
+    monkeypatch.setattr(FPLtimiser, 'MODEL_PATH', str(tmp_path / 'optimiser_model.npz'))
+    data = FPLbench.synthetic_projections(*request.param)
+    squad_df = FPLtimiser.heuristic(data, 15, 900)[0]
+    data['in_team'] = data['element'].isin(squad_df.loc[squad_df['squad_w1'] == 1, 'element']).astype(float)
+    return(data)
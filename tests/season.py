@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import FPLapi
+import FPLhistory
+import FPLratings
+import FPLrolling
+
+PLAYERS = 120
+TEAMS = 20
+ROUNDS = 12
+
+
+def synthetic_history(rounds, seed=0):
+    '''
+    Random rows of the history store, a row per player per round.
+    '''
+    rng = np.random.RandomState(seed)
+    element = np.tile(np.arange(1, PLAYERS + 1), rounds)
+    history = pd.DataFrame({'element': element,
+                            'round': np.repeat(np.arange(1, rounds + 1), PLAYERS),
+                            'opponent_team': rng.randint(1, TEAMS + 1, len(element)),
+                            'total_points': rng.randint(0, 15, len(element)),
+                            'minutes': rng.choice([0, 30, 90], len(element)),
+                            'was_home': rng.rand(len(element)) < 0.5,
+                            'value': rng.randint(40, 130, len(element))})
+    return(history.astype(FPLhistory.HISTORY_DTYPES))
+
+
+def synthetic_elements(seed=0):
+    rng = np.random.RandomState(seed)
+    ids = np.arange(1, PLAYERS + 1)
+    return(pd.DataFrame({'id': ids, 'element_type': rng.randint(1, 5, PLAYERS), 'team': rng.randint(1, TEAMS + 1, PLAYERS),
+                         'team_code': rng.randint(1, TEAMS + 1, PLAYERS), 'first_name': 'First' + pd.Series(ids).astype(str),
+                         'second_name': 'Second' + pd.Series(ids).astype(str), 'web_name': 'Player' + pd.Series(ids).astype(str)}))
+
+
+def synthetic_fixtures(elements, seed=0):
+    rng = np.random.RandomState(seed)
+    fixtures = pd.concat([elements.assign(event=event) for event in range(ROUNDS + 1, ROUNDS + 4)], ignore_index=True)
+    fixtures['opponent_team'] = rng.randint(1, TEAMS + 1, len(fixtures))
+    fixtures['is_home'] = rng.rand(len(fixtures)) < 0.5
+    return(fixtures.rename(columns={'id': 'element'}))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    elements = synthetic_elements()
+    monkeypatch.setattr(FPLhistory, 'STORE_DIR', str(tmp_path / 'history'))
+    monkeypatch.setattr(FPLrolling, 'STATE_PATH', str(tmp_path / 'rolling_state.npz'))
+    monkeypatch.setattr(FPLratings, 'FLAGGED_PATH', str(tmp_path / 'flagged_players.csv'))
+    monkeypatch.setattr(FPLapi, 'elements', lambda: elements)
+    pd.DataFrame({'element': [3, 7, 7, 50], 'round': [2, 5, 6, 9]}).to_csv(FPLratings.FLAGGED_PATH, index=False)
+    return(synthetic_fixtures(elements))
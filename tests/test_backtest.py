@@ -0,0 +1,22 @@
+import FPLbacktest
+import FPLsolver
+from season import ROUNDS, store, synthetic_history
+
+
+def evaluate(history, gameweek):
+    FPLbacktest.init_worker(history, False)
+    return(FPLbacktest.evaluate_gameweek(gameweek, 4, 2, FPLsolver.solver_settings('PULP_CBC_CMD', gap=0.01)))
+
+
+def test_backtest_scores_a_gameweek(store):
+    result = evaluate(synthetic_history(ROUNDS), 8)
+    assert result['gameweek'] == 9
+    assert result['status'] in ['Optimal', 'Feasible']
+    assert result['actual_points'] > 0
+
+
+def test_backtest_skips_blank_and_last_gameweeks(store):
+    history = synthetic_history(ROUNDS)
+    blank = history.loc[history['round'] != 9]
+    assert evaluate(blank, 8)['status'] == 'Skipped'
+    assert evaluate(history, ROUNDS)['status'] == 'Skipped'
@@ -0,0 +1,13 @@
+import pytest
+
+import FPLsolver
+import FPLtimiser
+
+
+@pytest.mark.parametrize('solver', ['PULP_CBC_CMD', 'HiGHS'])
+@pytest.mark.parametrize('reuse', [False, True])
+def test_forced_chips_are_played_in_their_weeks(team_data, solver, reuse):
+    chips = {'bench_boost': 'w2', 'wildcard': 'w3'}
+    report = FPLtimiser.optimise(team_data, 1, 20, FPLsolver.solver_settings(solver), chips=chips, reuse=reuse)[4]
+    assert report['status'] == 'Optimal'
+    assert report['chips'] == chips
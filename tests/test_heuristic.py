@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+import FPLbench
+import FPLtimiser
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('budget', [800, 850, 900, 1000])
+def test_greedy_squad_keeps_to_squad_rules(seed, budget):
+    data = FPLbench.synthetic_projections(600, 3, seed)
+    cost = data['now_cost'].to_numpy(dtype=float)
+    position = np.argmax(data[list(FPLtimiser.SQUAD_POSITIONS)].to_numpy(), axis=1)
+    team = data['team'].to_numpy()
+    points = data[['w1', 'w2', 'w3']].to_numpy().T
+    squad = FPLtimiser.greedy_squad(points.sum(axis=0), cost, position, team, budget, np.ones(len(data), dtype=bool))
+    assert len(squad) == 15
+    assert len(set(squad)) == 15
+    assert list(np.bincount(position[squad], minlength=4)) == list(FPLtimiser.SQUAD_POSITIONS.values())
+    assert np.bincount(team[squad]).max() <= 3
+    assert np.bincount(team[squad][position[squad] < 2]).max() <= 2
+    assert cost[squad].sum() <= budget
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('budget', [850, 1000])
+def test_heuristic_plan_meets_the_model(seed, budget):
+    data = FPLbench.synthetic_projections(300, 4, seed)
+    unavailable = data['element'].iloc[:10].tolist()
+    squad_df, start_df, strong_bench_df, cap_df, report, plan_df = FPLtimiser.heuristic(data, 15, budget, unavailable)
+    assert report['status'] == 'Feasible'
+    assert not squad_df['element'].isin(unavailable).any()
+    for w in range(1, 5):
+        assert squad_df['squad_w' + str(w)].sum() == 15
+        assert start_df['start_w' + str(w)].sum() == 11
+        assert cap_df['cap_w' + str(w)].sum() == 1
+
+
+def test_heuristic_reports_a_squad_over_budget_infeasible():
+    data = FPLbench.synthetic_projections(300, 3, 0)
+    report = FPLtimiser.heuristic(data, 15, 100)[4]
+    assert report['status'] == 'Infeasible'
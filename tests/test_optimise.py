@@ -0,0 +1,16 @@
+import pytest
+
+import FPLsolver
+import FPLtimiser
+
+
+@pytest.mark.parametrize('solver', ['PULP_CBC_CMD', 'HiGHS'])
+@pytest.mark.parametrize('reuse', [False, True])
+def test_unavailable_players_are_not_bought(team_data, solver, reuse):
+    squad_df = FPLtimiser.optimise(team_data, 1, 20, FPLsolver.solver_settings(solver))[0]
+    bought = squad_df.loc[squad_df['in_team'] == 0, 'element'].tolist()
+    assert bought
+    squad_df, start_df, strong_bench_df, cap_df, report, plan_df = FPLtimiser.optimise(
+        team_data, 1, 20, FPLsolver.solver_settings(solver), reuse=reuse, unavailable=bought)
+    assert report['status'] == 'Optimal'
+    assert not squad_df['element'].isin(bought).any()
@@ -0,0 +1,23 @@
+import pytest
+
+import FPLbench
+import FPLsolver
+import FPLtimiser
+
+
+def solve(data, transfers, in_bank, prune):
+    squad_df, start_df, strong_bench_df, cap_df, report, plan_df = FPLtimiser.optimise(
+        data, transfers, in_bank, FPLsolver.solver_settings('PULP_CBC_CMD', gap=0), prune=prune, warm_start=False)
+    assert report['status'] == 'Optimal'
+    return(report['objective'])
+
+
+@pytest.mark.parametrize('seed', [1, 2])
+def test_prune_dominated_keeps_the_optimum_of_a_wildcard(seed):
+    data = FPLbench.synthetic_projections(150, 2, seed)
+    assert len(FPLtimiser.prune_dominated(data)) < len(data)
+    assert solve(data, 15, 900, True) == pytest.approx(solve(data, 15, 900, False), abs=1e-6)
+
+
+def test_prune_dominated_keeps_the_optimum_with_a_current_team(team_data):
+    assert solve(team_data, 1, 20, True) == pytest.approx(solve(team_data, 1, 20, False), abs=1e-6)
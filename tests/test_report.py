@@ -0,0 +1,42 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+import FPLreport
+
+
+@pytest.mark.parametrize('reset_peak', [True, False])
+def test_stage_peaks_with_and_without_reset_peak(monkeypatch, reset_peak):
+    if not reset_peak:
+        # as on Python 3.8
+        monkeypatch.delattr(tracemalloc, 'reset_peak', raising=False)
+    monkeypatch.setattr(FPLreport, 'PROFILE', ['memory'])
+    FPLreport.new_run()
+    try:
+        with FPLreport.stage('outer') as outer:
+            with FPLreport.stage('big') as big:
+                block = np.ones(2**22)
+            del block
+            with FPLreport.stage('small') as small:
+                block = np.ones(2**10)
+    finally:
+        tracemalloc.stop()
+    assert big['peak_traced_mb'] >= 32
+    assert small['peak_traced_mb'] < 32
+    assert outer['peak_traced_mb'] >= 32
+
+
+def test_stage_records_the_growth_of_the_process_peak():
+    if FPLreport.peak_rss_mb() is None:
+        pytest.skip('the peak memory of the process is not known here')
+    FPLreport.new_run()
+    with FPLreport.stage('big') as big:
+        block = np.ones(2**25)
+        block += 1
+    del block
+    with FPLreport.stage('after') as after:
+        pass
+    assert big['peak_rss_growth_mb'] >= 200
+    assert after['peak_rss_growth_mb'] == 0
+    assert after['process_peak_rss_mb'] >= big['process_peak_rss_mb']
@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+
+import FPLapi
+import FPLhistory
+import FPLratings
+import FPLrolling
+from season import ROUNDS, store, synthetic_history
+
+
+def batch_projection(fixtures, gameweeks):
+    player_data = FPLratings.remove_flagged_players(FPLratings.add_player_details(FPLhistory.read_history(gameweeks)))
+    return(FPLratings.calculate_projected_scores(player_data, fixtures))
+
+
+@pytest.mark.parametrize('gameweeks', [1, 4, 8])
+def test_rolling_projection_matches_batch_as_rounds_arrive(store, gameweeks):
+    history = synthetic_history(ROUNDS)
+    for latest in range(1, ROUNDS + 1):
+        FPLhistory.save_history(history.loc[history['round'] <= latest])
+        normalised, ppg = FPLrolling.update(gameweeks)
+        pd.testing.assert_frame_equal(FPLratings.project_fixtures(store, normalised, ppg), batch_projection(store, gameweeks))
+
+
+def test_rolling_projection_picks_up_corrections_to_the_last_round(store):
+    history = synthetic_history(ROUNDS)
+    FPLhistory.save_history(history)
+    FPLrolling.update(4)
+    history.loc[history['round'] == ROUNDS, 'total_points'] += 3
+    FPLhistory.save_history(history)
+    normalised, ppg = FPLrolling.update(4)
+    pd.testing.assert_frame_equal(FPLratings.project_fixtures(store, normalised, ppg), batch_projection(store, 4))
+
+
+def test_rolling_projection_picks_up_rewritten_history(store):
+    history = synthetic_history(ROUNDS)
+    FPLhistory.save_history(history)
+    FPLrolling.update(4)
+    history.loc[history['round'] == ROUNDS - 2, 'minutes'] = 90
+    FPLhistory.save_history(history)
+    normalised, ppg = FPLrolling.update(4)
+    pd.testing.assert_frame_equal(FPLratings.project_fixtures(store, normalised, ppg), batch_projection(store, 4))
+
+
+@pytest.mark.parametrize('flagged', [[(3, 10), (60, 11)], [(7, 6)]])
+def test_rolling_projection_picks_up_changes_to_the_flagged_list(store, flagged):
+    history = synthetic_history(ROUNDS)
+    FPLhistory.save_history(history.loc[history['round'] < ROUNDS])
+    FPLrolling.update(4)
+    pd.DataFrame(flagged, columns=['element', 'round']).to_csv(FPLratings.FLAGGED_PATH, index=False)
+    FPLhistory.save_history(history)
+    normalised, ppg = FPLrolling.update(4)
+    pd.testing.assert_frame_equal(FPLratings.project_fixtures(store, normalised, ppg), batch_projection(store, 4))
+
+
+def test_rolling_projection_picks_up_a_change_of_position(store, monkeypatch):
+    history = synthetic_history(ROUNDS)
+    FPLhistory.save_history(history)
+    FPLrolling.update(4)
+    elements = FPLapi.elements().copy()
+    elements.loc[elements['id'] == 5, 'element_type'] = 5 - elements.loc[elements['id'] == 5, 'element_type']
+    monkeypatch.setattr(FPLapi, 'elements', lambda: elements)
+    normalised, ppg = FPLrolling.update(4)
+    pd.testing.assert_frame_equal(FPLratings.project_fixtures(store, normalised, ppg), batch_projection(store, 4))
+
+
+def test_rolling_update_reads_only_the_new_rounds(store, monkeypatch):
+    history = synthetic_history(ROUNDS)
+    FPLhistory.save_history(history.loc[history['round'] < ROUNDS])
+    FPLrolling.update(4)
+    FPLhistory.save_history(history)
+    read = []
+    read_rounds = FPLhistory.read_rounds
+    monkeypatch.setattr(FPLhistory, 'read_rounds', lambda *rounds: read.append(rounds) or read_rounds(*rounds))
+    FPLrolling.update(4)
+    FPLrolling.update(4)
+    assert read == [(ROUNDS - 1,)]
@@ -0,0 +1,15 @@
+import FPLsolver
+import FPLtimiser
+
+
+def test_rolling_horizon_keeps_unavailable_players_out(team_data):
+    solver = FPLsolver.solver_settings('PULP_CBC_CMD')
+    squad_df = FPLtimiser.rolling_horizon(team_data, 1, 20, 1, 2, solver)[0]
+    bought = squad_df.loc[~squad_df['element'].isin(team_data.loc[team_data['in_team'] == 1, 'element']), 'element'].tolist()
+    assert bought
+    squad_df, start_df, strong_bench_df, cap_df, report, plan_df = FPLtimiser.rolling_horizon(
+        team_data, 1, 20, 1, 2, solver, unavailable=bought, heuristic_start=True)
+    assert report['status'] == 'Optimal'
+    assert not squad_df['element'].isin(bought).any()
+    for w in ['w1', 'w2', 'w3']:
+        assert squad_df['squad_' + w].sum() == 15